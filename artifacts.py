@@ -0,0 +1,211 @@
+"""
+Armazenamento dos textos grandes (prompts e feedbacks) fora da memória e do estado.
+
+Com artifacts.enabled (e sempre no modo de baixo consumo de memória), as
+tentativas do histórico guardam apenas a referência (sha256) de prompt e
+feedback; os textos ficam em processing.blob_dir (output/blobs/). No modo
+de baixo consumo, cada tentativa ainda vira uma TentativaCompacta: notas em
+array e metadados em __slots__.
+
+Os textos são cortados em blocos definidos pelo conteúdo (fronteiras em
+linhas escolhidas pelo CRC da própria linha, não pela posição), de modo que
+cabeçalho e rubricas repetidos em todos os prompts resultam nos mesmos blocos
+e são gravados uma única vez. Cada bloco é comprimido com zstd (pacote
+'zstandard', quando instalado) ou zlib; a referência do texto aponta para a
+lista dos seus blocos. Blobs gravados antes dos blocos (texto inteiro em
+zlib) continuam legíveis.
+"""
+
+import hashlib
+import json
+import math
+import os
+import zlib
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sem o pacote, os blocos novos usam zlib
+    zstandard = None
+
+MAGICO_ZSTD = b'\x28\xb5\x2f\xfd'
+MARCADOR_BLOCOS = "\x00blocos\n"
+
+
+def cortar_blocos(texto: str, tamanho_medio: int = 2048) -> List[str]:
+    """
+    Divide o texto em blocos de linhas inteiras. Uma linha fecha o bloco quando
+    o CRC dela cai no divisor (e o bloco já tem o tamanho mínimo) ou quando o
+    bloco chega ao máximo; como a decisão depende só do conteúdo, trechos iguais
+    em textos diferentes voltam a gerar os mesmos blocos logo depois de um
+    trecho diferente (o código de cada estudante).
+    """
+    if tamanho_medio <= 0 or len(texto) <= tamanho_medio:
+        return [texto]
+    minimo, maximo = tamanho_medio // 4, tamanho_medio * 4
+    divisor = max(2, (tamanho_medio - minimo) // 40)  # ~40 caracteres por linha
+    blocos, atual, tamanho = [], [], 0
+    for linha in texto.splitlines(keepends=True):
+        atual.append(linha)
+        tamanho += len(linha)
+        if tamanho >= maximo or (tamanho >= minimo and zlib.crc32(linha.encode('utf-8')) % divisor == 0):
+            blocos.append(''.join(atual))
+            atual, tamanho = [], 0
+    if atual:
+        blocos.append(''.join(atual))
+    return blocos
+
+
+class ArmazemBlobs:
+    """Textos endereçados por conteúdo: o mesmo prompt (ou trecho de prompt) é gravado uma única vez."""
+
+    def __init__(self, diretorio: str = "output/blobs", nivel_compressao: int = 6,
+                 compressao: str = "zstd", tamanho_bloco: int = 2048):
+        self.diretorio = Path(diretorio)
+        self.nivel_compressao = nivel_compressao
+        self.compressao = compressao if compressao == "zstd" and zstandard is not None else "zlib"
+        self.tamanho_bloco = tamanho_bloco
+        self._ler_bloco = lru_cache(maxsize=512)(self._ler_dados)
+
+    @classmethod
+    def de_config(cls, config: Dict) -> "ArmazemBlobs":
+        artifacts_config = config.get('artifacts', {})
+        return cls(config.get('processing', {}).get('blob_dir', 'output/blobs'), artifacts_config.get('level', 6),
+                   artifacts_config.get('compression', 'zstd'), artifacts_config.get('chunk_size', 2048))
+
+    def _caminho(self, ref: str) -> Path:
+        return self.diretorio / ref[:2] / ref[2:]
+
+    def _comprimir(self, dados: bytes) -> bytes:
+        if self.compressao == "zstd":
+            return zstandard.ZstdCompressor(level=self.nivel_compressao).compress(dados)
+        return zlib.compress(dados, self.nivel_compressao)
+
+    @staticmethod
+    def _descomprimir(dados: bytes) -> bytes:
+        if dados[:4] == MAGICO_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Blob comprimido com zstd: instale o pacote 'zstandard' para lê-lo")
+            return zstandard.ZstdDecompressor().decompress(dados)
+        return zlib.decompress(dados)
+
+    def _gravar_dados(self, ref: str, dados: bytes):
+        caminho = self._caminho(ref)
+        if not caminho.exists():
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+            temporario.write_bytes(self._comprimir(dados))
+            os.replace(temporario, caminho)
+
+    def _ler_dados(self, ref: str) -> str:
+        return self._descomprimir(self._caminho(ref).read_bytes()).decode('utf-8')
+
+    def gravar(self, texto: str) -> str:
+        ref = hashlib.sha256(texto.encode('utf-8')).hexdigest()
+        if self._caminho(ref).exists():
+            return ref
+        blocos = cortar_blocos(texto, self.tamanho_bloco)
+        if len(blocos) == 1:
+            self._gravar_dados(ref, texto.encode('utf-8'))
+            return ref
+        refs = []
+        for bloco in blocos:
+            dados = bloco.encode('utf-8')
+            refs.append(hashlib.sha256(dados).hexdigest())
+            self._gravar_dados(refs[-1], dados)
+        self._gravar_dados(ref, (MARCADOR_BLOCOS + '\n'.join(refs)).encode('utf-8'))
+        return ref
+
+    def ler(self, ref: str) -> str:
+        texto = self._ler_dados(ref)
+        if texto.startswith(MARCADOR_BLOCOS):
+            return ''.join(self._ler_bloco(r) for r in texto[len(MARCADOR_BLOCOS):].split('\n'))
+        return texto
+
+    def tamanho_em_disco(self) -> Tuple[int, int]:
+        """Quantidade de arquivos e bytes ocupados no diretório do armazém."""
+        arquivos = [p for p in self.diretorio.rglob('*') if p.is_file()]
+        return len(arquivos), sum(p.stat().st_size for p in arquivos)
+
+
+def salvar_indice(caminho: Path, indice: Dict):
+    """Índice estudante -> tentativas -> referências (artifacts.index_file), gravado de forma atômica."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+    temporario.write_text(json.dumps(indice, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(temporario, caminho)
+
+
+class TentativaCompacta:
+    """
+    Tentativa do histórico com a mesma interface de leitura do dicionário
+    usado no modo normal (t['nota_final'], t.get('modelo'), t['notas_questoes']),
+    mas sem manter prompt e feedback em memória.
+    """
+    __slots__ = ('nota_final', 'tentativa_num', 'modelo', 'tokens_prompt', 'tokens_completion',
+                 'feedback_ref', 'prompt_ref', 'data_avaliacao', 'nivel', 'questoes', 'notas',
+                 'feedback_detalhado_ref', 'prompt_detalhado_ref')
+
+    def __init__(self, nota_final: float, tentativa_num: int, notas_questoes: Dict[str, float],
+                 questoes: Tuple[str, ...], feedback_ref: str = "", prompt_ref: str = "",
+                 modelo: Optional[str] = None, tokens_prompt: int = 0, tokens_completion: int = 0,
+                 data_avaliacao: str = "", nivel: int = 0):
+        self.nota_final = nota_final
+        self.tentativa_num = tentativa_num
+        self.modelo = modelo
+        self.tokens_prompt = tokens_prompt
+        self.tokens_completion = tokens_completion
+        self.feedback_ref = feedback_ref
+        self.prompt_ref = prompt_ref
+        self.data_avaliacao = data_avaliacao
+        self.nivel = nivel
+        # Feedback detalhado da segunda fase (feedback_mode em duas fases), gravado depois
+        self.feedback_detalhado_ref = ""
+        self.prompt_detalhado_ref = ""
+        # Tupla de IDs compartilhada entre todas as tentativas; questões sem nota ficam como NaN
+        self.questoes = questoes
+        self.notas = array('d', (notas_questoes.get(q, math.nan) for q in questoes))
+
+    @classmethod
+    def de_resultado(cls, resultado: Dict, questoes: Tuple[str, ...], armazem: ArmazemBlobs) -> "TentativaCompacta":
+        """Converte o dicionário montado em _registrar_resposta, gravando os textos no armazém."""
+        return cls(resultado['nota_final'], resultado['tentativa_num'], resultado['notas_questoes'], questoes,
+                   feedback_ref=armazem.gravar(resultado['feedback']),
+                   prompt_ref=armazem.gravar(resultado['prompt']) if resultado.get('prompt') else "",
+                   modelo=resultado.get('modelo'), tokens_prompt=resultado.get('tokens_prompt', 0),
+                   tokens_completion=resultado.get('tokens_completion', 0),
+                   data_avaliacao=resultado.get('data_avaliacao', ""), nivel=resultado.get('nivel', 0))
+
+    def atualizar_notas(self, notas_questoes: Dict[str, float], nota_final: float):
+        """Notas reextraídas da resposta guardada (eval.py rescore)."""
+        self.nota_final = nota_final
+        self.notas = array('d', (notas_questoes.get(q, math.nan) for q in self.questoes))
+
+    @property
+    def notas_questoes(self) -> Dict[str, float]:
+        return {q: n for q, n in zip(self.questoes, self.notas) if not math.isnan(n)}
+
+    def __getitem__(self, chave: str):
+        if chave == 'notas_questoes':
+            return self.notas_questoes
+        if chave in self.__slots__ and chave not in ('questoes', 'notas'):
+            # Registros gravados antes de um campo existir não têm o atributo
+            return getattr(self, chave, None)
+        raise KeyError(chave)
+
+    def __contains__(self, chave: str) -> bool:
+        try:
+            self[chave]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, chave: str, padrao=None):
+        try:
+            return self[chave]
+        except KeyError:
+            return padrao
@@ -0,0 +1,243 @@
+"""
+Avaliação compilada: o config.yaml validado e pré-processado uma única vez.
+
+A compilação valida o esquema (chaves obrigatórias, questões, templates e os
+campos que cada template usa) antes de qualquer chamada paga à API, e prepara
+o que antes era refeito a cada estudante e tentativa:
+
+* cabeçalho do prompt já formatado (a data entra uma vez por execução);
+* bloco de cada questão dividido em prefixo/sufixo em torno do código;
+* expressões regulares de extração das notas já compiladas;
+* mapa de pesos (max_points) das questões.
+
+O resultado fica em output/.cache/, indexado pelo sha256 do arquivo de
+configuração: enquanto o YAML não muda, as execuções seguintes carregam o
+pickle em vez de reanalisar o YAML.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import string
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+VERSAO = 4  # Incrementar quando a estrutura compilada mudar (invalida o cache)
+DIRETORIO_CACHE = Path("output/.cache")
+MARCADOR = "\x00{}\x00"
+
+CAMPOS_TEMPLATES = {
+    'header_detailed': {'assessment_name', 'current_date'},
+    'header_concise': {'assessment_name', 'current_date'},
+    'header_scoring': {'assessment_name', 'current_date'},
+    'question_block': {'question_name', 'question_id', 'max_points', 'rubric', 'code'},
+    'question_diff_block': {'question_name', 'question_id', 'max_points', 'rubric', 'similarity',
+                            'reference_grade', 'reference_comment', 'diff'},
+    'question_vpl_block': {'question_id', 'tests_passed', 'tests_total', 'failed_tests', 'compilation'},
+    'feedback_grades_block': {'grades'},
+}
+CRITERIOS = ('highest', 'average', 'lowest')
+AMOSTRAGENS = ('rounds', 'n', 'back_to_back')
+MODOS_FEEDBACK = ('inline', 'after_grading', 'on_demand')
+
+
+class ErroConfiguracao(ValueError):
+    def __init__(self, erros: List[str]):
+        super().__init__("; ".join(erros))
+        self.erros = erros
+
+
+@dataclass
+class QuestaoCompilada:
+    id: str
+    max_points: float
+    config: Dict
+    partes: Tuple[str, ...]  # question_block formatado, dividido onde entra o código
+
+    def renderizar(self, codigo: str) -> str:
+        return codigo.join(self.partes)
+
+
+@dataclass
+class AvaliacaoCompilada:
+    hash_config: str
+    questoes: List[QuestaoCompilada]
+    pesos: Dict[str, float]
+    partes_cabecalho: Tuple[str, ...]  # cabeçalho formatado, dividido onde entra a data
+    padrao_notas_questoes: "re.Pattern"
+    padroes_nota_final: Tuple["re.Pattern", ...]
+    avisos: List[str] = field(default_factory=list)
+    partes_cabecalho_feedback: Tuple[str, ...] = ()  # header_detailed da fase de feedback (modo em duas fases)
+
+    def cabecalho(self, data: str) -> str:
+        return data.join(self.partes_cabecalho)
+
+    def cabecalho_feedback(self, data: str) -> str:
+        return data.join(self.partes_cabecalho_feedback)
+
+
+def _formatar_partes(template: str, campo_variavel: str, **valores) -> Tuple[str, ...]:
+    marcador = MARCADOR.format(campo_variavel)
+    return tuple(template.format(**valores, **{campo_variavel: marcador}).split(marcador))
+
+
+def _campos(template: str) -> set:
+    return {nome.split('.')[0].split('[')[0] for _, nome, _, _ in string.Formatter().parse(template) if nome}
+
+
+def _nome_cabecalho(config: Dict) -> str:
+    """
+    Cabeçalho das tentativas: no modo em duas fases (feedback_mode diferente de
+    'inline') as tentativas pedem só as notas (header_scoring, ou header_concise
+    se não houver); no modo 'inline' vale detailed_feedback.
+    """
+    assessment_config = config['assessment']
+    if str(assessment_config.get('feedback_mode', 'inline')).lower() != 'inline':
+        return 'header_scoring' if 'header_scoring' in (config.get('prompt_templates') or {}) else 'header_concise'
+    return 'header_detailed' if assessment_config.get('detailed_feedback', False) else 'header_concise'
+
+
+def validar(config) -> Tuple[List[str], List[str]]:
+    """Erros (impedem a execução) e avisos do config; completa os valores padrão."""
+    erros, avisos = [], []
+    if not isinstance(config, dict) or not config:
+        return ["Arquivo de configuração está vazio"], avisos
+    for chave in ('api', 'questions', 'assessment'):
+        if chave not in config:
+            erros.append(f"Chave obrigatória '{chave}' não encontrada no config")
+    if erros:
+        return erros, avisos
+
+    assessment_config = config['assessment']
+    if 'llm_attempts' not in assessment_config:
+        avisos.append("Chave 'llm_attempts' não encontrada em 'assessment' no config. Usando padrão de 1.")
+        assessment_config['llm_attempts'] = 1
+    if not isinstance(assessment_config['llm_attempts'], int) or assessment_config['llm_attempts'] < 1:
+        erros.append("'assessment.llm_attempts' deve ser um inteiro >= 1")
+    if str(assessment_config.get('sampling', 'rounds')).lower() not in AMOSTRAGENS:
+        erros.append(f"'assessment.sampling' deve ser um de: {', '.join(AMOSTRAGENS)}")
+    criterio = str(assessment_config.get('selection_criteria', 'highest')).lower()
+    if criterio not in CRITERIOS:
+        avisos.append(f"Critério de seleção '{criterio}' inválido. Usando 'highest' como padrão.")
+    modo_feedback = str(assessment_config.get('feedback_mode', 'inline')).lower()
+    if modo_feedback not in MODOS_FEEDBACK:
+        erros.append(f"'assessment.feedback_mode' deve ser um de: {', '.join(MODOS_FEEDBACK)}")
+
+    api_config = config['api']
+    if 'url' not in api_config:
+        erros.append("'api.url' não encontrada no config")
+    if 'models' not in api_config:
+        api_config['models'] = ['llama-3.1-8b-instant']
+    elif not api_config['models']:
+        erros.append("'api.models' está vazia")
+
+    ids = set()
+    questoes = config['questions'] if isinstance(config['questions'], list) else []
+    if not questoes:
+        erros.append("'questions' deve ser uma lista com ao menos uma questão")
+    for i, questao in enumerate(questoes, 1):
+        questao_id = questao.get('id') if isinstance(questao, dict) else None
+        if not questao_id:
+            erros.append(f"Questão {i} sem 'id'")
+            continue
+        if questao_id in ids:
+            erros.append(f"Questão '{questao_id}' repetida")
+        ids.add(questao_id)
+        pontos = questao.get('max_points')
+        if not isinstance(pontos, (int, float)) or pontos <= 0:
+            erros.append(f"Questão '{questao_id}': 'max_points' deve ser um número positivo")
+        if not isinstance(questao.get('rubric'), str) or not questao['rubric'].strip():
+            erros.append(f"Questão '{questao_id}': 'rubric' ausente ou vazia")
+
+    templates = config.get('prompt_templates') or {}
+    obrigatorios = [_nome_cabecalho(config), 'question_block']
+    if modo_feedback in MODOS_FEEDBACK[1:]:
+        obrigatorios += ['header_detailed', 'feedback_grades_block']
+    for nome in obrigatorios:
+        if nome not in templates:
+            erros.append(f"Template 'prompt_templates.{nome}' não encontrado")
+    if (config.get('vpl') or {}).get('include_in_prompt') and 'question_vpl_block' not in templates:
+        erros.append("'vpl.include_in_prompt' ativo, mas 'prompt_templates.question_vpl_block' não foi encontrado")
+    for nome, template in templates.items():
+        if nome not in CAMPOS_TEMPLATES:
+            continue
+        try:
+            desconhecidos = _campos(template) - CAMPOS_TEMPLATES[nome]
+        except ValueError as e:
+            erros.append(f"Template '{nome}' malformado: {e}")
+            continue
+        if desconhecidos:
+            erros.append(f"Template '{nome}' usa campos desconhecidos: {', '.join(sorted(desconhecidos))} "
+                         f"(disponíveis: {', '.join(sorted(CAMPOS_TEMPLATES[nome]))})")
+            continue
+        try:
+            template.format(**{campo: '' for campo in CAMPOS_TEMPLATES[nome]})
+        except (IndexError, KeyError, ValueError) as e:
+            erros.append(f"Template '{nome}' não pode ser formatado: {type(e).__name__}: {e}")
+    return erros, avisos
+
+
+def compilar(config: Dict, hash_config: str = "") -> AvaliacaoCompilada:
+    erros, avisos = validar(config)
+    if erros:
+        raise ErroConfiguracao(erros)
+
+    templates = config['prompt_templates']
+    assessment_config = config['assessment']
+    cabecalho = templates[_nome_cabecalho(config)]
+    questoes = [QuestaoCompilada(q['id'], q['max_points'], q,
+                                 _formatar_partes(templates['question_block'], 'code', question_name=q.get('name', ''),
+                                                  question_id=q['id'], max_points=q['max_points'], rubric=q['rubric']))
+                for q in config['questions']]
+    return AvaliacaoCompilada(
+        hash_config=hash_config,
+        questoes=questoes,
+        pesos={q['id']: q['max_points'] for q in config['questions']},
+        partes_cabecalho=_formatar_partes(cabecalho, 'current_date',
+                                          assessment_name=assessment_config.get('name', 'Avaliação')),
+        padrao_notas_questoes=re.compile(r'QUESTAO_(\w+):\s*(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)',
+                                         re.IGNORECASE | re.MULTILINE),
+        padroes_nota_final=tuple(re.compile(p, re.IGNORECASE) for p in (
+            r'NOTA FINAL[:\s]+(\d+(?:\.\d+)?)', r'Total[:\s]+(\d+(?:\.\d+)?)', r'Pontuação[:\s]+(\d+(?:\.\d+)?)')),
+        avisos=avisos,
+        partes_cabecalho_feedback=_formatar_partes(templates['header_detailed'], 'current_date',
+                                                   assessment_name=assessment_config.get('name', 'Avaliação'))
+        if 'header_detailed' in templates else (),
+    )
+
+
+def carregar(config_path: str, diretorio_cache: Optional[Path] = DIRETORIO_CACHE,
+             gravar_cache: bool = True) -> Tuple[Dict, AvaliacaoCompilada, bool]:
+    """
+    Config e avaliação compilada do arquivo; o terceiro valor indica se vieram
+    do cache. Com 'gravar_cache' falso (comandos só de leitura) o cache
+    existente é usado, mas nada é gravado. Levanta FileNotFoundError,
+    yaml.YAMLError ou ErroConfiguracao.
+    """
+    dados = Path(config_path).read_bytes()
+    hash_config = hashlib.sha256(dados + f"|v{VERSAO}".encode()).hexdigest()
+    cache = Path(diretorio_cache) / f"avaliacao_{hash_config[:16]}.pkl" if diretorio_cache else None
+    if cache is not None and cache.exists():
+        try:
+            with open(cache, 'rb') as f:
+                config, avaliacao = pickle.load(f)
+            if avaliacao.hash_config == hash_config:
+                return config, avaliacao, True
+        except Exception:
+            pass  # Cache corrompido ou de outra versão: recompila
+
+    import yaml
+    config = yaml.safe_load(dados.decode('utf-8'))
+    avaliacao = compilar(config, hash_config)
+    if cache is not None and gravar_cache:
+        try:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            temporario = cache.with_name(f".{cache.name}.{os.getpid()}.tmp")
+            with open(temporario, 'wb') as f:
+                pickle.dump((config, avaliacao), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, cache)
+        except OSError:
+            pass  # Sem permissão de escrita: segue sem cache
+    return config, avaliacao, False
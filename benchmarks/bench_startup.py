@@ -0,0 +1,94 @@
+"""
+Benchmark de tempo de inicialização da CLI do eval.py.
+
+Mede o tempo de parede de subcomandos leves (que não devem importar
+pandas/scipy/aiohttp) e verifica quais módulos pesados são carregados ao
+importar o eval.py. Os comandos rodam num diretório temporário (com uma
+cópia do estado salvo, se houver), para não deixar output/.cache/ no
+repositório. Opcionalmente acrescenta o resultado a um arquivo JSONL
+para acompanhar a evolução entre versões.
+
+Uso:
+    python benchmarks/bench_startup.py [--repeticoes 10] [--jsonl output/bench_startup.jsonl]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+MODULOS_PESADOS = ('pandas', 'numpy', 'scipy', 'aiohttp')
+EVAL = str(RAIZ / 'eval.py')
+CONFIG = str(RAIZ / 'config' / 'config.yaml')
+
+CENARIOS = {
+    'import': [sys.executable, '-c', 'import eval'],
+    'help': [sys.executable, EVAL, '--help'],
+    'grade --help': [sys.executable, EVAL, 'grade', '--help'],
+    'status': [sys.executable, EVAL, 'status', '--config', CONFIG],
+}
+
+
+def _ambiente():
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(RAIZ), os.environ.get('PYTHONPATH')])))
+
+
+def preparar_diretorio(destino: Path):
+    estado = RAIZ / 'output' / 'processamento_state.pkl'
+    if estado.exists():
+        (destino / 'output').mkdir()
+        shutil.copy2(estado, destino / 'output' / estado.name)
+
+
+def medir(comando, repeticoes, cwd):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run(comando, cwd=cwd, env=_ambiente(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tempos.append(time.perf_counter() - inicio)
+    return {'mediana_ms': statistics.median(tempos) * 1000, 'min_ms': min(tempos) * 1000}
+
+
+def modulos_pesados_carregados(cwd):
+    codigo = ("import sys, eval; "
+              f"print(','.join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))")
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=cwd, env=_ambiente(), capture_output=True, text=True)
+    return [m for m in saida.stdout.strip().split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização do eval.py')
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--jsonl', help='Acrescenta o resultado a este arquivo JSONL.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as diretorio:
+        preparar_diretorio(Path(diretorio))
+        resultado = {'data': datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+                     'cenarios': {}, 'modulos_pesados_no_import': modulos_pesados_carregados(diretorio)}
+        print(f"{'Cenário':<16} {'Mediana (ms)':>14} {'Mínimo (ms)':>14}")
+        for nome, comando in CENARIOS.items():
+            medida = medir(comando, args.repeticoes, diretorio)
+            resultado['cenarios'][nome] = medida
+            print(f"{nome:<16} {medida['mediana_ms']:>14.1f} {medida['min_ms']:>14.1f}")
+
+    pesados = resultado['modulos_pesados_no_import']
+    print(f"Módulos pesados carregados por 'import eval': {', '.join(pesados) if pesados else 'nenhum'}")
+
+    if args.jsonl:
+        Path(args.jsonl).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.jsonl, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+    return 1 if pesados else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
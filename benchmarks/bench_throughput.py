@@ -0,0 +1,123 @@
+"""
+Benchmark de throughput do pipeline de avaliação, sem chamar a API real.
+
+Sobe o servidor LLM simulado, gera N estudantes × M questões sintéticos e
+executa o GerenciadorAvaliacao de ponta a ponta (descoberta, rodadas,
+consolidação e gravação dos feedbacks). Reporta tempo de parede,
+requisições/s, chamadas desperdiçadas e pico de memória.
+
+    python benchmarks/bench_throughput.py --estudantes 200 --questoes 3 --threads 8 \\
+        --latencia lognormal --latencia-media 0.3 --taxa-429 0.02 --jsonl output/bench_throughput.jsonl
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "benchmarks"))
+
+from gerar_submissoes import gerar_config, gerar_submissoes  # noqa: E402
+from mock_llm_server import (ServidorMockEmThread, adicionar_argumentos_cenario,  # noqa: E402
+                             cenario_dos_argumentos)
+
+
+def executar(args) -> dict:
+    import eval as avaliador
+
+    cenario = cenario_dos_argumentos(args)
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_testcode_") as tmp, ServidorMockEmThread(cenario) as servidor:
+        destino = Path(tmp)
+        gerar_submissoes(destino, args.estudantes, args.questoes, args.linhas, args.semente)
+        config = gerar_config(destino, args.questoes, servidor.url,
+                              assessment={'llm_attempts': args.tentativas},
+                              processing={'parallel_threads': args.threads, 'low_memory': args.baixo_consumo},
+                              api={'timeout': args.timeout})
+        os.environ.setdefault('API_KEY', 'mock')
+        os.chdir(destino)
+        try:
+            if args.memoria:
+                tracemalloc.start()
+            gerenciador = avaliador.GerenciadorAvaliacao(str(config))
+            gerenciador.configurar_logging(arquivo=False)
+            logging.getLogger().setLevel(logging.WARNING)
+
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                gerenciador.descobrir_submissoes("submissions")
+                asyncio.run(gerenciador.processar_submissoes())
+            tempo = time.perf_counter() - inicio
+
+            pico_tracemalloc = tracemalloc.get_traced_memory()[1] if args.memoria else None
+            if args.memoria:
+                tracemalloc.stop()
+        finally:
+            os.chdir(diretorio_original)
+
+    avaliacoes_ok = sum(len(s.historico_avaliacoes) for s in gerenciador.submissoes)
+    requisicoes = cenario.contadores.get('requisicoes', 0)
+    snapshot = gerenciador.metricas.snapshot()
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {k: v for k, v in vars(args).items() if k != 'jsonl'},
+        'tempo_s': round(tempo, 2),
+        'requisicoes': requisicoes,
+        'requisicoes_por_s': round(requisicoes / tempo, 2) if tempo else 0.0,
+        'avaliacoes_ok': avaliacoes_ok,
+        'avaliacoes_previstas': args.estudantes * args.tentativas,
+        'chamadas_desperdicadas': requisicoes - avaliacoes_ok,
+        'servidor': dict(cenario.contadores),
+        'latencia_cliente': snapshot['modelos'],
+        'pico_memoria_python_mb': round(pico_tracemalloc / 2**20, 1) if pico_tracemalloc else None,
+        'pico_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de throughput com servidor LLM simulado')
+    parser.add_argument('--estudantes', type=int, default=50)
+    parser.add_argument('--questoes', type=int, default=2)
+    parser.add_argument('--linhas', type=int, default=60, help='Linhas de código por arquivo')
+    parser.add_argument('--tentativas', type=int, default=1, help='assessment.llm_attempts')
+    parser.add_argument('--threads', type=int, default=5, help='processing.parallel_threads')
+    parser.add_argument('--timeout', type=float, default=10, help='api.timeout do cliente (s)')
+    parser.add_argument('--memoria', action='store_true', help='Mede o pico de memória Python com tracemalloc (mais lento).')
+    parser.add_argument('--baixo-consumo', action='store_true', help='Ativa processing.low_memory.')
+    parser.add_argument('--jsonl', help='Acrescenta o resultado a este arquivo JSONL.')
+    adicionar_argumentos_cenario(parser)
+    args = parser.parse_args()
+
+    resultado = executar(args)
+    print("=" * 70)
+    print(f"Estudantes × questões × tentativas: {args.estudantes} × {args.questoes} × {args.tentativas} "
+          f"({args.threads} threads)")
+    print(f"Tempo de parede:        {resultado['tempo_s']:.2f}s")
+    print(f"Requisições:            {resultado['requisicoes']} ({resultado['requisicoes_por_s']:.2f}/s)")
+    print(f"Avaliações bem-sucedidas: {resultado['avaliacoes_ok']}/{resultado['avaliacoes_previstas']}")
+    print(f"Chamadas desperdiçadas: {resultado['chamadas_desperdicadas']}  (servidor: {resultado['servidor']})")
+    if resultado['pico_memoria_python_mb'] is not None:
+        print(f"Pico de memória Python: {resultado['pico_memoria_python_mb']} MB")
+    print(f"Pico de RSS (processo): {resultado['pico_rss_mb']} MB")
+    print("=" * 70)
+
+    if args.jsonl:
+        Path(args.jsonl).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.jsonl, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Gerador de submissões sintéticas para benchmarks (N estudantes × M questões).
+
+Cria a estrutura produzida pelo './run.sh prepare' ("Nome - login/<data>/Qk.py"
+mais a pasta .ceg com execution.txt) e um config.yaml apontando para o
+servidor simulado.
+
+    python benchmarks/gerar_submissoes.py /tmp/bench --estudantes 200 --questoes 3
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+import yaml
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def gerar_submissoes(destino: Path, estudantes: int, questoes: int, linhas_codigo: int = 60,
+                     semente: int = 42) -> Path:
+    rng = random.Random(semente)
+    pasta = destino / "submissions"
+    pasta.mkdir(parents=True, exist_ok=True)
+    for i in range(estudantes):
+        aluno = pasta / f"Estudante{i:05d} Sintetico - aluno{i:05d}"
+        envio = aluno / "2025-01-01-10-00-00"
+        ceg = aluno / "2025-01-01-10-00-00.ceg"
+        envio.mkdir(parents=True, exist_ok=True)
+        ceg.mkdir(exist_ok=True)
+        execucao = ["<|--", "--|>", ""]
+        for q in range(1, questoes + 1):
+            corpo = [f"# Questão {q} do estudante {i}", f"class Q{q}:"]
+            corpo += [f"    def metodo_{k}(self, x):\n        return x * {rng.randint(1, 9)} + {k}"
+                      for k in range(linhas_codigo // 2)]
+            (envio / f"Q{q}.py").write_text("\n".join(corpo) + "\n", encoding="utf-8")
+            percentual = rng.choice([0, 50, 70, 90, 100])
+            execucao += ["<|--", f"-Question {q}:", "", f"Avaliação: 0/1 ({percentual:.2f}%)", "--|>", ""]
+        (ceg / "execution.txt").write_text("\n".join(execucao) + "\n", encoding="utf-8")
+    return pasta
+
+
+def gerar_config(destino: Path, questoes: int, url: str, **sobrescritas) -> Path:
+    with open(RAIZ / "config" / "config.yaml", 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    pontos = round(100 / questoes, 2)
+    config['questions'] = [{
+        'id': f"Q{q}", 'name': f"Questão sintética {q}", 'max_points': pontos,
+        'accepted_extensions': ['.py'],
+        'rubric': f"Avalie a questão {q}. Termine com: QUESTAO_Q{q}: XX/{pontos}",
+    } for q in range(1, questoes + 1)]
+    config['api'].update({'url': url, 'models': ['mock-pequeno', 'mock-grande'], 'timeout': 10})
+    config.setdefault('processing', {}).update({'stagger_delay': 0, 'round_wait': 0})
+    config.setdefault('metrics', {}).update({'jsonl': False, 'dashboard': False, 'http_port': 0})
+    for secao, valores in sobrescritas.items():
+        config.setdefault(secao, {}).update(valores)
+    caminho = destino / "config" / "config.yaml"
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    return caminho
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera submissões sintéticas para benchmarks')
+    parser.add_argument('destino')
+    parser.add_argument('--estudantes', type=int, default=100)
+    parser.add_argument('--questoes', type=int, default=2)
+    parser.add_argument('--linhas', type=int, default=60, help='Linhas de código por arquivo')
+    parser.add_argument('--url', default='http://127.0.0.1:8765/v1/chat/completions')
+    args = parser.parse_args()
+    destino = Path(args.destino)
+    gerar_submissoes(destino, args.estudantes, args.questoes, args.linhas)
+    print(f"Config gerado em {gerar_config(destino, args.questoes, args.url)}")
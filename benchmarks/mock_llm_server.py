@@ -0,0 +1,195 @@
+"""
+Servidor LLM simulado, compatível com a API OpenAI (/v1/chat/completions).
+
+Gera respostas determinísticas (semente fixa + hash do prompt) no formato
+esperado pelo eval.py ("QUESTAO_Qx: nota/max") e permite injetar falhas:
+latências configuráveis, rajadas de 429, timeouts e saídas malformadas.
+Latência e falhas também são sorteadas a partir da semente, do hash do corpo
+da requisição e de quantas vezes esse mesmo corpo já chegou, e não da ordem de
+chegada: a mesma execução recebe as mesmas falhas com qualquer concorrência.
+Por isso uma rajada de 429 recusa as próximas tentativas do mesmo corpo.
+Usado pelo benchmark de throughput, mas também pode rodar isolado:
+
+    python benchmarks/mock_llm_server.py --porta 8765 --latencia lognormal --taxa-429 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+from aiohttp import web
+
+PADRAO_QUESTAO = re.compile(r'QUESTAO_(\w+): \[NOTA\]/(\d+(?:\.\d+)?)')
+
+
+@dataclass
+class CenarioMock:
+    semente: int = 42
+    latencia: str = "lognormal"        # "fixa", "uniforme" ou "lognormal"
+    latencia_media: float = 0.5        # segundos
+    latencia_sigma: float = 0.4        # dispersão (lognormal) ou meia-amplitude (uniforme)
+    tokens_por_s: float = 0.0          # > 0 acrescenta tempo proporcional aos tokens gerados
+    tokens_resposta: int = 400
+    taxa_429: float = 0.0              # probabilidade de iniciar uma rajada de 429
+    rajada_429: int = 1                # tentativas seguidas do mesmo corpo recusadas em cada rajada
+    taxa_timeout: float = 0.0          # probabilidade de a requisição "travar"
+    duracao_timeout: float = 600.0
+    taxa_malformada: float = 0.0       # probabilidade de resposta sem notas / JSON inválido
+    contadores: Dict[str, int] = field(default_factory=dict)
+
+    def contar(self, chave: str):
+        self.contadores[chave] = self.contadores.get(chave, 0) + 1
+
+
+def criar_app(cenario: CenarioMock) -> web.Application:
+    vistos: Dict[str, int] = {}     # hash do corpo -> requisições recebidas com ele
+    rajadas: Dict[str, int] = {}    # hash do corpo -> recusas 429 restantes na rajada
+
+    def rng_requisicao(dados: Dict) -> Tuple[str, random.Random]:
+        corpo = hashlib.sha256(json.dumps(dados, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        indice = vistos.get(corpo, 0)
+        vistos[corpo] = indice + 1
+        semente = int(hashlib.sha256(f"{cenario.semente}:{corpo}:{indice}".encode()).hexdigest()[:12], 16)
+        return corpo, random.Random(semente)
+
+    def amostrar_latencia(rng: random.Random) -> float:
+        if cenario.latencia == "fixa":
+            return cenario.latencia_media
+        if cenario.latencia == "uniforme":
+            return max(0.0, rng.uniform(cenario.latencia_media - cenario.latencia_sigma,
+                                        cenario.latencia_media + cenario.latencia_sigma))
+        # lognormal com a média pedida
+        import math
+        mu = math.log(max(cenario.latencia_media, 1e-6)) - cenario.latencia_sigma ** 2 / 2
+        return rng.lognormvariate(mu, cenario.latencia_sigma)
+
+    def conteudo(prompt: str, indice: int) -> str:
+        semente = int(hashlib.sha256(f"{cenario.semente}:{indice}:{prompt}".encode()).hexdigest()[:12], 16)
+        rng_resposta = random.Random(semente)
+        linhas = ["## Análise simulada", "Resposta gerada pelo servidor de benchmark. " * 4]
+        for questao_id, maximo in PADRAO_QUESTAO.findall(prompt):
+            nota = rng_resposta.randint(0, int(float(maximo)))
+            linhas.append(f"QUESTAO_{questao_id}: {nota}/{maximo} - comentário simulado")
+        return "\n".join(linhas)
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        cenario.contar('requisicoes')
+        dados = await request.json()
+        prompt = dados['messages'][-1]['content']
+        n = int(dados.get('n', 1) or 1)
+        corpo, rng = rng_requisicao(dados)
+
+        if rajadas.get(corpo, 0) > 0 or rng.random() < cenario.taxa_429:
+            rajadas[corpo] = (rajadas.get(corpo) or cenario.rajada_429) - 1
+            cenario.contar('status_429')
+            return web.json_response({'error': {'message': 'Rate limit reached (mock)'}}, status=429,
+                                     headers={'retry-after': '1', 'x-ratelimit-remaining-requests': '0'})
+
+        if rng.random() < cenario.taxa_timeout:
+            cenario.contar('timeouts')
+            await asyncio.sleep(cenario.duracao_timeout)
+
+        tokens = min(int(dados.get('max_tokens', cenario.tokens_resposta)), cenario.tokens_resposta)
+        espera = amostrar_latencia(rng)
+        if cenario.tokens_por_s > 0:
+            espera += tokens * n / cenario.tokens_por_s
+        await asyncio.sleep(espera)
+
+        if rng.random() < cenario.taxa_malformada:
+            cenario.contar('malformadas')
+            if rng.random() < 0.5:
+                return web.Response(text='{"choices": [', content_type='application/json')
+            return web.json_response({'choices': [{'index': 0, 'message': {'content': 'Sem nota.'}}]})
+
+        cenario.contar('sucessos')
+        tokens_prompt = len(prompt) // 4
+        return web.json_response({
+            'id': f"mock-{cenario.contadores['requisicoes']}",
+            'model': dados.get('model'),
+            'choices': [{'index': i, 'message': {'role': 'assistant', 'content': conteudo(prompt, i)},
+                         'finish_reason': 'length' if tokens < cenario.tokens_resposta else 'stop'}
+                        for i in range(n)],
+            'usage': {'prompt_tokens': tokens_prompt, 'completion_tokens': tokens * n,
+                      'total_tokens': tokens_prompt + tokens * n},
+        }, headers={'x-ratelimit-remaining-requests': '1000', 'x-ratelimit-remaining-tokens': '1000000'})
+
+    async def estatisticas(request: web.Request) -> web.Response:
+        return web.json_response(cenario.contadores)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/v1/chat/completions', completions)
+    app.router.add_get('/stats', estatisticas)
+    return app
+
+
+class ServidorMockEmThread:
+    """Executa o servidor simulado em uma thread própria (com event loop separado)."""
+
+    def __init__(self, cenario: CenarioMock, porta: int = 0):
+        self.cenario = cenario
+        self.porta = porta
+        self._pronto = threading.Event()
+        self._loop = None
+        self._runner = None
+
+    def __enter__(self):
+        threading.Thread(target=self._executar, daemon=True, name='mock-llm').start()
+        self._pronto.wait(10)
+        return self
+
+    def __exit__(self, *exc):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.porta}/v1/chat/completions"
+
+    def _executar(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(criar_app(self.cenario), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', self.porta)
+        self._loop.run_until_complete(site.start())
+        self.porta = site._server.sockets[0].getsockname()[1]
+        self._pronto.set()
+        self._loop.run_forever()
+
+
+def adicionar_argumentos_cenario(parser: argparse.ArgumentParser):
+    padrao = CenarioMock()
+    parser.add_argument('--semente', type=int, default=padrao.semente)
+    parser.add_argument('--latencia', choices=['fixa', 'uniforme', 'lognormal'], default=padrao.latencia)
+    parser.add_argument('--latencia-media', type=float, default=padrao.latencia_media)
+    parser.add_argument('--latencia-sigma', type=float, default=padrao.latencia_sigma)
+    parser.add_argument('--tokens-por-s', type=float, default=padrao.tokens_por_s)
+    parser.add_argument('--tokens-resposta', type=int, default=padrao.tokens_resposta)
+    parser.add_argument('--taxa-429', type=float, default=padrao.taxa_429)
+    parser.add_argument('--rajada-429', type=int, default=padrao.rajada_429)
+    parser.add_argument('--taxa-timeout', type=float, default=padrao.taxa_timeout)
+    parser.add_argument('--duracao-timeout', type=float, default=padrao.duracao_timeout)
+    parser.add_argument('--taxa-malformada', type=float, default=padrao.taxa_malformada)
+
+
+def cenario_dos_argumentos(args) -> CenarioMock:
+    return CenarioMock(semente=args.semente, latencia=args.latencia, latencia_media=args.latencia_media,
+                       latencia_sigma=args.latencia_sigma, tokens_por_s=args.tokens_por_s,
+                       tokens_resposta=args.tokens_resposta, taxa_429=args.taxa_429, rajada_429=args.rajada_429,
+                       taxa_timeout=args.taxa_timeout, duracao_timeout=args.duracao_timeout,
+                       taxa_malformada=args.taxa_malformada)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor LLM simulado (compatível com OpenAI)')
+    parser.add_argument('--porta', type=int, default=8765)
+    adicionar_argumentos_cenario(parser)
+    args = parser.parse_args()
+    web.run_app(criar_app(cenario_dos_argumentos(args)), host='127.0.0.1', port=args.porta)
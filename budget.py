@@ -0,0 +1,144 @@
+"""
+Orçamento de cada requisição: max_tokens e timeout (seção 'budget').
+
+A partir das respostas já recebidas, o orçamento aprende:
+
+* a velocidade de cada modelo (tokens de saída por segundo de chamada);
+* o tamanho da saída de cada questão, por perfil de prompt ('notas' nas
+  tentativas que pedem só as notas, 'completo' nas demais): a resposta é
+  cortada nas linhas "QUESTAO_<id>: nota/máximo" e cada trecho recebe a
+  fração proporcional dos tokens de saída; o que vem depois da última nota
+  conta como parte fixa do perfil.
+
+As amostras de cada questão são indexadas pela impressão da rubrica e da
+pontuação (similarity.chave_questao), e a parte fixa pela dos templates de
+prompt: outra avaliação com os mesmos ids (Q1, Q2, ...) não herda tamanhos
+de uma rubrica diferente. A velocidade é indexada pela URL da API e o modelo.
+
+Com amostras suficientes, max_tokens = soma do quantil (budget.quantile) de
+cada questão enviada mais a parte fixa, com a margem de segurança, limitado a
+api.max_tokens/api.scoring_max_tokens; o timeout cobre esse max_tokens na
+velocidade do quantil mais lento do modelo, mais uma folga fixa, limitado ao
+timeout configurado. Sem amostras, valem os limites configurados. Uma
+resposta cortada por max_tokens (finish_reason "length") é repetida com o
+limite configurado, e as retentativas após timeout usam o timeout configurado.
+
+As amostras ficam em output/.cache/orcamento.json entre execuções.
+"""
+
+import json
+import math
+import os
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from metrics import percentil
+
+
+class OrcamentoRequisicoes:
+    def __init__(self, quantil: float = 95, margem: float = 0.25, amostras_minimas: int = 10,
+                 min_tokens: int = 128, timeout_minimo: float = 15, folga_timeout: float = 10,
+                 janela: int = 500, arquivo: Optional[Path] = None, chaves: Optional[Dict[str, str]] = None,
+                 escopo_modelos: str = ''):
+        self.quantil = quantil
+        self.margem = margem
+        self.amostras_minimas = amostras_minimas
+        self.min_tokens = min_tokens
+        self.timeout_minimo = timeout_minimo
+        self.folga_timeout = folga_timeout
+        self.janela = janela
+        self.arquivo = Path(arquivo) if arquivo else None
+        self.chaves = chaves or {}
+        self.escopo_modelos = escopo_modelos
+        self.taxas: Dict[str, deque] = {}
+        self.saidas: Dict[str, deque] = {}
+        self.truncadas = 0
+
+    @classmethod
+    def de_config(cls, config: Dict, chaves: Optional[Dict[str, str]] = None,
+                  escopo_modelos: str = '') -> "OrcamentoRequisicoes":
+        """'chaves': id da questão ('' para a parte fixa) -> impressão usada nas amostras."""
+        orcamento = cls(config.get('quantile', 95), config.get('safety_margin', 0.25),
+                        config.get('min_samples', 10), config.get('min_tokens', 128),
+                        config.get('min_timeout_seconds', 15), config.get('timeout_slack_seconds', 10),
+                        config.get('window', 500), config.get('cache_file', 'output/.cache/orcamento.json'),
+                        chaves, escopo_modelos)
+        orcamento.carregar()
+        return orcamento
+
+    def _amostras(self, tabela: Dict[str, deque], chave: str) -> deque:
+        if chave not in tabela:
+            tabela[chave] = deque(maxlen=self.janela)
+        return tabela[chave]
+
+    def _chave_saida(self, perfil: str, questao: str) -> str:
+        return f"{perfil}|{self.chaves.get(questao, questao)}"
+
+    def _chave_taxa(self, modelo: str) -> str:
+        return f"{self.escopo_modelos}|{modelo}" if self.escopo_modelos else modelo
+
+    def registrar(self, modelo: str, perfil: str, resposta: str, tokens_saida: int, latencia: Optional[float],
+                  padrao_notas_questoes):
+        """Acrescenta as amostras de uma resposta completa (sem os tokens de uso, estima 4 caracteres/token)."""
+        tokens_saida = tokens_saida or math.ceil(len(resposta) / 4)
+        if latencia and tokens_saida:
+            self._amostras(self.taxas, self._chave_taxa(modelo)).append(tokens_saida / latencia)
+        fim_anterior, trechos = 0, {}
+        for match in padrao_notas_questoes.finditer(resposta):
+            fim_linha = resposta.find('\n', match.end())
+            fim = len(resposta) if fim_linha < 0 else fim_linha
+            trechos[match.group(1)] = trechos.get(match.group(1), 0) + fim - fim_anterior
+            fim_anterior = fim
+        if not trechos or not resposta:
+            return
+        trechos[''] = len(resposta) - fim_anterior
+        for questao, caracteres in trechos.items():
+            amostras = self._amostras(self.saidas, self._chave_saida(perfil, questao))
+            amostras.append(tokens_saida * caracteres / len(resposta))
+
+    def max_tokens(self, perfil: str, questoes: List[str], teto: int) -> int:
+        previsao = 0.0
+        for questao in list(questoes) + ['']:
+            amostras = self.saidas.get(self._chave_saida(perfil, questao))
+            if not amostras or len(amostras) < self.amostras_minimas:
+                return teto
+            previsao += percentil(amostras, self.quantil)
+        previsao *= 1 + self.margem
+        return int(min(teto, max(self.min_tokens, math.ceil(previsao / 64) * 64)))
+
+    def timeout(self, modelo: str, max_tokens: int, teto: float) -> float:
+        taxas = self.taxas.get(self._chave_taxa(modelo))
+        if not taxas or len(taxas) < self.amostras_minimas:
+            return teto
+        taxa_lenta = max(percentil(taxas, 100 - self.quantil), 1e-3)
+        previsao = self.folga_timeout + max_tokens / taxa_lenta * (1 + self.margem)
+        return round(min(teto, max(self.timeout_minimo, previsao)), 1)
+
+    def registrar_truncamento(self):
+        self.truncadas += 1
+
+    def carregar(self):
+        if not self.arquivo:
+            return
+        try:
+            dados = json.loads(self.arquivo.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return
+        for nome in ('taxas', 'saidas'):
+            tabela = getattr(self, nome)
+            for chave, amostras in dados.get(nome, {}).items():
+                self._amostras(tabela, chave).extend(amostras)
+
+    def salvar(self):
+        if not self.arquivo:
+            return
+        dados = {nome: {chave: [round(v, 3) for v in amostras] for chave, amostras in getattr(self, nome).items()}
+                 for nome in ('taxas', 'saidas')}
+        try:
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            temporario = self.arquivo.with_name(f".{self.arquivo.name}.{os.getpid()}.tmp")
+            temporario.write_text(json.dumps(dados), encoding='utf-8')
+            os.replace(temporario, self.arquivo)
+        except OSError:
+            pass
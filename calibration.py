@@ -0,0 +1,215 @@
+"""
+Calibração das notas da LLM contra as notas do Moodle/VPL.
+
+A partir de uma execução rotulada (estudantes com execution.txt avaliados por
+vários modelos e tentativas), ajusta por questão e por modelo uma curva que
+corrige viés/escala da nota da LLM (regressão linear ou isotônica), e simula
+combinações de modelos × llm_attempts para recomendar a mais barata que atinge
+a concordância alvo. O resultado fica em output/calibracao.json e é aplicado em
+_consolidar_resultados_finais quando calibration.apply está ativo.
+"""
+
+import bisect
+import hashlib
+import json
+from dataclasses import dataclass, field
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def ajustar_linear(xs: Sequence[float], ys: Sequence[float]) -> Dict:
+    n = len(xs)
+    media_x, media_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - media_x) ** 2 for x in xs)
+    if sxx == 0:
+        return {'tipo': 'linear', 'a': 1.0, 'b': media_y - media_x}
+    a = sum((x - media_x) * (y - media_y) for x, y in zip(xs, ys)) / sxx
+    return {'tipo': 'linear', 'a': a, 'b': media_y - a * media_x}
+
+
+def ajustar_isotonico(xs: Sequence[float], ys: Sequence[float]) -> Dict:
+    """Regressão isotônica (não decrescente) pelo algoritmo pool-adjacent-violators."""
+    blocos = []  # [soma_y, peso, x_min, x_max]
+    for x, y in sorted(zip(xs, ys)):
+        blocos.append([y, 1, x, x])
+        while len(blocos) > 1 and blocos[-2][0] / blocos[-2][1] > blocos[-1][0] / blocos[-1][1]:
+            soma, peso, _, x_max = blocos.pop()
+            blocos[-1][0] += soma
+            blocos[-1][1] += peso
+            blocos[-1][3] = x_max
+    pontos_x, pontos_y = [], []
+    for soma, peso, x_min, x_max in blocos:
+        for x in (x_min, x_max) if x_max > x_min else (x_min,):
+            pontos_x.append(x)
+            pontos_y.append(soma / peso)
+    return {'tipo': 'isotonic', 'x': pontos_x, 'y': pontos_y}
+
+
+def aplicar_ajuste(ajuste: Optional[Dict], nota: float, maximo: float) -> float:
+    if not ajuste:
+        return nota
+    if ajuste['tipo'] == 'linear':
+        corrigida = ajuste['a'] * nota + ajuste['b']
+    else:
+        xs, ys = ajuste['x'], ajuste['y']
+        i = bisect.bisect_left(xs, nota)
+        if i == 0:
+            corrigida = ys[0]
+        elif i == len(xs):
+            corrigida = ys[-1]
+        elif xs[i] == nota or xs[i] == xs[i - 1]:
+            corrigida = ys[i]
+        else:
+            peso = (nota - xs[i - 1]) / (xs[i] - xs[i - 1])
+            corrigida = ys[i - 1] + peso * (ys[i] - ys[i - 1])
+    return round(min(max(corrigida, 0.0), maximo), 2)
+
+
+@dataclass
+class Amostra:
+    """Um estudante rotulado: notas do Moodle por questão e tentativas da LLM em ordem."""
+    login: str
+    moodle: Dict[str, float]
+    tentativas: List[Tuple[str, Dict[str, float], float]]  # (modelo, notas por questão, custo USD)
+
+
+@dataclass
+class Calibracao:
+    metodo: str
+    ajustes: Dict[str, Dict[str, Dict]] = field(default_factory=dict)   # questão -> modelo -> ajuste
+    recomendacao: Dict = field(default_factory=dict)
+    candidatos: List[Dict] = field(default_factory=list)
+
+    def corrigir(self, questao: str, modelo: Optional[str], nota: float, maximo: float) -> float:
+        return aplicar_ajuste(self.ajustes.get(questao, {}).get(modelo or ''), nota, maximo)
+
+    def salvar(self, caminho: Path):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump({'metodo': self.metodo, 'ajustes': self.ajustes, 'recomendacao': self.recomendacao,
+                       'candidatos': self.candidatos}, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def carregar(cls, caminho: Path) -> "Calibracao":
+        with open(caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        return cls(dados.get('metodo', 'isotonic'), dados.get('ajustes', {}),
+                   dados.get('recomendacao', {}), dados.get('candidatos', []))
+
+
+def _custo(modelo: str, tokens_prompt: int, tokens_completion: int, precos: Dict) -> float:
+    preco = precos.get(modelo, {})
+    return (tokens_prompt * preco.get('input', 0.0) + tokens_completion * preco.get('output', 0.0)) / 1_000_000
+
+
+def montar_amostras(submissoes, questoes: Sequence[str], precos: Dict) -> List[Amostra]:
+    amostras = []
+    for sub in submissoes:
+        moodle = {q: sub.notas_moodle_pontos[q] for q in questoes if q in sub.notas_moodle_pontos}
+        if not moodle or not sub.historico_avaliacoes:
+            continue
+        tentativas = [(t.get('modelo') or '', t['notas_questoes'],
+                       _custo(t.get('modelo') or '', t.get('tokens_prompt', 0), t.get('tokens_completion', 0), precos))
+                      for t in sorted(sub.historico_avaliacoes, key=lambda t: t['tentativa_num'])]
+        amostras.append(Amostra(sub.login, moodle, tentativas))
+    return amostras
+
+
+def _na_validacao(login: str, fracao: float) -> bool:
+    # Divisão determinística treino/validação pelo login
+    return int(hashlib.sha1(login.encode()).hexdigest()[:8], 16) % 1000 < fracao * 1000
+
+
+def ajustar(amostras: Sequence[Amostra], questoes: Dict[str, float], metodo: str,
+            min_amostras: int) -> Dict[str, Dict[str, Dict]]:
+    pares: Dict[Tuple[str, str], Tuple[List[float], List[float]]] = {}
+    for amostra in amostras:
+        for modelo, notas, _ in amostra.tentativas:
+            for q in amostra.moodle:
+                xs, ys = pares.setdefault((q, modelo), ([], []))
+                xs.append(notas.get(q, 0.0))
+                ys.append(amostra.moodle[q])
+    funcao = ajustar_isotonico if metodo == 'isotonic' else ajustar_linear
+    ajustes: Dict[str, Dict[str, Dict]] = {}
+    for (q, modelo), (xs, ys) in pares.items():
+        if len(xs) >= min_amostras and q in questoes:
+            ajustes.setdefault(q, {})[modelo] = funcao(xs, ys)
+    return ajustes
+
+
+def _consolidar(avaliacoes: List[Tuple[float, Dict[str, float]]], criterio: str) -> Dict[str, float]:
+    """Mesmo critério de seleção de _consolidar_resultados_finais, sobre (nota_final, notas por questão)."""
+    if criterio == 'lowest':
+        return min(avaliacoes, key=lambda a: a[0])[1]
+    if criterio == 'average':
+        media = sum(a[0] for a in avaliacoes) / len(avaliacoes)
+        return min(avaliacoes, key=lambda a: abs(a[0] - media))[1]
+    return max(avaliacoes, key=lambda a: a[0])[1]
+
+
+def avaliar_candidato(amostras: Sequence[Amostra], modelos: Sequence[str], tentativas: int,
+                      ajustes: Optional[Dict], questoes: Dict[str, float], criterio: str,
+                      tolerancia: float) -> Optional[Dict]:
+    """
+    Simula a execução com o conjunto de modelos e o número de tentativas dados,
+    usando as primeiras tentativas de cada estudante feitas por esses modelos.
+    """
+    concordantes, pares, custo, estudantes, erro_abs = 0, 0, 0.0, 0, 0.0
+    for amostra in amostras:
+        usadas = [t for t in amostra.tentativas if t[0] in modelos][:tentativas]
+        if len(usadas) < tentativas:
+            continue
+        avaliacoes = []
+        for modelo, notas, _ in usadas:
+            corrigidas = {q: aplicar_ajuste((ajustes or {}).get(q, {}).get(modelo), notas.get(q, 0.0), maximo)
+                          for q, maximo in questoes.items()}
+            avaliacoes.append((sum(corrigidas.values()), corrigidas))
+        selecionadas = _consolidar(avaliacoes, criterio)
+        for q, nota_moodle in amostra.moodle.items():
+            if q in selecionadas:
+                diferenca = abs(selecionadas[q] - nota_moodle)
+                concordantes += diferenca <= tolerancia
+                erro_abs += diferenca
+                pares += 1
+        custo += sum(t[2] for t in usadas)
+        estudantes += 1
+    if not pares:
+        return None
+    return {'modelos': list(modelos), 'llm_attempts': tentativas, 'estudantes': estudantes,
+            'concordancia': round(concordantes / pares * 100, 1), 'erro_medio': round(erro_abs / pares, 2),
+            'custo_usd_por_estudante': round(custo / estudantes, 6)}
+
+
+def calibrar(submissoes, questoes: Dict[str, float], precos: Dict, criterio: str = 'highest',
+             metodo: str = 'isotonic', alvo: float = 80.0, tolerancia: float = 1.0, min_amostras: int = 8,
+             validacao: float = 0.3, max_modelos: int = 3) -> Calibracao:
+    """
+    Ajusta as curvas em uma parte dos estudantes rotulados, mede a concordância
+    de cada combinação (modelos, tentativas) na parte separada para validação e
+    recomenda a combinação mais barata que atinge o alvo (ou, se nenhuma atingir,
+    a de maior concordância). As curvas finais usam todos os estudantes.
+    """
+    amostras = montar_amostras(submissoes, list(questoes), precos)
+    treino = [a for a in amostras if not _na_validacao(a.login, validacao)]
+    teste = [a for a in amostras if _na_validacao(a.login, validacao)] or treino
+    ajustes_treino = ajustar(treino, questoes, metodo, min_amostras)
+
+    modelos = sorted({t[0] for a in amostras for t in a.tentativas if t[0]})
+    max_tentativas = max((len(a.tentativas) for a in amostras), default=0)
+    candidatos = []
+    for tamanho in range(1, min(max_modelos, len(modelos)) + 1):
+        for conjunto in combinations(modelos, tamanho):
+            for n in range(1, max_tentativas + 1):
+                resultado = avaliar_candidato(teste, conjunto, n, ajustes_treino, questoes, criterio, tolerancia)
+                if resultado and resultado['estudantes'] >= min_amostras:
+                    bruto = avaliar_candidato(teste, conjunto, n, None, questoes, criterio, tolerancia)
+                    resultado['concordancia_sem_calibracao'] = bruto['concordancia']
+                    candidatos.append(resultado)
+
+    candidatos.sort(key=lambda c: (c['custo_usd_por_estudante'], c['llm_attempts'], -c['concordancia']))
+    atingem = [c for c in candidatos if c['concordancia'] >= alvo]
+    recomendacao = dict(atingem[0] if atingem else max(candidatos, key=lambda c: c['concordancia'], default={}))
+    if recomendacao:
+        recomendacao.update({'alvo': alvo, 'atinge_alvo': bool(atingem)})
+    return Calibracao(metodo, ajustar(amostras, questoes, metodo, min_amostras), recomendacao, candidatos)
@@ -0,0 +1,54 @@
+"""
+Avaliação em cascata: todos os estudantes passam primeiro pelos modelos do
+nível mais barato (cascade.tiers[0]); só sobem para o nível seguinte os casos
+em que algum sinal de confiança falha:
+
+* falha_extracao     - resposta inválida ou sem a nota de alguma questão;
+* divergencia        - tentativas do mesmo nível discordam além de max_spread_percent;
+* fronteira          - nota perto de um limite da rubrica (boundaries_percent ± boundary_margin_percent);
+* divergencia_moodle - distância grande da nota do execution.txt do Moodle/VPL.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+MOTIVOS = ('falha_extracao', 'divergencia', 'fronteira', 'divergencia_moodle')
+
+
+def niveis_cascata(config: Dict) -> List[List[str]]:
+    """Modelos de cada nível; sem cascata ativa há um único nível com api.models."""
+    cascade_config = config.get('cascade', {})
+    if cascade_config.get('enabled') and cascade_config.get('tiers'):
+        return [list(nivel) for nivel in cascade_config['tiers']]
+    return [list(config['api']['models'])]
+
+
+def motivos_escalonamento(tentativas: Sequence, questoes: Dict[str, float], nota_moodle: Optional[float],
+                          esperadas: int, cascade_config: Dict,
+                          enviadas: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Sinais de baixa confiança nas tentativas de um nível. Lista vazia: o
+    resultado do nível é aceito e o estudante não sobe na cascata.
+    'questoes' (id -> pontuação máxima) dá o total para os limites; a extração
+    só cobra as questões 'enviadas' (todas, se None), as únicas que o prompt avalia.
+    """
+    if not tentativas:
+        return ['falha_extracao']
+
+    motivos = []
+    total = sum(questoes.values())
+    cobradas = set(questoes if enviadas is None else enviadas)
+    if len(tentativas) < esperadas or any(cobradas - set(t['notas_questoes']) for t in tentativas):
+        motivos.append('falha_extracao')
+
+    notas = [t['nota_final'] for t in tentativas]
+    if max(notas) - min(notas) > cascade_config.get('max_spread_percent', 15) / 100 * total:
+        motivos.append('divergencia')
+
+    media = sum(notas) / len(notas)
+    margem = cascade_config.get('boundary_margin_percent', 3) / 100 * total
+    if any(abs(media - limite / 100 * total) <= margem for limite in cascade_config.get('boundaries_percent', [50])):
+        motivos.append('fronteira')
+
+    if nota_moodle is not None and abs(media - nota_moodle) > cascade_config.get('moodle_gap_percent', 30) / 100 * total:
+        motivos.append('divergencia_moodle')
+    return motivos
@@ -1,4 +1,4 @@
-
+from __future__ import annotations
 
 # Built-in
 import os
@@ -8,23 +8,26 @@ import asyncio
 import pickle
 import random
 import re
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from datetime import datetime
-import textwrap
-import warnings
+import threading
+import time
 
 # Typing
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
 from dataclasses import dataclass, field
 
 # Third-party
 import yaml
-import aiohttp
-import pandas as pd
-from scipy import stats
-from scipy.stats import ttest_rel, wilcoxon, shapiro
-import textwrap
-import warnings
+
+from metrics import ColetorMetricas
+from retry_queue import FilaFalhas, causa_falha
+
+# Dependências pesadas (aiohttp, pandas, numpy, scipy) são importadas sob demanda,
+# apenas nos caminhos que as utilizam, para manter o início da CLI rápido.
+if TYPE_CHECKING:
+    import aiohttp
+    import pandas as pd
 
 @dataclass
 class SubmissaoEstudante:
@@ -41,14 +44,31 @@ class SubmissaoEstudante:
     notas_moodle_percent: Dict[str, float] = field(default_factory=dict)
     notas_moodle_pontos: Dict[str, float] = field(default_factory=dict)
     historico_avaliacoes: List[Dict] = field(default_factory=list)
+    spans: List[Dict] = field(default_factory=list)
+    envio_id: str = ""
+    origem_zip: str = ""
+    # Modo de baixo consumo de memória: feedback/prompt ficam no ArmazemBlobs
+    feedback_ref: str = ""
+    prompt_ref: str = ""
+    data_avaliacao: str = ""
+    motivos_cascata: List[str] = field(default_factory=list)
+    # Servidor (eval.py serve): código recebido na requisição, sem arquivos em disco
+    codigos: Dict[str, str] = field(default_factory=dict)
+    # Resultado estruturado do VPL (vpl_parser.analisar_textos): testes, compilação, comentários
+    vpl: Dict = field(default_factory=dict)
 
 class GerenciadorAvaliacao:
-    def __init__(self, config_path: str = "config/config.yaml"):
-        self.config = self._carregar_config(config_path)
-        self._configurar_logging()
+    def __init__(self, config_path: str = "config/config.yaml", gravar_cache: bool = True):
+        self.config, self.avaliacao = self._carregar_config(config_path, gravar_cache)
+        self.logger = logging.getLogger(__name__)
         self.submissoes: List[SubmissaoEstudante] = []
         self.state_file = Path("output/processamento_state.pkl")
         self.retry_queue_file = Path("output/retry_queue.json")
+        self.fila_falhas = FilaFalhas(self.retry_queue_file)
+        self.metricas = ColetorMetricas()
+        self._zips_abertos = {}
+        self._trava_zips = threading.Lock()  # prompts também são montados nas threads de pré-carregamento
+        self.execucao_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # CORRIGIDO: Carrega as configurações usando as chaves corretas do YAML ('assessment', etc.)
         assessment_config = self.config.get('assessment', {})
@@ -58,83 +78,181 @@ class GerenciadorAvaliacao:
         if self.selection_criteria not in ["highest", "average", "lowest"]:
             self.logger.warning(f"Critério de seleção '{self.selection_criteria}' inválido. Usando 'highest' como padrão.")
             self.selection_criteria = "highest"
-        self.logger.info(f"Critério de seleção de nota final: {self.selection_criteria}")
+
+        # Como as llm_attempts são pedidas: "rounds" (uma passada por tentativa), "n" (uma chamada
+        # com N respostas) ou "back_to_back" (as N chamadas do estudante em sequência)
+        self.amostragem = str(assessment_config.get('sampling', 'rounds')).lower()
+        self._modelos_sem_n = set()
+        # Pesos da escolha aleatória entre modelos, definidos pela verificação pre-flight
+        self._pesos_modelos: Dict[str, float] = {}
 
         self.detailed_feedback = assessment_config.get('detailed_feedback', False) 
-        self.logger.info(f"Modo de feedback detalhado: {'Ativado' if self.detailed_feedback else 'Desativado'}")
+        # "inline": cada tentativa traz o feedback completo; "after_grading"/"on_demand": as tentativas
+        # trazem só as notas e o feedback detalhado é gerado uma vez, para a tentativa selecionada
+        self.modo_feedback = str(assessment_config.get('feedback_mode', 'inline')).lower()
+        self._aplicar_recomendacao_calibracao()
+
+        # Modo de baixo consumo de memória para turmas muito grandes
+        self.baixo_consumo_memoria = self.config.get('processing', {}).get('low_memory', False)
+        # Prompts e feedbacks no armazém de artefatos (deduplicados e comprimidos); o estado guarda só referências
+        self.artefatos = self.baixo_consumo_memoria or self.config.get('artifacts', {}).get('enabled', False)
+        self._ids_questoes = tuple(q['id'] for q in self.config['questions'])
+        self._armazem = None
+        self._orcamento = None
+        self._similaridade = None
+        self._prioridades = None
+        self._cabecalho = None
+        self._codigos_lidos: Dict[Tuple[str, str], str] = {}
+        self._trava_codigos = threading.Lock()  # _ler_codigo também roda nas threads de pré-carregamento
+
+    def _carregar_config(self, config_path: str, gravar_cache: bool = True):
+        """
+        Carrega o YAML e a avaliação compilada (assessment.py), validando o
+        esquema antes de qualquer chamada à API. Enquanto o arquivo não muda,
+        ambos vêm do cache em output/.cache/ (gravado só se 'gravar_cache').
+        """
+        from assessment import ErroConfiguracao, carregar
 
-    def _carregar_config(self, config_path: str) -> dict:
         try:
-            config_file = Path(config_path)
-            if not config_file.exists():
-                print(f"Arquivo de configuração não encontrado: {config_path}")
-                sys.exit(1)
-                
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-            
-            if not config:
-                print("Arquivo de configuração está vazio")
-                sys.exit(1)
-            
-            # CORRIGIDO: Usa as chaves corretas do YAML ('assessment', 'questions')
-            required_keys = ['api', 'questions', 'assessment']
-            for key in required_keys:
-                if key not in config:
-                    print(f"Chave obrigatória '{key}' não encontrada no config")
-                    sys.exit(1)
-            
-            # CORRIGIDO: Validação para a nova configuração de tentativas com a chave correta
-            if 'llm_attempts' not in config['assessment']:
-                 print("Chave 'llm_attempts' não encontrada em 'assessment' no config. Usando padrão de 1.")
-                 config['assessment']['llm_attempts'] = 1
-            
-            api_config = config.get('api', {})
-            if 'url' not in api_config:
-                print("'api.url' não encontrada no config")
-                sys.exit(1)
-                
-            # CORRIGIDO: Chave 'models' em vez de 'modelos'
-            if 'models' not in api_config:
-                api_config['models'] = ['llama-3.1-8b-instant']
-                
-            print(f"Configuração carregada: {config_path}")
-            return config
-            
+            config, avaliacao, do_cache = carregar(config_path, gravar_cache=gravar_cache)
+        except FileNotFoundError:
+            print(f"Arquivo de configuração não encontrado: {config_path}")
+            sys.exit(1)
         except yaml.YAMLError as e:
             print(f"Erro ao parsear YAML: {e}")
             sys.exit(1)
+        except ErroConfiguracao as e:
+            print(f"Configuração inválida em {config_path}:")
+            for erro in e.erros:
+                print(f"   - {erro}")
+            sys.exit(1)
         except Exception as e:
             print(f"Erro ao carregar config: {e}")
             sys.exit(1)
+
+        for aviso in avaliacao.avisos:
+            print(aviso)
+        print(f"Configuração carregada: {config_path}{' (compilada, do cache)' if do_cache else ''}")
+        return config, avaliacao
     
-    def _configurar_logging(self):
-        log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = log_dir / f"avaliacao_{timestamp}.log"
-        
-        logging.basicConfig(
-            level=getattr(logging, self.config.get('log_level', 'INFO')),
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
+    def configurar_logging(self, arquivo: bool = True):
+        """
+        Configura o logging do processo. Não é chamado pelo construtor: apenas os
+        subcomandos que avaliam criam a pasta logs/ e o arquivo de log.
+        """
+        import log_pipeline
+
+        config_log = self.config.get('logging', {})
+        formato_json = config_log.get('format', 'text') == 'json'
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if self.config.get('metrics', {}).get('dashboard'):
+            # Com o painel ao vivo, o console mostra apenas avisos; o arquivo de log segue completo
+            handlers[0].setLevel(logging.WARNING)
+        if arquivo:
+            log_dir = Path("logs")
+            log_dir.mkdir(exist_ok=True)
+            
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            log_file = log_dir / f"avaliacao_{timestamp}.{'jsonl' if formato_json else 'log'}"
+            handlers.insert(0, logging.FileHandler(log_file, encoding='utf-8'))
+        
+        log_pipeline.configurar(
+            handlers,
+            nivel=getattr(logging, config_log.get('level', self.config.get('log_level', 'INFO'))),
+            formato_json=formato_json,
+            usar_fila=config_log.get('queue', True),
+            taxa_amostragem=config_log.get('sample_rate', 1.0)
         )
         self.logger = logging.getLogger(__name__)
+        if arquivo:
+            self.logger.info(f"Critério de seleção de nota final: {self.selection_criteria}")
+            if self.modo_feedback == 'inline':
+                self.logger.info(f"Modo de feedback detalhado: {'Ativado' if self.detailed_feedback else 'Desativado'}")
+            else:
+                self.logger.info(f"Feedback em duas fases ({self.modo_feedback}): tentativas pedem só as notas")
+
+    @property
+    def armazem(self):
+        if self._armazem is None:
+            from artifacts import ArmazemBlobs
+            self._armazem = ArmazemBlobs.de_config(self.config)
+        return self._armazem
+
+    @property
+    def orcamento(self):
+        """max_tokens e timeout de cada requisição aprendidos das respostas (seção 'budget'); None se desativado."""
+        budget_config = self.config.get('budget', {})
+        if self._orcamento is None and budget_config.get('enabled', False):
+            import hashlib
+            import json
+            from budget import OrcamentoRequisicoes
+            from similarity import chave_questao
+
+            chaves = {questao['id']: chave_questao(questao) for questao in self.config['questions']}
+            templates = json.dumps(self.config.get('prompt_templates', {}), sort_keys=True, ensure_ascii=False)
+            chaves[''] = hashlib.sha256(templates.encode('utf-8')).hexdigest()[:16]
+            self._orcamento = OrcamentoRequisicoes.de_config(budget_config, chaves, self.config['api']['url'])
+        return self._orcamento
+
+    def _texto(self, submissao: SubmissaoEstudante, campo: str) -> str:
+        """Retorna o feedback ou o prompt selecionado, lendo do armazém quando foi descarregado da memória."""
+        ref = getattr(submissao, f"{campo}_ref", "")
+        return self.armazem.ler(ref) if ref else getattr(submissao, campo)
 
     def salvar_estado(self):
         state_dir = Path("output")
         state_dir.mkdir(exist_ok=True)
         try:
-            with open(self.state_file, 'wb') as f:
+            if self.artefatos:
+                self._externalizar_textos()
+            temporario = self.state_file.with_name(f".{self.state_file.name}.tmp")
+            with open(temporario, 'wb') as f:
                 pickle.dump(self.submissoes, f)
+            os.replace(temporario, self.state_file)
+            self.fila_falhas.salvar()
+            if self._orcamento is not None:
+                self._orcamento.salvar()
+            if self.artefatos:
+                from artifacts import salvar_indice
+                salvar_indice(self.config.get('artifacts', {}).get('index_file', 'output/artefatos_indice.json'),
+                              self._indice_artefatos())
             self.logger.info("Estado salvo")
         except Exception as e:
             self.logger.error(f"Erro ao salvar estado: {e}")
     
+    def _externalizar_textos(self):
+        """
+        Move para o armazém os textos que ainda estão no estado (tentativas e
+        seleção gravadas antes de artifacts.enabled ou vindas de um worker).
+        """
+        for submissao in self.submissoes:
+            for tentativa in submissao.historico_avaliacoes:
+                if isinstance(tentativa, dict) and 'feedback' in tentativa:
+                    for campo in ('feedback', 'prompt', 'feedback_detalhado', 'prompt_detalhado'):
+                        texto = tentativa.pop(campo, None)
+                        if texto or campo in ('feedback', 'prompt'):
+                            tentativa[f"{campo}_ref"] = self.armazem.gravar(texto) if texto else ""
+            for campo in ('feedback', 'prompt'):
+                texto = getattr(submissao, campo)
+                if texto and not getattr(submissao, f"{campo}_ref"):
+                    setattr(submissao, f"{campo}_ref", self.armazem.gravar(texto))
+                    setattr(submissao, campo, "")
+
+    def _indice_artefatos(self) -> Dict[str, Dict]:
+        """Estudante -> referências de cada tentativa e da seleção (artifacts.index_file)."""
+        campos = ('prompt_ref', 'feedback_ref', 'prompt_detalhado_ref', 'feedback_detalhado_ref')
+        indice = {}
+        for submissao in self.submissoes:
+            tentativas = {}
+            for t in submissao.historico_avaliacoes:
+                refs = {c[:-4]: t.get(c) for c in campos if t.get(c)}
+                tentativas[f"{t.get('nivel') or 0}.{t['tentativa_num']}"] = refs
+            indice[submissao.login] = {
+                'nome': submissao.nome, 'tentativas': tentativas,
+                'selecionada': {c[:-4]: getattr(submissao, c) for c in ('prompt_ref', 'feedback_ref')
+                                if getattr(submissao, c)}}
+        return indice
+
     def carregar_estado(self) -> bool:
         if self.state_file.exists():
             try:
@@ -146,6 +264,20 @@ class GerenciadorAvaliacao:
                         submissao.historico_avaliacoes = []
                     if not hasattr(submissao, 'prompt'):
                         submissao.prompt = ""
+                    if not hasattr(submissao, 'spans'):
+                        submissao.spans = []
+                    if not hasattr(submissao, 'motivos_cascata'):
+                        submissao.motivos_cascata = []
+                    if not hasattr(submissao, 'codigos'):
+                        submissao.codigos = {}
+                    if not hasattr(submissao, 'vpl'):
+                        submissao.vpl = {}
+                try:
+                    if self.fila_falhas.carregar():
+                        self.logger.info(f"Fila de falhas carregada: {len(self.fila_falhas)} tentativa(s) "
+                                         f"{self.fila_falhas.resumo()}")
+                except (OSError, ValueError, KeyError) as e:
+                    self.logger.warning(f"Erro ao carregar a fila de falhas {self.retry_queue_file}: {e}")
                 return True
             except Exception as e:
                 self.logger.warning(f"Erro ao carregar estado: {e}")
@@ -155,7 +287,11 @@ class GerenciadorAvaliacao:
         self.logger.info(f"Descobrindo submissões em {pasta_base}")
         
         pasta_base = Path(pasta_base)
-        submissoes = []
+        if pasta_base.is_file() and pasta_base.suffix.lower() == '.zip':
+            return self._descobrir_submissoes_zip(pasta_base)
+        import vpl_parser
+
+        submissoes, pendentes_vpl = [], {}
 
         for pasta_estudante in sorted(pasta_base.iterdir(), key=lambda x: x.name.lower()):
             if not pasta_estudante.is_dir():
@@ -178,22 +314,130 @@ class GerenciadorAvaliacao:
                 self.logger.warning(f"Arquivos de questão não encontrados para {nome}")
                 continue
 
-            percentuais, pontos = self.extrair_notas_moodle(pasta_estudante)
-
             submissao = SubmissaoEstudante(
                 nome=nome,
                 login=login,
                 pasta=submissao_dir,
                 arquivos=arquivos,
-                notas_moodle_percent=percentuais,
-                notas_moodle_pontos=pontos
+                envio_id=submissao_dir.name
             )
             submissoes.append(submissao)
-            
+
+            pasta_ceg = self._encontrar_pasta_ceg(pasta_estudante)
+            if pasta_ceg:
+                pendentes_vpl[login] = (str(pasta_ceg.resolve()), vpl_parser.assinatura_pasta(pasta_ceg), str(pasta_ceg))
+
+        self._aplicar_resultados_vpl(submissoes, self._analisar_vpl_em_lote(pendentes_vpl))
         self.logger.info(f"{len(submissoes)} submissões encontradas")
         self.submissoes = submissoes
         return submissoes
 
+    def _descobrir_submissoes_zip(self, caminho_zip: Path) -> List[SubmissaoEstudante]:
+        """
+        Descobre as submissões diretamente no .zip exportado pelo Moodle, sem extraí-lo.
+
+        Se já houver submissões carregadas (--continuar), a descoberta é incremental:
+        estudantes cujo envio mais recente não mudou mantêm o histórico de avaliações;
+        apenas envios novos ou mais recentes entram como pendentes.
+        """
+        import functools
+        from fnmatch import fnmatch
+        from moodle_zip import indexar_zip
+        import vpl_parser
+
+        zip_file = self._abrir_zip(str(caminho_zip))
+        entradas, ignoradas = indexar_zip(zip_file)
+        for pasta in ignoradas:
+            self.logger.warning(f"Pasta ignorada (formato inválido): {pasta}")
+
+        anteriores = {s.login: s for s in self.submissoes}
+        submissoes, novas, atualizadas = [], 0, 0
+        novas_submissoes, pendentes_vpl = [], {}
+        for entrada in sorted(entradas.values(), key=lambda e: e.pasta_original.lower()):
+            envio = entrada.envio_recente()
+            if not envio:
+                self.logger.warning(f"Nenhuma submissão encontrada para {entrada.nome}")
+                continue
+
+            anterior = anteriores.pop(entrada.login, None)
+            if anterior and anterior.envio_id == envio:
+                submissoes.append(anterior)
+                continue
+
+            membros = sorted(entrada.envios[envio])
+            arquivos = {}
+            for questao in self.config['questions']:
+                for ext in questao['accepted_extensions']:
+                    padrao = f"{questao['id']}*{ext}"
+                    encontrado = next((m for m in membros if fnmatch(PurePosixPath(m).name, padrao)), None)
+                    if encontrado:
+                        arquivos[questao['id']] = PurePosixPath(encontrado)
+                        break
+                else:
+                    self.logger.warning(f"Arquivo {questao['id']} não encontrado em {entrada.pasta_original}/{envio}")
+            if not arquivos:
+                self.logger.warning(f"Arquivos de questão não encontrados para {entrada.nome}")
+                continue
+
+            submissao = SubmissaoEstudante(
+                nome=entrada.nome,
+                login=entrada.login,
+                pasta=Path(caminho_zip) / entrada.pasta_original / envio,
+                arquivos=arquivos,
+                envio_id=envio,
+                origem_zip=str(caminho_zip)
+            )
+            submissoes.append(submissao)
+            novas_submissoes.append(submissao)
+
+            ceg = entrada.ceg_recente()
+            infos = [zip_file.getinfo(m) for m in entrada.cegs.get(ceg, [])
+                     if PurePosixPath(m).name in vpl_parser.ARQUIVOS]
+            if infos:
+                pendentes_vpl[entrada.login] = (f"{caminho_zip.resolve()}::{entrada.pasta_original}/{ceg}",
+                                                vpl_parser.assinatura_zip(infos),
+                                                functools.partial(self._ler_textos_zip, zip_file, infos))
+            if anterior:
+                atualizadas += 1
+            else:
+                novas += 1
+
+        self._aplicar_resultados_vpl(novas_submissoes, self._analisar_vpl_em_lote(pendentes_vpl))
+        # Estudantes ausentes no zip mais novo permanecem com seus resultados
+        submissoes.extend(anteriores.values())
+        self.logger.info(f"{len(submissoes)} submissões no zip ({novas} novas, {atualizadas} com envio mais recente)")
+        self.submissoes = submissoes
+        return submissoes
+
+    def _abrir_zip(self, caminho_zip: str):
+        import zipfile
+        with self._trava_zips:
+            if caminho_zip not in self._zips_abertos:
+                self._zips_abertos[caminho_zip] = zipfile.ZipFile(caminho_zip)
+            return self._zips_abertos[caminho_zip]
+
+    def _ler_codigo(self, submissao: SubmissaoEstudante, questao_id: str) -> str:
+        """
+        Lê o código de uma questão, da pasta extraída, diretamente do zip do Moodle
+        ou da requisição (serve). Cada arquivo é lido uma vez por execução; no modo
+        de baixo consumo de memória o código não fica retido entre as tentativas.
+        """
+        if submissao.codigos:
+            return submissao.codigos[questao_id]
+        chave = (getattr(submissao, 'origem_zip', ''), str(submissao.arquivos[questao_id]))
+        with self._trava_codigos:
+            if chave in self._codigos_lidos:
+                return self._codigos_lidos[chave]
+        if chave[0]:
+            codigo = self._abrir_zip(chave[0]).read(chave[1]).decode('utf-8', errors='ignore')
+        else:
+            with open(submissao.arquivos[questao_id], 'r', encoding='utf-8', errors='ignore') as f:
+                codigo = f.read()
+        if not self.baixo_consumo_memoria:
+            with self._trava_codigos:
+                codigo = self._codigos_lidos.setdefault(chave, codigo)
+        return codigo
+
     def _encontrar_submissao_recente(self, pasta_estudante: Path) -> Optional[Path]:
         submissoes = [d for d in pasta_estudante.iterdir()
                      if d.is_dir() and not d.name.endswith('.ceg')]
@@ -223,26 +467,214 @@ class GerenciadorAvaliacao:
     async def processar_submissoes(self):
         # CORRIGIDO: Usa a variável self.llm_attempts
         self.logger.info(f"Iniciando processamento. Serão feitas {self.llm_attempts} tentativa(s) de avaliação por estudante.")
+        self.metricas.definir_total(sum(1 for s in self.submissoes for n in range(1, self.llm_attempts + 1)
+                                        if not any(t['tentativa_num'] == n for t in s.historico_avaliacoes)))
+        telemetria = self._iniciar_telemetria()
+        from cascade import niveis_cascata
+        niveis = niveis_cascata(self.config)
+        self._preparar_similaridade()
+
+        processing_config = self.config.get('processing', {})
+        minutos = self.config.get('scheduling', {}).get('deadline_minutes', 0)
+        limite = time.monotonic() + minutos * 60 if minutos else None
+        # Amostragem "n"/"back_to_back": todas as tentativas saem numa única passada
+        por_passada = self.llm_attempts if self.amostragem in ('n', 'back_to_back') else 1
+        planejadas = self.llm_attempts
+        if limite is not None and self.amostragem != 'n':
+            espera = processing_config.get('round_wait', 10) if por_passada == 1 else 0
+            planejadas = max(1, self._rodadas_no_prazo(limite, self.llm_attempts, espera))
+            self.logger.info(f"Prazo de {minutos} min: {planejadas} de {self.llm_attempts} tentativa(s) planejada(s) "
+                             f"(~{self._duracao_media_chamada():.1f}s por chamada)")
 
-        for i in range(self.llm_attempts):
+        for i in range(0, self.llm_attempts, por_passada):
             tentativa_num = i + 1
-            self.logger.info(f"--- INICIANDO TENTATIVA DE AVALIAÇÃO {tentativa_num}/{self.llm_attempts} ---")
+            if tentativa_num > planejadas:
+                self.logger.warning(f"Prazo: {self.llm_attempts - tentativa_num + 1} tentativa(s) restante(s) não "
+                                    f"cabe(m) no tempo e não será(ão) feita(s) nesta execução")
+                self.metricas.definir_total(self.metricas.itens_concluidos)
+                break
+            amostras = min(por_passada, planejadas - i)
+            if amostras > 1:
+                self.logger.info(f"--- INICIANDO TENTATIVAS {tentativa_num}-{tentativa_num + amostras - 1}/"
+                                 f"{self.llm_attempts} (amostragem '{self.amostragem}') ---")
+                if amostras < por_passada:
+                    self.logger.warning(f"Prazo: {por_passada - amostras} tentativa(s) não cabe(m) no tempo")
+                    self.metricas.definir_total(self.metricas.itens_total - sum(
+                        len(self._tentativas_faltantes(s, tentativa_num + amostras, por_passada - amostras))
+                        for s in self.submissoes))
+            else:
+                self.logger.info(f"--- INICIANDO TENTATIVA DE AVALIAÇÃO {tentativa_num}/{self.llm_attempts} ---")
+            # Só a primeira rodada é sempre completada: todo estudante precisa de ao menos uma nota
+            limite_rodada = limite if tentativa_num > 1 else None
             
-            await self._processar_rodada_adaptativa(self.submissoes, tentativa_num)
+            # Ao continuar um estado salvo (ou após um zip incremental), apenas
+            # estudantes sem avaliação nesta tentativa são enviados à API
+            pendentes = [s for s in self.submissoes if self._tentativas_faltantes(s, tentativa_num, amostras)]
+            if len(pendentes) < len(self.submissoes):
+                self.logger.info(f"{len(self.submissoes) - len(pendentes)} estudante(s) já avaliado(s) nesta tentativa; "
+                                 f"{len(pendentes)} pendente(s)")
+            if self._similaridade is not None:
+                # Representantes (e quem não depende deles) primeiro; os demais recebem o prompt de diff
+                primeiros = [s for s in pendentes if not self._similaridade.depende_de_pendente(s.login)]
+                await self._processar_rodada_adaptativa(primeiros, tentativa_num, niveis[0], limite=limite_rodada,
+                                                        amostras=amostras)
+                self._registrar_notas_representantes()
+                pendentes_restantes = [s for s in pendentes if s not in primeiros]
+                await self._processar_rodada_adaptativa(pendentes_restantes, tentativa_num, niveis[0],
+                                                        limite=limite_rodada, amostras=amostras)
+                self._registrar_notas_representantes()
+            else:
+                await self._processar_rodada_adaptativa(pendentes, tentativa_num, niveis[0], limite=limite_rodada,
+                                                        amostras=amostras)
             
             self.salvar_estado()
-            self._relatorio_rodada(tentativa_num)
+            for rodada in range(tentativa_num, tentativa_num + amostras):
+                self._relatorio_rodada(rodada)
             
-            if tentativa_num < self.llm_attempts:
-                wait_time = min(60, 10 * tentativa_num)
+            if tentativa_num + amostras - 1 < self.llm_attempts and pendentes:
+                wait_time = processing_config.get('round_wait', min(60, 10 * tentativa_num))
+                if limite is not None:
+                    # Replaneja com a duração observada das chamadas desta execução
+                    planejadas = tentativa_num + self._rodadas_no_prazo(limite - wait_time,
+                                                                        self.llm_attempts - tentativa_num, wait_time)
+                    if planejadas == tentativa_num:
+                        continue
                 self.logger.info(f"Aguardando {wait_time}s antes da próxima tentativa geral...")
                 await asyncio.sleep(wait_time)
         
+        await self._executar_cascata(niveis, limite)
+        await self._encerrar_telemetria(telemetria)
         self.logger.info("Todas as tentativas foram concluídas. Consolidando os resultados finais...")
+        await self._concluir_execucao()
+
+    async def _concluir_execucao(self):
+        """Consolida, gera o feedback detalhado (feedback_mode 'after_grading'), salva e grava os arquivos."""
         self._consolidar_resultados_finais()
+        if self.modo_feedback == 'after_grading':
+            self.salvar_estado()
+            await self.gerar_feedbacks_detalhados()
         self.salvar_estado()
         self._relatorio_final()
 
+    def _preparar_similaridade(self):
+        """Agrupa as respostas parecidas de cada questão (seção 'similarity'), reaproveitando o índice salvo."""
+        similarity_config = self.config.get('similarity', {})
+        if not similarity_config.get('enabled', False):
+            return
+        from similarity import IndiceSimilaridade
+
+        indice = IndiceSimilaridade(similarity_config.get('index_file', 'output/indice_similaridade.json'),
+                                    self.config['questions'], similarity_config.get('threshold', 0.9))
+        carregados = indice.carregar()
+        inicio = time.monotonic()
+        indice.agrupar((s.login, q, self._ler_codigo(s, q)) for s in self.submissoes for q in s.arquivos)
+        for q, resumo in indice.estatisticas().items():
+            self.logger.info(f"Similaridade {q}: {resumo['respostas']} respostas em {resumo['grupos']} grupos "
+                             f"({resumo['agrupadas']} avaliadas por diff)")
+        self.logger.info(f"Índice de similaridade: {carregados} representante(s) carregado(s), "
+                         f"agrupamento em {time.monotonic() - inicio:.1f}s")
+        self._similaridade = indice
+        self._registrar_notas_representantes()
+
+    def _registrar_notas_representantes(self):
+        """Guarda no índice a nota (primeira tentativa bem-sucedida) de cada representante ainda sem nota."""
+        indice = self._similaridade
+        por_login = {s.login: s for s in self.submissoes}
+        for q, i, representante in indice.representantes_sem_nota():
+            submissao = por_login.get(representante['login'])
+            if submissao is None or not indice.eh_representante(submissao.login, q, i):
+                continue
+            tentativas = sorted((t for t in submissao.historico_avaliacoes if q in t['notas_questoes']),
+                                key=lambda t: t['tentativa_num'])
+            if not tentativas:
+                continue
+            t = tentativas[0]
+            feedback = t['feedback'] if 'feedback' in t else self.armazem.ler(t['feedback_ref'])
+            linha = re.search(rf'QUESTAO_{re.escape(q)}:.*', feedback)
+            representante['nota'] = t['notas_questoes'][q]
+            representante['comentario'] = linha.group(0).strip()[:500] if linha else ''
+        indice.salvar()
+
+    async def _executar_cascata(self, niveis: List[List[str]], limite: Optional[float] = None):
+        """
+        Sobe na cascata (seção 'cascade') apenas os estudantes cujas tentativas do
+        nível anterior dispararam algum sinal de baixa confiança. Cada nível acima
+        do primeiro faz cascade.escalation_attempts rodadas, numeradas depois das
+        rodadas normais, de modo que --continuar retoma também as escaladas.
+        Com prazo ('limite'), a cascata só despacha enquanto houver tempo.
+        """
+        cascade_config = self.config.get('cascade', {})
+        if not cascade_config.get('enabled') or len(niveis) < 2:
+            return
+        from collections import Counter
+        from cascade import motivos_escalonamento
+
+        por_nivel = cascade_config.get('escalation_attempts', 1)
+        questoes = {q['id']: q['max_points'] for q in self.config['questions']}
+        for nivel in range(1, len(niveis)):
+            escalar = []
+            for submissao in self.submissoes:
+                anteriores = [t for t in submissao.historico_avaliacoes if (t.get('nivel') or 0) == nivel - 1]
+                if nivel > 1 and not anteriores:
+                    continue  # Resolvido em um nível mais baixo
+                moodle = [v for k, v in submissao.notas_moodle_pontos.items() if k != 'Final']
+                motivos = motivos_escalonamento(anteriores, questoes, sum(moodle) if moodle else None,
+                                                self.llm_attempts if nivel == 1 else por_nivel, cascade_config,
+                                                self._questoes_enviadas(submissao))
+                if motivos:
+                    submissao.motivos_cascata = sorted(set(submissao.motivos_cascata) | set(motivos))
+                    escalar.append(submissao)
+                    self.logger.info(f"[Cascata] {submissao.nome} sobe para o nível {nivel + 1}: {', '.join(motivos)}")
+
+            contagem = Counter(m for s in escalar for m in s.motivos_cascata)
+            self.logger.info(f"--- CASCATA NÍVEL {nivel + 1}/{len(niveis)} ({', '.join(niveis[nivel])}): "
+                             f"{len(escalar)}/{len(self.submissoes)} estudante(s) escalado(s) {dict(contagem)} ---")
+            if not escalar:
+                break
+            if limite is not None and time.monotonic() >= limite:
+                self.logger.warning(f"Prazo atingido: cascata interrompida antes do nível {nivel + 1}")
+                break
+            por_passada = por_nivel if self.amostragem in ('n', 'back_to_back') else 1
+            for j in range(0, por_nivel, por_passada):
+                rodada = self.llm_attempts + (nivel - 1) * por_nivel + j + 1
+                faltantes = {s.login: self._tentativas_faltantes(s, rodada, por_passada) for s in escalar}
+                pendentes = [s for s in escalar if faltantes[s.login]]
+                self.metricas.definir_total(self.metricas.itens_total + sum(map(len, faltantes.values())))
+                await self._processar_rodada_adaptativa(pendentes, rodada, niveis[nivel], nivel, limite, por_passada)
+                self.salvar_estado()
+
+    def _iniciar_telemetria(self) -> Optional[asyncio.Task]:
+        """Sobe o endpoint Prometheus, o arquivo JSONL e o painel conforme a seção 'metrics'."""
+        from metrics import iniciar_servidor_http, publicar_periodicamente
+
+        metrics_config = self.config.get('metrics', {})
+        porta = metrics_config.get('http_port', 0)
+        if porta and not getattr(self, '_servidor_metricas', None):
+            try:
+                self._servidor_metricas = iniciar_servidor_http(self.metricas, porta)
+                self.logger.info(f"Métricas disponíveis em http://127.0.0.1:{porta}/metrics")
+            except OSError as e:
+                self.logger.warning(f"Não foi possível abrir o endpoint de métricas na porta {porta}: {e}")
+
+        arquivo_jsonl = None
+        if metrics_config.get('jsonl', False):
+            Path("output").mkdir(exist_ok=True)
+            arquivo_jsonl = Path("output") / f"metricas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        painel = metrics_config.get('dashboard', False)
+        if not arquivo_jsonl and not painel:
+            return None
+        return asyncio.create_task(publicar_periodicamente(self.metricas, metrics_config.get('interval', 5),
+                                                           arquivo_jsonl, painel))
+
+    async def _encerrar_telemetria(self, tarefa: Optional[asyncio.Task]):
+        if tarefa is None:
+            return
+        tarefa.cancel()
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
+
     def _consolidar_resultados_finais(self):
         # CORRIGIDO: Usa as variáveis e critérios corretos ('llm_attempts', 'selection_criteria')
         print("-"*80)
@@ -250,98 +682,766 @@ class GerenciadorAvaliacao:
             self.logger.info(f"Consolidando resultados finais usando o critério: '{self.selection_criteria}'")
         else:
             self.logger.info("Consolidando resultados finais da única tentativa.")
+        calibracao = self._carregar_calibracao()
         
         for submissao in self.submissoes:
-            if not submissao.historico_avaliacoes:
-                submissao.status = "erro_sem_feedback"
-                submissao.feedback = "Nenhuma avaliação bem-sucedida foi recebida da LLM."
-                submissao.nota_final = 0.0
-                continue
+            self._consolidar_submissao(submissao, calibracao)
 
-            tentativa_selecionada = None
-            nota_final_consolidada = 0.0
-
-            if self.llm_attempts > 1:
-                if self.selection_criteria == "highest":
-                    tentativa_selecionada = max(submissao.historico_avaliacoes, key=lambda t: t['nota_final'])
-                elif self.selection_criteria == "lowest":
-                    tentativa_selecionada = min(submissao.historico_avaliacoes, key=lambda t: t['nota_final'])
-                elif self.selection_criteria == "average":
-                    notas = [t['nota_final'] for t in submissao.historico_avaliacoes]
-                    nota_final_consolidada = sum(notas) / len(notas)
-                    # Encontra a tentativa mais próxima da média
-                    tentativa_selecionada = min(submissao.historico_avaliacoes, key=lambda t: abs(t['nota_final'] - nota_final_consolidada))
-                
-                if self.selection_criteria != "average":
-                    nota_final_consolidada = tentativa_selecionada['nota_final']
-            else:
-                tentativa_selecionada = submissao.historico_avaliacoes[0]
-                nota_final_consolidada = tentativa_selecionada['nota_final']
-            
-            submissao.nota_final = nota_final_consolidada
-            submissao.feedback = tentativa_selecionada['feedback']
-            submissao.notas_questoes = tentativa_selecionada['notas_questoes']
-            submissao.prompt = tentativa_selecionada.get('prompt', '')
-            submissao.status = "concluido"
+    def _consolidar_submissao(self, submissao: SubmissaoEstudante, calibracao=None):
+        """Aplica o critério de seleção às tentativas de um estudante (também usado pelo servidor)."""
+        if not submissao.historico_avaliacoes:
+            submissao.status = "erro_sem_feedback"
+            submissao.feedback = "Nenhuma avaliação bem-sucedida foi recebida da LLM."
+            submissao.nota_final = 0.0
+            return
+
+        tentativa_selecionada, nota_final_consolidada, corrigidas = self._selecionar_tentativa(submissao, calibracao)
+        submissao.nota_final = nota_final_consolidada
+        if 'feedback_ref' in tentativa_selecionada:
+            submissao.feedback, submissao.prompt = "", ""
+            submissao.feedback_ref = tentativa_selecionada.get('feedback_detalhado_ref') or tentativa_selecionada['feedback_ref']
+            submissao.prompt_ref = tentativa_selecionada.get('prompt_detalhado_ref') or tentativa_selecionada['prompt_ref']
+        else:
+            submissao.feedback = tentativa_selecionada.get('feedback_detalhado') or tentativa_selecionada['feedback']
+            submissao.prompt = tentativa_selecionada.get('prompt_detalhado') or tentativa_selecionada.get('prompt', '')
+            submissao.feedback_ref, submissao.prompt_ref = "", ""
+        submissao.notas_questoes = (corrigidas[id(tentativa_selecionada)][1] if calibracao
+                                    else tentativa_selecionada['notas_questoes'])
+        # Data da resposta selecionada: o cabeçalho do feedback não muda entre reexecuções
+        submissao.data_avaliacao = tentativa_selecionada.get('data_avaliacao') or ""
+        submissao.status = "concluido"
+        
+        # CORRIGIDO: Usa a variável self.selection_criteria
+        log_detalhe = f"(critério: {self.selection_criteria})" if self.llm_attempts > 1 else f"(de 1 tentativa)"
+        self.logger.info(f"Nota final para {submissao.nome}: {submissao.nota_final:.2f} {log_detalhe}")
+
+    def _selecionar_tentativa(self, submissao: SubmissaoEstudante, calibracao=None):
+        """Tentativa escolhida pelo critério de seleção, nota final consolidada e notas calibradas (por id)."""
+        tentativa_selecionada = None
+        nota_final_consolidada = 0.0
+        # Na cascata, valem apenas as tentativas do nível mais alto alcançado pelo estudante
+        nivel_maximo = max((t.get('nivel') or 0) for t in submissao.historico_avaliacoes)
+        tentativas = [t for t in submissao.historico_avaliacoes if (t.get('nivel') or 0) == nivel_maximo]
+        # Com calibração ativa, a seleção e as notas usam os valores corrigidos por questão/modelo
+        corrigidas = {id(t): self._notas_calibradas(t, calibracao) for t in tentativas} if calibracao else {}
+        nota_de = (lambda t: corrigidas[id(t)][0]) if calibracao else (lambda t: t['nota_final'])
+
+        if len(tentativas) > 1:
+            if self.selection_criteria == "highest":
+                tentativa_selecionada = max(tentativas, key=nota_de)
+            elif self.selection_criteria == "lowest":
+                tentativa_selecionada = min(tentativas, key=nota_de)
+            elif self.selection_criteria == "average":
+                notas = [nota_de(t) for t in tentativas]
+                nota_final_consolidada = sum(notas) / len(notas)
+                # Encontra a tentativa mais próxima da média
+                tentativa_selecionada = min(tentativas, key=lambda t: abs(nota_de(t) - nota_final_consolidada))
             
-            # CORRIGIDO: Usa a variável self.selection_criteria
-            log_detalhe = f"(critério: {self.selection_criteria})" if self.llm_attempts > 1 else f"(de 1 tentativa)"
-            self.logger.info(f"Nota final para {submissao.nome}: {submissao.nota_final:.2f} {log_detalhe}")
+            if self.selection_criteria != "average":
+                nota_final_consolidada = nota_de(tentativa_selecionada)
+        else:
+            tentativa_selecionada = tentativas[0]
+            nota_final_consolidada = nota_de(tentativa_selecionada)
+        return tentativa_selecionada, nota_final_consolidada, corrigidas
 
-    async def _processar_rodada_adaptativa(self, submissoes_da_rodada: List[SubmissaoEstudante], rodada: int):
-        threads = self.config.get('processing', {}).get('parallel_threads', 4)
-        delay_base = 2
+    def _carregar_calibracao(self):
+        """Curvas de calibration.file, quando calibration.apply está ativo."""
+        calibration_config = self.config.get('calibration', {})
+        if not calibration_config.get('apply', False):
+            return None
+        from calibration import Calibracao
+        arquivo = Path(calibration_config.get('file', 'output/calibracao.json'))
+        if not arquivo.exists():
+            self.logger.warning(f"calibration.apply ativo, mas {arquivo} não existe. Rode 'eval.py calibrate' antes.")
+            return None
+        self.logger.info(f"Aplicando calibração de {arquivo}")
+        return Calibracao.carregar(arquivo)
+
+    def _notas_calibradas(self, tentativa, calibracao) -> Tuple[float, Dict[str, float]]:
+        notas = tentativa['notas_questoes']
+        if not notas:
+            # Nota final extraída do texto, sem notas por questão: não há o que corrigir
+            return tentativa['nota_final'], notas
+        # Só questões com nota extraída: o ajuste leva 0 a um valor positivo, e questão não enviada continua 0
+        corrigidas = {q['id']: calibracao.corrigir(q['id'], tentativa.get('modelo'), notas[q['id']], q['max_points'])
+                      if q['id'] in notas else 0.0 for q in self.config['questions']}
+        return sum(corrigidas.values()), corrigidas
+
+    def _aplicar_recomendacao_calibracao(self):
+        """Com calibration.use_recommendation, usa os modelos e o llm_attempts recomendados pela calibração."""
+        calibration_config = self.config.get('calibration', {})
+        if not (calibration_config.get('apply') and calibration_config.get('use_recommendation')):
+            return
+        arquivo = Path(calibration_config.get('file', 'output/calibracao.json'))
+        if not arquivo.exists():
+            return
+        from calibration import Calibracao
+        recomendacao = Calibracao.carregar(arquivo).recomendacao
+        if recomendacao.get('modelos'):
+            self.config['api']['models'] = recomendacao['modelos']
+            self.llm_attempts = recomendacao['llm_attempts']
+            self.logger.info(f"Usando a recomendação da calibração: modelos {recomendacao['modelos']}, "
+                             f"{self.llm_attempts} tentativa(s)")
+
+    async def _processar_rodada_adaptativa(self, submissoes_da_rodada: List[SubmissaoEstudante], rodada: int,
+                                           modelos: Optional[List[str]] = None, nivel: int = 0,
+                                           limite: Optional[float] = None, amostras: int = 1):
+        """
+        Despacha a rodada a partir de uma fila de prioridade (seção 'scheduling'):
+        'parallel_threads' laços retiram sempre o próximo estudante da fila,
+        respeitando o ritmo de no máximo 'parallel_threads' envios a cada
+        'stagger_delay' segundos. Passado 'limite' (time.monotonic() do prazo),
+        nenhum novo estudante é despachado; os restantes ficam para --continuar.
+        Com 'amostras' > 1, cada estudante despachado recebe as tentativas
+        'rodada' .. 'rodada + amostras - 1' de uma vez (assessment.sampling).
+        Com processing.prefetch_workers > 0, os prompts dos próximos estudantes
+        da fila (até processing.prefetch_buffer) são lidos e montados numa pool
+        de threads adiante do despacho, e cada laço só espera pela rede.
+        """
+        processing_config = self.config.get('processing', {})
+        threads = processing_config.get('parallel_threads', 4)
+        delay_base = processing_config.get('stagger_delay', 2)
+        ordem = self.config.get('scheduling', {}).get('order', 'shortest_prompt')
+        pre_carregamento = processing_config.get('prefetch_workers', 4)
         
-        self.logger.info(f"Rodada {rodada}: {threads} threads paralelas, delay base {delay_base}s")
+        self.logger.info(f"Rodada {rodada}: {threads} threads paralelas, delay base {delay_base}s, ordem '{ordem}'")
         
-        semaforo = asyncio.Semaphore(threads)
-        async with aiohttp.ClientSession() as session:
-            tasks = [self._processar_submissao_com_delay(session, semaforo, sub, delay_base * (i // threads), rodada)
-                     for i, sub in enumerate(submissoes_da_rodada)]
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def _processar_submissao_com_delay(self, session: aiohttp.ClientSession,
-                                           semaforo: asyncio.Semaphore,
-                                           submissao: SubmissaoEstudante,
-                                           delay: int, rodada: int):
-        if delay > 0:
-            await asyncio.sleep(delay)
-        
-        async with semaforo:
+        fila = self._fila_rodada(submissoes_da_rodada, ordem)
+        for _ in range(len(fila)):
+            self.metricas.entrar_fila()
+        inicio = time.monotonic()
+        despachados = 0
+        lacos = min(threads, len(fila))
+        prontos: asyncio.Queue = asyncio.Queue()
+        vagas = asyncio.Semaphore(max(1, processing_config.get('prefetch_buffer', 2 * threads)))
+        fora_do_prazo: List[SubmissaoEstudante] = []
+        executor = None
+        if pre_carregamento > 0:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(pre_carregamento, thread_name_prefix='prompts')
+
+        async def pre_carregar():
+            loop = asyncio.get_running_loop()
             try:
-                self.logger.info(f"[Tentativa {rodada}] Processando: {submissao.nome} (API call {submissao.tentativas_api + 1})")
-                
+                while len(fila) and (limite is None or time.monotonic() < limite):
+                    await vagas.acquire()
+                    submissao = fila.retirar()
+                    prontos.put_nowait((submissao, loop.run_in_executor(executor, self._montar_prompt, submissao)))
+            finally:
+                for _ in range(lacos):
+                    prontos.put_nowait(None)
+
+        async def laco(session):
+            nonlocal despachados
+            while True:
+                if executor is None:
+                    if not len(fila) or (limite is not None and time.monotonic() >= limite):
+                        return
+                    submissao, prompt = fila.retirar(), None
+                else:
+                    item = await prontos.get()
+                    if item is None:
+                        return
+                    vagas.release()
+                    submissao, prompt = item
+                    if limite is not None and time.monotonic() >= limite:
+                        prompt.cancel()
+                        fora_do_prazo.append(submissao)
+                        continue
+                self.metricas.sair_fila()
+                atraso = inicio + delay_base * (despachados // threads) - time.monotonic()
+                despachados += 1
+                if atraso > 0:
+                    await asyncio.sleep(atraso)
+                await self._processar_submissao(session, submissao, time.monotonic() - inicio, rodada, modelos, nivel,
+                                                amostras, prompt)
+
+        import aiohttp
+        resultados = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                produtor = asyncio.create_task(pre_carregar()) if executor is not None else None
+                resultados = await asyncio.gather(*[laco(session) for _ in range(lacos)], return_exceptions=True)
+                if produtor is not None:
+                    # Se todos os laços morreram, o produtor ficaria parado esperando uma vaga no buffer
+                    produtor.cancel()
+                    await asyncio.gather(produtor, return_exceptions=True)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        for erro in resultados:
+            if isinstance(erro, BaseException):
+                self.logger.error(f"Rodada {rodada}: laço de despacho interrompido: {erro!r}", exc_info=erro)
+
+        while not prontos.empty():
+            item = prontos.get_nowait()
+            if item is not None:
+                item[1].cancel()
+                fora_do_prazo.append(item[0])
+        restantes = fora_do_prazo + [fila.retirar() for _ in range(len(fila))]
+        if restantes:
+            motivo = "prazo atingido" if limite is not None and time.monotonic() >= limite else "despacho interrompido"
+            self.logger.warning(f"Rodada {rodada}: {motivo}, {len(restantes)} estudante(s) não despachado(s) "
+                                f"(use --continuar para completá-los)")
+            nao_despachados = 0
+            for submissao in restantes:
+                nao_despachados += len(self._tentativas_faltantes(submissao, rodada, amostras))
+                self.metricas.sair_fila()
+            self.metricas.definir_total(self.metricas.itens_total - nao_despachados)
+
+    def _fila_rodada(self, submissoes: List[SubmissaoEstudante], ordem: str):
+        from scheduling import CLASSE_PADRAO, FilaPrioridade
+
+        fila = FilaPrioridade()
+        for submissao in submissoes:
+            prioridade = self.prioridades.get(submissao.login, {})
+            tamanho = self._tamanho_estimado(submissao) if ordem == 'shortest_prompt' else 0
+            fila.adicionar(submissao, prioridade.get('classe', CLASSE_PADRAO), prioridade.get('prazo', float('inf')),
+                           tamanho)
+        return fila
+
+    @property
+    def prioridades(self) -> Dict[str, Dict]:
+        if self._prioridades is None:
+            from scheduling import carregar_prioridades
+            arquivo = self.config.get('scheduling', {}).get('priorities_file', 'config/priorities.yaml')
+            self._prioridades = carregar_prioridades(arquivo)
+            if self._prioridades:
+                self.logger.info(f"{len(self._prioridades)} prioridade(s) explícita(s) carregada(s) de {arquivo}")
+        return self._prioridades
+
+    def _tamanho_estimado(self, submissao: SubmissaoEstudante) -> int:
+        """Bytes de código da submissão (o resto do prompt é igual para todos), sem ler os arquivos."""
+        try:
+            if getattr(submissao, 'origem_zip', ''):
+                zf = self._abrir_zip(submissao.origem_zip)
+                return sum(zf.getinfo(str(p)).file_size for p in submissao.arquivos.values())
+            return sum(Path(p).stat().st_size for p in submissao.arquivos.values())
+        except (OSError, KeyError):
+            return 0
+
+    def _duracao_media_chamada(self) -> float:
+        """Duração média (s) das chamadas de um estudante numa tentativa, somando as requisições repetidas."""
+        duracoes = {}
+        for submissao in self.submissoes:
+            for span in submissao.spans:
+                if span.get('latencia_s') is not None:
+                    chave = (submissao.login, span.get('tentativa'))
+                    duracoes[chave] = duracoes.get(chave, 0.0) + span['latencia_s']
+        if not duracoes:
+            return self.config.get('scheduling', {}).get('estimated_call_seconds', 30)
+        return sum(duracoes.values()) / len(duracoes)
+
+    def _rodadas_no_prazo(self, limite: float, rodadas_maximas: int, espera_rodada: float) -> int:
+        """Quantas rodadas completas (com a espera entre elas) ainda cabem até o prazo."""
+        from scheduling import planejar_tentativas
+
+        processing_config = self.config.get('processing', {})
+        return planejar_tentativas(limite - time.monotonic(), len(self.submissoes), rodadas_maximas,
+                                   processing_config.get('parallel_threads', 4), self._duracao_media_chamada(),
+                                   processing_config.get('stagger_delay', 2), espera_rodada)
+
+    @staticmethod
+    def _tentativas_faltantes(submissao: SubmissaoEstudante, rodada: int, amostras: int = 1) -> List[int]:
+        feitas = {t['tentativa_num'] for t in submissao.historico_avaliacoes}
+        return [r for r in range(rodada, rodada + amostras) if r not in feitas]
+
+    async def _processar_submissao(self, session: aiohttp.ClientSession, submissao: SubmissaoEstudante,
+                                   espera_fila: float, rodada: int,
+                                   modelos: Optional[List[str]] = None, nivel: int = 0, amostras: int = 1,
+                                   prompt_pronto: Optional[asyncio.Future] = None):
+        """
+        Avalia a tentativa 'rodada' ou, com 'amostras' > 1, as tentativas
+        'rodada' .. 'rodada + amostras - 1' que o estudante ainda não tem. No
+        modo "n" todas as respostas vêm de uma única chamada (o prompt é enviado
+        e cobrado uma vez); as que o backend não devolver, e todas no modo
+        "back_to_back", saem em chamadas consecutivas com o mesmo prompt, o que
+        aproveita o cache de prefixo do provedor. 'prompt_pronto' é o prompt já
+        em montagem na pool de pré-carregamento.
+        """
+        rodadas = [rodada] if amostras == 1 else self._tentativas_faltantes(submissao, rodada, amostras)
+        total_itens, prompt = len(rodadas), ""
+        try:
+            prompt = await prompt_pronto if prompt_pronto is not None else self._montar_prompt(submissao)
+            while rodadas:
+                atual = rodadas.pop(0)
+                self.logger.info("[Tentativa %s] Processando: %s (API call %s)", atual, submissao.nome,
+                                 submissao.tentativas_api + 1,
+                                 extra={'amostrar': True, 'estudante': submissao.login, 'rodada': atual,
+                                        'nivel_cascata': nivel, 'evento': 'inicio'})
                 submissao.tentativas_api += 1
-                prompt = self._montar_prompt(submissao)
-                
-                resposta, prompt_enviado = await self._chamar_api_com_retry_adaptativo(session, prompt, rodada)
+
+                spans, extras = [], []
+                n = 1 + len(rodadas) if self.amostragem == 'n' else 1
+                resposta, prompt_enviado = await self._chamar_api_com_retry_adaptativo(
+                    session, prompt, atual, spans, espera_fila, modelos, n, extras,
+                    questoes=self._questoes_enviadas(submissao))
+                submissao.spans.extend(spans)
+                if not self._registrar_resposta(submissao, resposta, prompt_enviado, atual, spans, nivel):
+                    # Chamada esgotou as retentativas: esta e as demais amostras vão para a fila de falhas
+                    self._registrar_falha(submissao, [atual] + rodadas, causa_falha(spans), spans, prompt_enviado, nivel)
+                    break
+                for extra in extras[:len(rodadas)]:
+                    # Os tokens da chamada ficam na primeira resposta; as demais registram só o modelo
+                    extra_rodada = rodadas.pop(0)
+                    span_extra = [{'modelo': spans[-1].get('modelo')}]
+                    if not self._registrar_resposta(submissao, extra, prompt_enviado, extra_rodada, span_extra, nivel):
+                        self._registrar_falha(submissao, [extra_rodada], 'resposta_invalida', span_extra,
+                                              prompt_enviado, nivel)
+                espera_fila = 0.0
                 
-                if resposta and len(resposta.strip()) > 50:
-                    notas_q = self._extrair_notas_questoes(resposta, submissao)
-                    nota_f = sum(notas_q.values()) or self._extrair_nota_final(resposta)
-                    
-                    resultado_tentativa = {
-                        "nota_final": nota_f,
-                        "feedback": resposta,
-                        "notas_questoes": notas_q,
-                        "tentativa_num": rodada,
-                        "prompt": prompt_enviado 
-                    }
-                    submissao.historico_avaliacoes.append(resultado_tentativa)
-                    
-                    self.logger.info(f"[Tentativa {rodada}] {submissao.nome} - SUCESSO! Nota desta tentativa: {nota_f:.2f}")
+        except Exception as e:
+            self.logger.error("[Tentativa %s] %s - Erro inesperado: %s", rodada, submissao.nome, e, exc_info=True,
+                              extra={'estudante': submissao.login, 'rodada': rodada, 'evento': 'excecao'})
+            faltantes = self._tentativas_faltantes(submissao, rodada, amostras)
+            if faltantes:
+                self._registrar_falha(submissao, faltantes, f"excecao_{type(e).__name__}", [], prompt, nivel)
+        finally:
+            for _ in range(total_itens):
+                self.metricas.concluir_item()
+
+    def _registrar_resposta(self, submissao: SubmissaoEstudante, resposta: Optional[str],
+                            prompt_enviado: str, rodada: int, spans: Optional[List[Dict]] = None,
+                            nivel: int = 0) -> bool:
+        if resposta and len(resposta.strip()) > 50:
+            notas_q = self._extrair_notas_questoes(resposta, submissao)
+            nota_f = sum(notas_q.values()) or self._extrair_nota_final(resposta)
+            span_final = spans[-1] if spans else {}
+            
+            resultado_tentativa = {
+                "nota_final": nota_f,
+                "feedback": resposta,
+                "notas_questoes": notas_q,
+                "tentativa_num": rodada,
+                "prompt": prompt_enviado,
+                "modelo": span_final.get('modelo'),
+                "tokens_prompt": span_final.get('tokens_prompt', 0),
+                "tokens_completion": span_final.get('tokens_completion', 0),
+                "data_avaliacao": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "nivel": nivel
+            }
+            if self.baixo_consumo_memoria:
+                from artifacts import TentativaCompacta
+                resultado_tentativa = TentativaCompacta.de_resultado(resultado_tentativa, self._ids_questoes,
+                                                                     self.armazem)
+            elif self.artefatos:
+                resultado_tentativa['feedback_ref'] = self.armazem.gravar(resultado_tentativa.pop('feedback'))
+                prompt_tentativa = resultado_tentativa.pop('prompt')
+                resultado_tentativa['prompt_ref'] = self.armazem.gravar(prompt_tentativa) if prompt_tentativa else ""
+            submissao.historico_avaliacoes.append(resultado_tentativa)
+            self.fila_falhas.resolver(submissao.login, rodada)
+            
+            self.logger.info("[Tentativa %s] %s - SUCESSO! Nota desta tentativa: %.2f", rodada, submissao.nome, nota_f,
+                             extra={'amostrar': True, 'estudante': submissao.login, 'rodada': rodada,
+                                    'modelo': span_final.get('modelo'), 'latencia_s': span_final.get('latencia_s'),
+                                    'nota': nota_f, 'nivel_cascata': nivel, 'evento': 'sucesso'})
+            return True
+        
+        self.logger.warning("[Tentativa %s] %s - Resposta da API inválida ou vazia.", rodada, submissao.nome,
+                            extra={'estudante': submissao.login, 'rodada': rodada,
+                                   'modelo': spans[-1].get('modelo') if spans else None, 'evento': 'resposta_invalida'})
+        return False
+
+    def _registrar_falha(self, submissao: SubmissaoEstudante, rodadas: List[int], causa: str,
+                         spans: Optional[List[Dict]], prompt: str, nivel: int = 0):
+        erros = [sp['erro'] for sp in spans or [] if sp.get('erro')]
+        modelo = spans[-1].get('modelo') if spans else None
+        for r in rodadas:
+            entrada = self.fila_falhas.registrar(submissao.login, submissao.nome, r, causa, erros, modelo, prompt, nivel)
+        self.logger.warning("[Tentativa %s] %s - %s tentativa(s) na fila de falhas (causa: %s, %sª falha)",
+                            rodadas[0], submissao.nome, len(rodadas), causa, entrada['falhas'],
+                            extra={'estudante': submissao.login, 'rodada': rodadas[0], 'modelo': modelo,
+                                   'status': causa, 'evento': 'falha'})
+
+    async def gerar_feedbacks_detalhados(self, logins: Optional[List[str]] = None, refazer: bool = False) -> List[str]:
+        """
+        Segunda fase do feedback em duas fases: gera o feedback detalhado
+        (header_detailed, api.max_tokens) apenas da tentativa selecionada de cada
+        estudante, com as notas dela fixadas no prompt (feedback_grades_block).
+        As notas continuam as da primeira fase. Tentativas que já têm o feedback
+        detalhado são puladas, salvo com 'refazer'. Roda no fim da execução
+        ('after_grading') ou pelo subcomando 'feedback' ('on_demand').
+        Retorna os logins cujo feedback detalhado foi gerado.
+        """
+        if self.modo_feedback == 'inline':
+            self.logger.info("feedback_mode 'inline': as tentativas já trazem o feedback completo.")
+            return []
+        import aiohttp
+
+        calibracao = self._carregar_calibracao()
+        pendentes = []
+        for submissao in self.submissoes:
+            if not submissao.historico_avaliacoes or (logins and submissao.login not in logins):
+                continue
+            tentativa = self._selecionar_tentativa(submissao, calibracao)[0]
+            if refazer or not (tentativa.get('feedback_detalhado') or tentativa.get('feedback_detalhado_ref')):
+                pendentes.append((submissao, tentativa))
+        if not pendentes:
+            self.logger.info("Feedback detalhado: nenhuma tentativa selecionada pendente.")
+            return []
+
+        self.logger.info(f"Gerando o feedback detalhado de {len(pendentes)} tentativa(s) selecionada(s)...")
+        cabecalho = self.avaliacao.cabecalho_feedback(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        max_tokens = self.config['api'].get('max_tokens', 4000)
+        limite = asyncio.Semaphore(self.config.get('processing', {}).get('parallel_threads', 5))
+
+        async def gerar(session, submissao: SubmissaoEstudante, tentativa) -> bool:
+            async with limite:
+                prompt = self._prompt_feedback(submissao, tentativa, cabecalho, calibracao)
+                spans = []
+                # Mesmo modelo que deu as notas, para a explicação ser coerente com elas
+                modelos = [tentativa['modelo']] if tentativa.get('modelo') else None
+                resposta, _ = await self._chamar_api_com_retry_adaptativo(
+                    session, prompt, tentativa['tentativa_num'], spans, modelos=modelos, max_tokens=max_tokens,
+                    questoes=self._questoes_enviadas(submissao))
+                for span in spans:
+                    span['fase'] = 'feedback'
+                submissao.spans.extend(spans)
+                if not resposta:
+                    self.logger.warning(f"{submissao.nome} - feedback detalhado não gerado; mantida a resposta das notas")
+                    return False
+                if 'feedback_ref' not in tentativa:
+                    tentativa['feedback_detalhado'], tentativa['prompt_detalhado'] = resposta, prompt
+                elif isinstance(tentativa, dict):
+                    tentativa['feedback_detalhado_ref'] = self.armazem.gravar(resposta)
+                    tentativa['prompt_detalhado_ref'] = self.armazem.gravar(prompt)
                 else:
-                    self.logger.warning(f"[Tentativa {rodada}] {submissao.nome} - Resposta da API inválida ou vazia.")
-                    
+                    tentativa.feedback_detalhado_ref = self.armazem.gravar(resposta)
+                    tentativa.prompt_detalhado_ref = self.armazem.gravar(prompt)
+                self._consolidar_submissao(submissao, calibracao)
+                return True
+
+        async with aiohttp.ClientSession() as session:
+            gerados = await asyncio.gather(*(gerar(session, s, t) for s, t in pendentes))
+        alterados = [s.login for (s, _), gerado in zip(pendentes, gerados) if gerado]
+        self.logger.info(f"Feedback detalhado: {len(alterados)} de {len(pendentes)} gerado(s)")
+        return alterados
+
+    def _prompt_feedback(self, submissao: SubmissaoEstudante, tentativa, cabecalho: str, calibracao=None) -> str:
+        notas = self._notas_calibradas(tentativa, calibracao)[1] if calibracao else tentativa['notas_questoes']
+        if notas:
+            linhas = [f"QUESTAO_{q['id']}: {notas[q['id']]:g}/{q['max_points']:g} - [comentário]"
+                      for q in self.config['questions'] if q['id'] in notas]
+        else:
+            linhas = [f"NOTA FINAL: {tentativa['nota_final']:g}"]
+        bloco = self.config['prompt_templates']['feedback_grades_block'].format(grades='\n'.join(linhas))
+        return self._montar_prompt(submissao, cabecalho) + '\n' + bloco
+
+    def reavaliar(self, workers: int = 4) -> Dict[str, int]:
+        """
+        Reextrai as notas de todas as tentativas a partir das respostas brutas
+        guardadas (eval.py rescore), sem chamar a API, e consolida de novo com o
+        critério de seleção e a calibração atuais. As tentativas são
+        distribuídas por estudante num pool de processos.
+        """
+        from rescore import reextrair_em_lote
+
+        inicio = time.monotonic()
+        notas_anteriores = {s.login: (s.status, s.nota_final) for s in self.submissoes}
+        itens = []
+        for submissao in self.submissoes:
+            if submissao.historico_avaliacoes:
+                itens.append((submissao.login, [(i, t['feedback_ref'], True) if 'feedback_ref' in t
+                                                else (i, t['feedback'], False)
+                                                for i, t in enumerate(submissao.historico_avaliacoes)]))
+        resultados = reextrair_em_lote(itens, self.avaliacao.padrao_notas_questoes, self.avaliacao.padroes_nota_final,
+                                       self.config, workers)
+
+        por_login = {s.login: s for s in self.submissoes}
+        resumo = {'estudantes': len(itens), 'tentativas': 0, 'tentativas_alteradas': 0, 'notas_finais_alteradas': 0}
+        for login, tentativas, avisos in resultados:
+            historico = por_login[login].historico_avaliacoes
+            for indice, notas, nota_final in tentativas:
+                tentativa = historico[indice]
+                resumo['tentativas'] += 1
+                if notas != tentativa['notas_questoes'] or nota_final != tentativa['nota_final']:
+                    resumo['tentativas_alteradas'] += 1
+                    if isinstance(tentativa, dict):
+                        tentativa['notas_questoes'], tentativa['nota_final'] = notas, nota_final
+                    else:
+                        tentativa.atualizar_notas(notas, nota_final)
+            for aviso in avisos:
+                self.logger.warning(f"{login}: {aviso}")
+
+        self._consolidar_resultados_finais()
+        alteradas = [(s, notas_anteriores[s.login][1]) for s in self.submissoes
+                     if (s.status, s.nota_final) != notas_anteriores[s.login]]
+        resumo['notas_finais_alteradas'] = len(alteradas)
+        for submissao, anterior in alteradas[:20]:
+            self.logger.info(f"Nota final de {submissao.nome}: {anterior:.2f} -> {submissao.nota_final:.2f}")
+        self.logger.info(f"Reavaliação: {resumo['tentativas']} tentativa(s) de {resumo['estudantes']} estudante(s), "
+                         f"{resumo['tentativas_alteradas']} com notas diferentes, {resumo['notas_finais_alteradas']} "
+                         f"nota(s) final(is) alterada(s) em {time.monotonic() - inicio:.1f}s")
+        return resumo
+
+    def _escolher_modelo(self, modelos: List[str]) -> str:
+        if not self._pesos_modelos:
+            return random.choice(modelos)
+        return random.choices(modelos, weights=[self._pesos_modelos.get(m, 1.0) for m in modelos])[0]
+
+    async def verificar_modelos(self, modelos: Optional[List[str]] = None):
+        """
+        Verificação pre-flight (seção 'preflight'): sonda em paralelo os modelos
+        de api.models e da cascata (ou os 'modelos' informados) antes da primeira
+        chamada real. Modelos descontinuados, com erro de servidor ou timeout saem
+        da configuração desta execução (sem esvaziar nenhum nível); os lentos,
+        sobrecarregados ou com pouca cota restante passam a ser escolhidos menos.
+        """
+        from cascade import niveis_cascata
+        from preflight import obter_sondagem, pesos_modelos
+
+        preflight_config = self.config.get('preflight', {})
+        api_key = os.getenv('API_KEY') or os.getenv('GROQ_API_KEY')
+        if not preflight_config.get('enabled', True) or not api_key:
+            return
+        niveis = [list(modelos)] if modelos else niveis_cascata(self.config)
+        candidatos = sorted({m for nivel in niveis for m in nivel})
+        resultados, do_cache = await obter_sondagem(self.config['api']['url'], api_key, candidatos, preflight_config)
+
+        chamadas = sum(len(self._tentativas_faltantes(s, 1, self.llm_attempts)) for s in self.submissoes)
+        self._pesos_modelos = pesos_modelos(resultados, chamadas, preflight_config.get('overloaded_weight', 0.1))
+        self.logger.info(f"Pre-flight de {len(resultados)} modelo(s)" + (" (cache)" if do_cache else "") + ":")
+        for r in resultados:
+            cota = (f", cota {r['restante_requisicoes']} req/{r['restante_tokens']} tokens"
+                    if r.get('restante_requisicoes') is not None else "")
+            peso = self._pesos_modelos.get(r['modelo'])
+            self.logger.info(f"  {r['modelo']}: {r['estado']} (HTTP {r['status'] or '-'}, {r['latencia_s']:.2f}s{cota})"
+                             + (f" peso {peso:g}" if peso is not None else "") + (f" - {r['erro']}" if r['erro'] else ""))
+
+        if any(r['estado'] == 'sem_autorizacao' for r in resultados):
+            self.logger.error("Pre-flight: a API recusou a API_KEY (HTTP 401); os modelos não foram alterados.")
+            self._pesos_modelos = {}
+            return
+        if modelos:
+            return
+        usaveis = set(self._pesos_modelos)
+
+        def filtrar(nivel: List[str], secao: str) -> List[str]:
+            restantes = [m for m in nivel if m in usaveis]
+            if not restantes:
+                self.logger.warning(f"Pre-flight: nenhum modelo saudável em {secao} {nivel}; mantidos todos.")
+                return nivel
+            if len(restantes) < len(nivel):
+                self.logger.warning(f"Pre-flight: {secao} sem {[m for m in nivel if m not in usaveis]}")
+            return restantes
+
+        self.config['api']['models'] = filtrar(list(self.config['api']['models']), 'api.models')
+        cascade_config = self.config.get('cascade', {})
+        if cascade_config.get('enabled') and cascade_config.get('tiers'):
+            cascade_config['tiers'] = [filtrar(list(nivel), f'cascade.tiers[{i}]')
+                                       for i, nivel in enumerate(cascade_config['tiers'])]
+
+    async def reprocessar_falhas(self, modelo: Optional[str] = None):
+        """
+        Reprocessa apenas as tentativas da fila de falhas (grade --retry-failed),
+        agrupadas por número da tentativa e com o mesmo despacho das rodadas
+        normais. 'modelo' substitui api.models (e o modelo do nível da cascata)
+        nestas chamadas. No fim, consolida e gera os arquivos como uma execução
+        normal.
+        """
+        from cascade import niveis_cascata
+
+        pendentes = self.fila_falhas.pendentes()
+        if not pendentes:
+            self.logger.info(f"Fila de falhas vazia ({self.retry_queue_file}): nada a reprocessar.")
+            return
+        self.logger.info(f"Reprocessando {len(pendentes)} tentativa(s) da fila de falhas {self.fila_falhas.resumo()}"
+                         + (f" com o modelo {modelo}" if modelo else ""))
+
+        por_login = {s.login: s for s in self.submissoes}
+        grupos = {}
+        for entrada in pendentes:
+            submissao = por_login.get(entrada['login'])
+            if submissao is None or not self._tentativas_faltantes(submissao, entrada['tentativa']):
+                # Estudante fora do estado atual ou tentativa já avaliada por outro caminho
+                self.fila_falhas.resolver(entrada['login'], entrada['tentativa'])
+                continue
+            grupos.setdefault((entrada['tentativa'], entrada.get('nivel') or 0), []).append(submissao)
+
+        niveis = niveis_cascata(self.config)
+        self.metricas.definir_total(sum(len(subs) for subs in grupos.values()))
+        telemetria = self._iniciar_telemetria()
+        for (tentativa, nivel), subs in sorted(grupos.items()):
+            modelos = [modelo] if modelo else niveis[min(nivel, len(niveis) - 1)]
+            await self._processar_rodada_adaptativa(subs, tentativa, modelos, nivel)
+            self.salvar_estado()
+        await self._encerrar_telemetria(telemetria)
+
+        restantes = len(self.fila_falhas)
+        self.logger.info(f"Fila de falhas: {len(pendentes) - restantes} tentativa(s) recuperada(s), {restantes} restante(s)")
+        await self._concluir_execucao()
+
+    async def executar_coordenador(self):
+        """
+        Modo coordenador: renderiza os itens (estudante × tentativa) na fila durável,
+        acompanha o progresso dos workers e consolida os resultados ao final.
+        """
+        import hashlib
+        from work_queue import criar_fila
+
+        dist_config = self.config.get('distributed', {})
+        intervalo = dist_config.get('poll_interval', 5)
+        fila = criar_fila(self.config)
+
+        itens = []
+        inicio_corpo = len(self._cabecalho_prompt())
+        for submissao in self.submissoes:
+            prompt = self._montar_prompt(submissao)
+            # Impressão do prompt sem o cabeçalho (que traz a data da execução): uma nova
+            # entrega, outra rubrica ou outra avaliação não reaproveitam itens antigos da fila
+            impressao = hashlib.sha256(prompt[inicio_corpo:].encode('utf-8')).hexdigest()[:12]
+            for tentativa_num in range(1, self.llm_attempts + 1):
+                if any(t['tentativa_num'] == tentativa_num for t in submissao.historico_avaliacoes):
+                    continue
+                itens.append({
+                    "id": f"{submissao.login}:{tentativa_num}:{impressao}",
+                    "login": submissao.login,
+                    "nome": submissao.nome,
+                    "tentativa": tentativa_num,
+                    "questoes": self._questoes_enviadas(submissao),
+                    "prompt": prompt
+                })
+        itens.sort(key=lambda item: item['tentativa'])
+        novos = fila.enfileirar(itens)
+        self.logger.info(f"Coordenador: {novos} novo(s) item(ns) enfileirado(s) ({len(itens)} necessários)")
+
+        while True:
+            recuperados = fila.recuperar_expirados()
+            if recuperados:
+                self.logger.warning(f"Coordenador: {recuperados} lease(s) expirado(s) devolvido(s) à fila")
+            resumo = fila.resumo()
+            self.logger.info(f"Coordenador: pendentes={resumo['pendente']} em andamento={resumo['em_andamento']} "
+                             f"concluídos={resumo['concluido']} falhas={resumo['falhou']}")
+            if resumo['pendente'] == 0 and resumo['em_andamento'] == 0:
+                break
+            await asyncio.sleep(intervalo)
+
+        self._coletar_resultados_fila(fila, {item['id'] for item in itens})
+        self.salvar_estado()
+        self.logger.info("Todos os itens da fila foram processados. Consolidando os resultados finais...")
+        await self._concluir_execucao()
+
+    def _coletar_resultados_fila(self, fila, ids: set):
+        """Consolida no estado os resultados dos itens 'ids' (os enfileirados nesta execução)."""
+        por_login = {s.login: s for s in self.submissoes}
+        for item in fila.resultados():
+            if item['id'] not in ids:
+                continue
+            submissao = por_login.get(item['login'])
+            if not submissao:
+                continue
+            if any(t['tentativa_num'] == item['tentativa'] for t in submissao.historico_avaliacoes):
+                continue
+            if item['status'] != 'concluido':
+                submissao.tentativas_api += 1
+                self.logger.warning(f"[Tentativa {item['tentativa']}] {submissao.nome} - Falha no worker: {item.get('causa')}")
+                self._registrar_falha(submissao, [item['tentativa']], item.get('causa') or 'falha_worker', [],
+                                      item['prompt'])
+                continue
+            resultado = item['resultado']
+            submissao.tentativas_api += 1
+            submissao.spans.extend(resultado.get('spans', []))
+            self._registrar_resposta(submissao, resultado.get('resposta'), resultado.get('prompt', item['prompt']),
+                                     item['tentativa'], resultado.get('spans'))
+
+    async def executar_worker(self, worker_id: Optional[str] = None, aguardar: bool = False):
+        """
+        Modo worker: arrenda itens da fila, chama a LLM com a API_KEY/modelos
+        deste processo e grava as respostas de volta na fila.
+        """
+        import socket
+        from work_queue import criar_fila
+
+        dist_config = self.config.get('distributed', {})
+        lease_timeout = dist_config.get('lease_timeout', 600)
+        intervalo = dist_config.get('poll_interval', 5)
+        threads = self.config.get('processing', {}).get('parallel_threads', 4)
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        fila = criar_fila(self.config)
+
+        import aiohttp
+        self.logger.info(f"Worker {worker_id}: {threads} laço(s) paralelo(s), lease de {lease_timeout}s")
+        telemetria = self._iniciar_telemetria()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*[self._laco_worker(session, fila, worker_id, lease_timeout, intervalo, aguardar)
+                                   for _ in range(threads)])
+        await self._encerrar_telemetria(telemetria)
+        self.logger.info(f"Worker {worker_id}: fila esgotada, encerrando.")
+
+    async def _laco_worker(self, session: aiohttp.ClientSession, fila, worker_id: str,
+                           lease_timeout: float, intervalo: float, aguardar: bool):
+        while True:
+            item = await asyncio.to_thread(fila.arrendar, worker_id, lease_timeout)
+            if item is None:
+                resumo = await asyncio.to_thread(fila.resumo)
+                if not aguardar and resumo['pendente'] == 0 and resumo['em_andamento'] == 0:
+                    return
+                await asyncio.sleep(intervalo)
+                continue
+
+            self.logger.info("[Tentativa %s] Worker %s processando: %s", item['tentativa'], worker_id, item['nome'],
+                             extra={'amostrar': True, 'estudante': item.get('login'), 'rodada': item['tentativa'],
+                                    'evento': 'inicio'})
+            self.metricas.concluir_item()
+            spans = []
+            renovacao = asyncio.create_task(self._renovar_lease(fila, item, worker_id, lease_timeout))
+            try:
+                resposta, prompt_enviado = await self._chamar_api_com_retry_adaptativo(
+                    session, item['prompt'], item['tentativa'], spans, questoes=item.get('questoes'))
             except Exception as e:
-                self.logger.error(f"[Tentativa {rodada}] {submissao.nome} - Erro inesperado: {str(e)}", exc_info=True)
+                self.logger.error(f"[Tentativa {item['tentativa']}] {item['nome']} - Erro inesperado: {e}", exc_info=True)
+                resposta, prompt_enviado = None, item['prompt']
+            finally:
+                renovacao.cancel()
+
+            if resposta and len(resposta.strip()) > 50:
+                resultado = {"resposta": resposta, "prompt": prompt_enviado, "worker": worker_id, "spans": spans}
+                await asyncio.to_thread(fila.concluir, item, worker_id, resultado)
+            else:
+                await asyncio.to_thread(fila.falhar, item, worker_id, causa_falha(spans))
+
+    async def _renovar_lease(self, fila, item: Dict, worker_id: str, lease_timeout: float):
+        """Renova o lease a cada terço do lease_timeout enquanto o item é processado (retries e 429 incluídos)."""
+        while True:
+            await asyncio.sleep(lease_timeout / 3)
+            if not await asyncio.to_thread(fila.renovar, item, worker_id, lease_timeout):
+                self.logger.warning(f"[Tentativa {item['tentativa']}] {item['nome']} - lease perdido; "
+                                    f"o item pode ser processado por outro worker")
+                return
 
     async def _chamar_api_com_retry_adaptativo(self, session: aiohttp.ClientSession,
-                                             prompt: str, rodada: int) -> Tuple[Optional[str], str]:
+                                             prompt: str, rodada: int,
+                                             spans: Optional[List[Dict]] = None,
+                                             espera_fila: float = 0.0,
+                                             modelos: Optional[List[str]] = None, n: int = 1,
+                                             respostas_extras: Optional[List[str]] = None,
+                                             max_tokens: Optional[int] = None,
+                                             questoes: Optional[List[str]] = None) -> Tuple[Optional[str], str]:
+        """
+        Chama a API com novas tentativas. Cada requisição HTTP gera um span de
+        rastreamento (modelo, retry, espera na fila, TTFB, latência, tokens e
+        status), acrescentado a 'spans' quando a lista é fornecida. 'modelos'
+        restringe a escolha a um nível da cascata (padrão: api.models).
+        Com n > 1 pede n respostas na mesma chamada: a primeira é retornada e as
+        demais vão para 'respostas_extras'. Modelos que recusam (HTTP 400) ou
+        ignoram o parâmetro passam a receber n = 1 até o fim da execução.
+        Sem 'max_tokens', tentativas que pedem só as notas (feedback em duas
+        fases) usam api.scoring_max_tokens e as demais api.max_tokens. Com o
+        orçamento ativo (seção 'budget') e as 'questoes' enviadas, esses valores e
+        o timeout passam a ser tetos da previsão de cada requisição.
+        """
+        import aiohttp
+
         max_retries = 3
         api_config = self.config['api']
         timeout_base = api_config.get('timeout', 120)
-        models = api_config['models']
+        models = modelos or api_config['models']
+        perfil = 'notas' if max_tokens is None and self.modo_feedback != 'inline' else 'completo'
+        if max_tokens is None:
+            max_tokens = (api_config.get('scoring_max_tokens', 600) if self.modo_feedback != 'inline'
+                          else api_config.get('max_tokens', 4000))
+        orcamento = self.orcamento if questoes is not None else None
+        teto_tokens, ultimo_erro = max_tokens, None
         
         api_key = os.getenv('API_KEY') or os.getenv('GROQ_API_KEY')
         if not api_key:
@@ -351,8 +1451,24 @@ class GerenciadorAvaliacao:
         api_url = api_config['url']
         
         for retry in range(max_retries):
+            modelo = self._escolher_modelo(models)
+            if retry > 0:
+                self.metricas.registrar_retry()
+            n_pedido = n if modelo not in self._modelos_sem_n else 1
+            span = self._novo_span(modelo, rodada, retry, espera_fila if retry == 0 else 0.0)
+            timeout_s = timeout_base + (retry * 20)
+            if orcamento is not None:
+                # Após uma resposta cortada ou um timeout, a retentativa volta aos limites configurados
+                max_tokens = teto_tokens if ultimo_erro == 'truncada' else orcamento.max_tokens(perfil, questoes,
+                                                                                                 teto_tokens)
+                if ultimo_erro != 'timeout':
+                    timeout_s = orcamento.timeout(modelo, max_tokens, timeout_s)
+                span['max_tokens'], span['timeout_s'] = max_tokens, timeout_s
+            if n_pedido > 1:
+                span['amostras'] = n_pedido
+            self.metricas.inicio_requisicao()
+            inicio = time.monotonic()
             try:
-                modelo = random.choice(models)
                 
                 payload = {
                     "model": modelo,
@@ -360,174 +1476,302 @@ class GerenciadorAvaliacao:
                         {"role": "system", "content": "Você é um corretor de código eficiente e rigoroso."},
                         {"role": "user", "content": prompt}
                     ],
-                    "max_tokens": api_config.get('max_tokens', 4000),
+                    "max_tokens": max_tokens,
                     "temperature": api_config.get('temperature', 0.1),
                     "stream": False
                 }
+                if n_pedido > 1:
+                    payload["n"] = n_pedido
                 
                 headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-                timeout = aiohttp.ClientTimeout(total=timeout_base + (retry * 20))
+                timeout = aiohttp.ClientTimeout(total=timeout_s)
                 
                 async with session.post(api_url, json=payload, headers=headers, timeout=timeout) as response:
+                    span['ttfb_s'] = round(time.monotonic() - inicio, 4)
+                    span['status'] = response.status
+                    span['headers'] = {k.lower(): v for k, v in response.headers.items()
+                                       if k.lower().startswith('x-ratelimit') or k.lower() in ('x-request-id', 'retry-after')}
                     if response.status == 200:
                         data = await response.json()
+                        self._preencher_uso_span(span, data.get('usage') or {})
+                        cortada = False
                         if data.get('choices'):
                             content = data['choices'][0]['message']['content']
-                            if len(content.strip()) > 50:
+                            cortada = (orcamento is not None and max_tokens < teto_tokens
+                                       and data['choices'][0].get('finish_reason') == 'length')
+                            if len(content.strip()) > 50 and not cortada:
+                                if n_pedido > 1:
+                                    if respostas_extras is not None:
+                                        respostas_extras.extend((c.get('message') or {}).get('content') or ''
+                                                                for c in data['choices'][1:n_pedido])
+                                    if len(data['choices']) < n_pedido:
+                                        self._modelos_sem_n.add(modelo)
+                                        self.logger.warning(f"{modelo} ignorou n={n_pedido}: amostras seguintes em "
+                                                            f"chamadas consecutivas")
+                                self._fechar_span(span, inicio, spans)
+                                if orcamento is not None:
+                                    orcamento.registrar(modelo, perfil, content,
+                                                        span['tokens_completion'] // len(data['choices']),
+                                                        span['latencia_s'], self.avaliacao.padrao_notas_questoes)
                                 return content, prompt
+                            if cortada:
+                                orcamento.registrar_truncamento()
+                                self.logger.warning("Resposta cortada em max_tokens=%s; repetindo com %s", max_tokens,
+                                                    teto_tokens, extra={'rodada': rodada, 'modelo': modelo,
+                                                                        'retry': retry, 'evento': 'truncada'})
+                        span['erro'] = 'truncada' if cortada else 'resposta_vazia'
+                    
+                    elif response.status == 400 and n_pedido > 1:
+                        self._modelos_sem_n.add(modelo)
+                        span['erro'] = 'n_nao_suportado'
+                        self.logger.warning(f"{modelo} recusou n={n_pedido} (Status 400): usando chamadas consecutivas")
                     
                     elif response.status == 429:
+                        span['erro'] = 'rate_limit'
+                        self._fechar_span(span, inicio, spans)
+                        span_fechado, span = span, None  # já registrado antes da espera
                         wait = min(60, 15 * (2 ** retry))
-                        self.logger.warning(f"Rate limit atingido (429). Aguardando {wait}s para tentar novamente...")
+                        self.logger.warning("Rate limit atingido (429). Aguardando %ss para tentar novamente...", wait,
+                                            extra={'rodada': rodada, 'modelo': modelo, 'retry': retry,
+                                                   'latencia_s': span_fechado['latencia_s'], 'status': 429,
+                                                   'evento': 'rate_limit'})
                         await asyncio.sleep(wait)
                     else:
                         response_text = await response.text()
-                        self.logger.error(f"Erro da API (Status {response.status}): {response_text[:200]}...")
+                        span['erro'] = f"http_{response.status}"
+                        self.logger.error("Erro da API (Status %s): %s...", response.status, response_text[:200],
+                                          extra={'rodada': rodada, 'modelo': modelo, 'retry': retry,
+                                                 'status': response.status, 'evento': 'erro_http'})
+            except asyncio.TimeoutError:
+                span['erro'] = 'timeout'
+                self.logger.error("Timeout na chamada à API (tentativa %s)", retry + 1,
+                                  extra={'rodada': rodada, 'modelo': modelo, 'retry': retry, 'evento': 'timeout'})
             except Exception as e:
-                self.logger.error(f"Erro na chamada à API (tentativa {retry + 1}): {e}")
+                span['erro'] = type(e).__name__
+                self.logger.error("Erro na chamada à API (tentativa %s): %s", retry + 1, e,
+                                  extra={'rodada': rodada, 'modelo': modelo, 'retry': retry,
+                                         'evento': type(e).__name__})
+            ultimo_erro = span['erro'] if span is not None else 'rate_limit'
+            if span is not None:
+                self._fechar_span(span, inicio, spans)
             
-            if retry < max_retries - 1:
+            if retry < max_retries - 1 and ultimo_erro != 'truncada':
                 await asyncio.sleep(min(30, (3 ** retry) + random.uniform(0, 5)))
         
         return None, prompt
 
-    def _montar_prompt(self, submissao: SubmissaoEstudante) -> str:
+    def _novo_span(self, modelo: str, rodada: int, retry: int, espera_fila: float) -> Dict:
+        return {
+            "execucao": self.execucao_id,
+            "modelo": modelo,
+            "tentativa": rodada,
+            "retry": retry,
+            "espera_fila_s": round(espera_fila, 4),
+            "inicio": time.time(),
+            "ttfb_s": None,
+            "latencia_s": None,
+            "status": 0,
+            "tokens_prompt": 0,
+            "tokens_completion": 0,
+            "tokens_cache": 0,
+            "erro": None,
+            "headers": {}
+        }
+
+    @staticmethod
+    def _preencher_uso_span(span: Dict, usage: Dict):
+        span['tokens_prompt'] = usage.get('prompt_tokens', 0) or 0
+        span['tokens_completion'] = usage.get('completion_tokens', 0) or 0
+        detalhes = usage.get('prompt_tokens_details') or {}
+        span['tokens_cache'] = detalhes.get('cached_tokens', 0) or 0
+
+    def _fechar_span(self, span: Dict, inicio: float, spans: Optional[List[Dict]]):
+        span['latencia_s'] = round(time.monotonic() - inicio, 4)
+        self.metricas.fim_requisicao(span['modelo'], span['latencia_s'], span['status'],
+                                     span['tokens_prompt'], span['tokens_completion'])
+        if span['tokens_prompt']:
+            # Cache de prefixo do provedor (usage.prompt_tokens_details.cached_tokens)
+            self.metricas.registrar_cache(span['tokens_cache'] > 0)
+        if spans is not None:
+            spans.append(span)
+
+    def _montar_prompt(self, submissao: SubmissaoEstudante, cabecalho: Optional[str] = None) -> str:
         """
-        Monta o prompt para a LLM de forma dinâmica, lendo todos os templates
-        e rubricas do arquivo de configuração YAML.
+        Monta o prompt para a LLM a partir da avaliação compilada: cabeçalho já
+        formatado (a data é a do início da execução; 'cabecalho' o substitui) e,
+        para cada questão enviada, o bloco pré-renderizado com o código do
+        estudante no meio.
         """
-        prompt_parts = []
-        
-        # 1. Pega os templates do objeto de configuração carregado
-        templates = self.config.get('prompt_templates', {})
-        assessment_config = self.config.get('assessment', {})
-        
-        # 2. Seleciona o cabeçalho apropriado (detalhado ou conciso)
-        if self.detailed_feedback:
-            header_template = templates.get('header_detailed', "ERRO: Template de cabeçalho detalhado não encontrado.")
-        else:
-            header_template = templates.get('header_concise', "ERRO: Template de cabeçalho conciso não encontrado.")
-            
-        # Formata o cabeçalho com dados dinâmicos
-        formatted_header = header_template.format(
-            assessment_name=assessment_config.get('name', 'Avaliação'),
-            current_date=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        )
-        prompt_parts.append(formatted_header)
-        
-        # 3. Pega o template para o bloco de cada questão
-        question_template = templates.get('question_block', "ERRO: Template de questão não encontrado.")
+        prompt_parts = [cabecalho or self._cabecalho_prompt()]
 
-        # 4. Itera sobre cada questão configurada no YAML
-        for questao in self.config.get('questions', []):
-            questao_id = questao.get('id')
-            
+        for questao in self.avaliacao.questoes:
             # Processa a questão apenas se o estudante enviou o arquivo correspondente
-            if questao_id and questao_id in submissao.arquivos:
+            if questao.id in submissao.arquivos:
                 try:
-                    # Lê o código do estudante do arquivo
-                    with open(submissao.arquivos[questao_id], 'r', encoding='utf-8', errors='ignore') as f:
-                        codigo = f.read()
+                    # Lê o código do estudante (pasta extraída ou zip do Moodle)
+                    codigo = self._ler_codigo(submissao, questao.id)
 
-                    # Pega a rubrica DIRETAMENTE do objeto de configuração (não mais de um arquivo)
-                    rubrica = questao.get('rubric', f"Rubrica para {questao_id} não encontrada no config.yaml")
-                    
-                    # Formata o bloco da questão com todos os dados
-                    formatted_question = question_template.format(
-                        question_name=questao.get('name', ''),
-                        question_id=questao_id,
-                        max_points=questao.get('max_points', 0),
-                        rubric=rubrica,
-                        code=codigo
-                    )
-                    prompt_parts.append(formatted_question)
+                    bloco_diff = self._bloco_diff(submissao, questao.config, questao.config['rubric'], codigo)
+                    prompt_parts.append(bloco_diff or questao.renderizar(codigo))
+                    bloco_vpl = self._bloco_vpl(submissao, questao.id)
+                    if bloco_vpl:
+                        prompt_parts.append(bloco_vpl)
                     
                 except Exception as e:
-                    self.logger.warning(f"Erro ao processar arquivos para a questão {questao_id}: {e}")
+                    self.logger.warning(f"Erro ao processar arquivos para a questão {questao.id}: {e}")
         
         return '\n'.join(prompt_parts)
 
-    def _extrair_notas_questoes(self, feedback: str, submissao: SubmissaoEstudante) -> Dict[str, float]:
-        notas = {}
-        padrao_questao = r'QUESTAO_(\w+):\s*(\d+(?:\.\d+)?)/(\d+(?:\.\d+)?)'
-        matches = re.findall(padrao_questao, feedback, re.IGNORECASE | re.MULTILINE)
-        for questao_id, nota_str, maximo_str in matches:
-            try:
-                nota, maximo = float(nota_str), float(maximo_str)
-                if 0 <= nota <= maximo:
-                    notas[questao_id] = nota
-                else:
-                    self.logger.warning(f"Nota inválida para {questao_id}: {nota}/{maximo}")
-            except ValueError as e:
-                self.logger.warning(f"Erro ao converter nota {questao_id}: {e}")
-        return notas
-    
-    def extrair_notas_moodle(self, pasta_estudante: Path) -> Tuple[Dict[str, float], Dict[str, float]]:
-        arquivo_execution = self._encontrar_arquivo_execution(pasta_estudante)
-        if not arquivo_execution or not arquivo_execution.exists():
-            return {}, {}
-
-        import re
+    def _questoes_enviadas(self, submissao: SubmissaoEstudante) -> List[str]:
+        return [questao.id for questao in self.avaliacao.questoes if questao.id in submissao.arquivos]
 
-        notas_percentuais, questao_atual = {}, None
-        nota_final = None
+    def _cabecalho_prompt(self) -> str:
+        if self._cabecalho is None:
+            self._cabecalho = self.avaliacao.cabecalho(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        return self._cabecalho
 
-        try:
-            with open(arquivo_execution, 'r', encoding='utf-8', errors='ignore') as f:
-                for linha in f:
-                    linha = linha.strip()
-
-                    # Detecta início de questão
-                    match_questao = re.search(r'-\s*Question\s*(\d+):', linha, re.IGNORECASE)
-                    if match_questao:
-                        questao_atual = f"Q{match_questao.group(1)}"
-                        continue
+    def _bloco_diff(self, submissao: SubmissaoEstudante, questao: Dict, rubrica: str, codigo: str) -> Optional[str]:
+        """
+        Bloco curto com o diff em relação ao representante já corrigido do grupo,
+        ou None quando a questão deve ser avaliada por completo.
+        """
+        if self._similaridade is None:
+            return None
+        referencia = self._similaridade.referencia(submissao.login, questao['id'])
+        if referencia is None:
+            return None
+        from similarity import diff_resumido
 
-                    # Captura percentual da questão
-                    if questao_atual:
-                        match_completa = re.search(r'\(([0-9]+(?:\.[0-9]+)?)%\)', linha)
-                        if match_completa:
-                            notas_percentuais[questao_atual] = float(match_completa.group(1))
-                            questao_atual = None  # Próxima questão
+        diff = diff_resumido(referencia['codigo'], codigo)
+        if len(diff) > 0.6 * len(codigo):
+            return None  # Diferenças grandes: o diff não economiza nada
+        template = self.config.get('prompt_templates', {}).get('question_diff_block')
+        if not template:
+            return None
+        return template.format(
+            question_name=questao.get('name', ''),
+            question_id=questao['id'],
+            max_points=questao.get('max_points', 0),
+            rubric=rubrica,
+            similarity=round(referencia['similaridade'] * 100),
+            reference_grade=referencia['nota'],
+            reference_comment=referencia['comentario'] or 'sem comentário',
+            diff=diff or '(nenhuma diferença além de comentários e espaços)'
+        )
 
-                    # Captura nota final
-                    match_final = re.search(r'Grade\s*:=>>\s*([0-9]+(?:\.[0-9]+)?)', linha)
-                    if match_final:
-                        nota_final = float(match_final.group(1))
+    def _bloco_vpl(self, submissao: SubmissaoEstudante, questao_id: str) -> Optional[str]:
+        """Resultado dos testes do VPL para a questão, quando vpl.include_in_prompt está ativo."""
+        if not (self.config.get('vpl') or {}).get('include_in_prompt', False):
+            return None
+        resultado = (submissao.vpl or {}).get('questoes', {}).get(questao_id)
+        template = self.config.get('prompt_templates', {}).get('question_vpl_block')
+        if not resultado or not template:
+            return None
+        from vpl_parser import resumo_testes
 
-            notas_pontos = self._converter_percentuais_para_pontos(notas_percentuais)
+        return template.format(
+            question_id=questao_id,
+            tests_passed=resultado.get('aprovados') or 0,
+            tests_total=resultado.get('executados') or 0,
+            failed_tests=resumo_testes(resultado),
+            compilation=submissao.vpl.get('compilacao') or 'sem erros'
+        )
 
-            # Se quiser, adiciona a nota final como 'Final'
-            if nota_final is not None:
-                notas_percentuais['Final'] = nota_final
-                notas_pontos['Final'] = nota_final  # ou converter se necessário
+    def _extrair_notas_questoes(self, feedback: str, submissao: SubmissaoEstudante) -> Dict[str, float]:
+        from rescore import extrair_notas_questoes
 
-            return notas_percentuais, notas_pontos
+        notas, avisos = extrair_notas_questoes(feedback, self.avaliacao.padrao_notas_questoes)
+        for aviso in avisos:
+            self.logger.warning(aviso)
+        return notas
+    
+    def extrair_notas_moodle(self, pasta_estudante: Path) -> Tuple[Dict[str, float], Dict[str, float]]:
+        import vpl_parser
 
+        pasta_ceg = self._encontrar_pasta_ceg(pasta_estudante)
+        if not pasta_ceg:
+            return {}, {}
+        try:
+            return self._notas_vpl(vpl_parser.analisar_fonte(str(pasta_ceg)))
         except Exception as e:
-            self.logger.error(f"Erro ao ler execution.txt: {e}")
+            self.logger.error(f"Erro ao ler resultados do VPL em {pasta_ceg}: {e}")
             return {}, {}
 
+    def _notas_vpl(self, resultado: Dict) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Percentuais e pontos por questão (mais a nota final do VPL como 'Final')."""
+        notas_percentuais = {q: r['percentual'] for q, r in resultado.get('questoes', {}).items()
+                             if r.get('percentual') is not None}
+        notas_pontos = self._converter_percentuais_para_pontos(notas_percentuais)
+        if resultado.get('nota_final') is not None:
+            notas_percentuais['Final'] = resultado['nota_final']
+            notas_pontos['Final'] = resultado['nota_final']
+        return notas_percentuais, notas_pontos
 
+    def _analisar_vpl_em_lote(self, pendentes: Dict[str, Tuple[str, str, object]]) -> Dict[str, Dict]:
+        """
+        Analisa as pastas .ceg de várias submissões de uma vez (login -> (chave,
+        assinatura, fonte)). Resultados com a mesma assinatura vêm do cache; os
+        demais são analisados em um pool de processos (vpl.workers). A fonte é o
+        caminho da pasta ou uma função que lê os textos do zip, chamada apenas
+        quando o cache não serve.
+        """
+        import vpl_parser
+
+        if not pendentes:
+            return {}
+        vpl_config = self.config.get('vpl', {}) or {}
+        cache = vpl_parser.CacheResultadosVPL(vpl_config.get('cache_file', 'output/.cache/vpl_resultados.json'))
+        resultados, faltando = {}, {}
+        for login, (chave, assinatura, fonte) in pendentes.items():
+            resultado = cache.obter(chave, assinatura)
+            if resultado is not None:
+                resultados[login] = resultado
+                continue
+            try:
+                faltando[login] = (chave, assinatura, fonte() if callable(fonte) else fonte)
+            except Exception as e:
+                self.logger.error(f"Erro ao ler resultados do VPL de {login}: {e}")
+
+        if faltando:
+            analisados = vpl_parser.analisar_em_lote({login: f for login, (_, _, f) in faltando.items()},
+                                                     vpl_config.get('workers', 4))
+            for login, resultado in analisados.items():
+                chave, assinatura, _ = faltando[login]
+                cache.guardar(chave, assinatura, resultado)
+                resultados[login] = resultado
+            try:
+                cache.salvar()
+            except OSError as e:
+                self.logger.warning(f"Não foi possível gravar o cache do VPL: {e}")
+        self.logger.info(f"Resultados do VPL: {len(resultados)} pastas .ceg "
+                         f"({len(resultados) - len(faltando)} do cache, {len(faltando)} analisadas)")
+        return resultados
+
+    def _aplicar_resultados_vpl(self, submissoes: List[SubmissaoEstudante], resultados: Dict[str, Dict]):
+        for submissao in submissoes:
+            resultado = resultados.get(submissao.login)
+            if resultado:
+                submissao.vpl = resultado
+                submissao.notas_moodle_percent, submissao.notas_moodle_pontos = self._notas_vpl(resultado)
+
+    def _ler_textos_zip(self, zip_file, infos) -> Dict[str, str]:
+        return {PurePosixPath(i.filename).name: zip_file.read(i).decode('utf-8', errors='ignore') for i in infos}
 
     def _converter_percentuais_para_pontos(self, percentuais: Dict[str, float]) -> Dict[str, float]:
         pontos = {}
-        # CORRIGIDO: Usa as chaves corretas ('questions', 'max_points')
-        pesos_questoes = {q['id']: q['max_points'] for q in self.config['questions']}
+        pesos_questoes = self.avaliacao.pesos
         for questao_id, percentual in percentuais.items():
             if questao_id in pesos_questoes:
                 pontos[questao_id] = round((percentual / 100.0) * pesos_questoes[questao_id], 2)
         return pontos
     
-    def _encontrar_arquivo_execution(self, pasta_submissao: Path) -> Optional[Path]:
+    def _encontrar_pasta_ceg(self, pasta_submissao: Path) -> Optional[Path]:
+        """Pasta .ceg mais recente (ou a própria pasta, se o execution.txt estiver solto nela)."""
         try:
             pastas_ceg = [p for p in pasta_submissao.iterdir() if p.is_dir() and p.name.endswith('.ceg')]
             if not pastas_ceg:
-                arquivo_direto = pasta_submissao / "execution.txt"
-                return arquivo_direto if arquivo_direto.exists() else None
-            pasta_ceg_recente = max(pastas_ceg, key=lambda x: x.stat().st_mtime)
-            arquivo_execution = pasta_ceg_recente / "execution.txt"
-            return arquivo_execution if arquivo_execution.exists() else None
+                return pasta_submissao if (pasta_submissao / "execution.txt").exists() else None
+            return max(pastas_ceg, key=lambda x: x.stat().st_mtime)
         except Exception: return None
 
     def _relatorio_rodada(self, rodada: int):
@@ -553,101 +1797,242 @@ class GerenciadorAvaliacao:
             print(f"\nSUBMISSÕES COM FALHA FINAL:")
             for s in pendentes:
                 print(f"   • {s.nome} (API calls: {s.tentativas_api})")
+        if self.fila_falhas:
+            print(f"\nFila de falhas: {len(self.fila_falhas)} tentativa(s) {self.fila_falhas.resumo()} em "
+                  f"{self.retry_queue_file}")
+            print("   Reprocesse só essas com: eval.py grade --retry-failed [--modelo M] [--timeout S]")
         
         print("="*80 + "\n")
+        self.salvar_traces()
         self.salvar_feedbacks_finais()
 
-    def salvar_feedbacks_finais(self):
+    def salvar_feedbacks_finais(self, incluir_prompts: Optional[bool] = None, logins: Optional[List[str]] = None,
+                                forcar: bool = False):
+        """
+        Grava feedbacks e prompts finais (e, opcionalmente, um pacote .zip por
+        estudante) pelo EscritorFeedbacks: renderização em pool, gravação atômica
+        e arquivos inalterados desde a última execução são pulados. 'logins'
+        restringe a gravação a esses estudantes. Arquivos editados à mão depois
+        da última gravação são preservados (com aviso), salvo com 'forcar'. Com o
+        armazém de artefatos ativado explicitamente (artifacts.enabled), os
+        _prompt.txt só são materializados quando 'incluir_prompts' (eval.py
+        export) ou artifacts.write_prompts pedem.
+        """
+        from writers import EscritorFeedbacks
+
         self.logger.info("Salvando arquivos de feedback e prompt finais...")
-        output_dir = Path("output") / "feedbacks"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
+        writer_config = self.config.get('writer', {})
+        escritor = EscritorFeedbacks(
+            Path("output") / "feedbacks",
+            workers=writer_config.get('workers', min(4, os.cpu_count() or 1)),
+            executor=writer_config.get('executor', 'process'),
+            pasta_pacotes=Path("output") / "pacotes" if writer_config.get('bundles', False) else None,
+            forcar=forcar)
+        if incluir_prompts is None:
+            artifacts_config = self.config.get('artifacts', {})
+            incluir_prompts = not artifacts_config.get('enabled', False) or artifacts_config.get('write_prompts', False)
+        resumo = escritor.gravar(self._dados_feedback(incluir_prompts, logins))
+        for nome in escritor.editados:
+            self.logger.warning(f"{nome} foi editado depois da última gravação e não foi sobrescrito "
+                                f"(use 'eval.py export --forcar' para regravar)")
+        self.logger.info(f"Feedbacks de {resumo['estudantes']} estudante(s): {resumo['gravados']} arquivo(s) gravado(s), "
+                         f"{resumo['inalterados']} inalterado(s), {resumo['editados']} editado(s) preservado(s)")
+
+    def _dados_feedback(self, incluir_prompts: bool = True, logins: Optional[List[str]] = None):
+        """Campos de cada feedback final; no modo de baixo consumo, os textos são lidos do armazém aqui, sob demanda."""
         for submissao in self.submissoes:
-            if submissao.status != "concluido":
+            if submissao.status != "concluido" or (logins is not None and submissao.login not in logins):
                 continue
-            
-            if submissao.prompt:
-                arquivo_prompt  = output_dir / f"{submissao.nome}_{submissao.login}_prompt.txt"
-                with open(arquivo_prompt, 'w', encoding='utf-8') as f:
-                    f.write(submissao.prompt)
-
-            num_tentativas_reais = len(submissao.historico_avaliacoes)
-            mensagem_explicativa = ""
-            titulo_nota = ""
-
-            if num_tentativas_reais > 1:
-                # CORRIGIDO: Usa self.selection_criteria e adapta as strings
-                criterio_str = self.selection_criteria.upper()
-                titulo_nota = f"Nota Final ({criterio_str} de {num_tentativas_reais} tentativas): {submissao.nota_final:.2f} pontos"
-                
-                detalhe_feedback = ""
-                if self.selection_criteria == "highest":
-                    detalhe_feedback = "à tentativa com a MAIOR nota"
-                elif self.selection_criteria == "lowest":
-                    detalhe_feedback = "à tentativa com a MENOR nota"
-                elif self.selection_criteria == "average":
-                    detalhe_feedback = "à tentativa com a nota MAIS PRÓXIMA DA MÉDIA"
-                
-                texto_observacao = (
-                    f"Observação: A 'Nota Final' é o resultado do critério '{criterio_str}' aplicado a {num_tentativas_reais} tentativas. "
-                    f"O feedback detalhado e as notas por questão abaixo referem-se especificamente {detalhe_feedback}."
-                )
-                mensagem_explicativa = textwrap.fill(texto_observacao, width=100) + "\n\n"
-            else:
-                titulo_nota = f"Nota Final (de {num_tentativas_reais} tentativa): {submissao.nota_final:.2f} pontos"
-            
-            paragrafos_formatados = [textwrap.fill(p, width=100) for p in submissao.feedback.split('\n')]
-            feedback_formatado = "\n".join(paragrafos_formatados)
-            
-            arquivo_feedback = output_dir / f"{submissao.nome}_{submissao.login}_feedback.txt"
-            with open(arquivo_feedback, 'w', encoding='utf-8') as f:
-                f.write(f"""
-FEEDBACK DA AVALIAÇÃO - {self.config['assessment']['name']}
-═══════════════════════════════════════════════════════════
-Estudante: {submissao.nome} ({submissao.login})
-Data: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-{titulo_nota}
-Total de Chamadas à API: {submissao.tentativas_api}
-
-{mensagem_explicativa}{feedback_formatado}
-
-═══════════════════════════════════════════════════════════
-Este feedback foi gerado automaticamente por IA e pode
-necessitar de revisão pelo professor.
-""")
+            yield {
+                'nome': submissao.nome, 'login': submissao.login,
+                'avaliacao': self.config['assessment']['name'],
+                'data': submissao.data_avaliacao or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'nota_final': submissao.nota_final,
+                'num_tentativas': len(submissao.historico_avaliacoes),
+                'criterio': self.selection_criteria,
+                'tentativas_api': submissao.tentativas_api,
+                'feedback': self._texto(submissao, 'feedback'),
+                'prompt': self._texto(submissao, 'prompt') if incluir_prompts else "",
+            }
    
     def _extrair_nota_final(self, feedback: str) -> float:
-        padroes = [
-            r'NOTA FINAL[:\s]+(\d+(?:\.\d+)?)', r'Total[:\s]+(\d+(?:\.\d+)?)',
-            r'Pontuação[:\s]+(\d+(?:\.\d+)?)'
-        ]
-        for padrao in padroes:
-            match = re.search(padrao, feedback, re.IGNORECASE)
-            if match: return float(match.group(1))
-        return 0.0
+        from rescore import extrair_nota_final
+
+        return extrair_nota_final(feedback, self.avaliacao.padroes_nota_final)
     
     def gerar_relatorio_consolidado(self):
         self.logger.info("Gerando relatório consolidado detalhado...")
         # CORRIGIDO: Usa a chave 'questions'
-        dados, questoes_config = [], {q['id']: q for q in self.config['questions']}
+        questoes_config = {q['id']: q for q in self.config['questions']}
+        if self.baixo_consumo_memoria:
+            return self._gerar_relatorio_em_fluxo(questoes_config)
+        dados = list(self._linhas_relatorio(questoes_config))
+        if not dados: return self.logger.warning("Nenhum dado para gerar relatório.")
+        import pandas as pd
+        df = pd.DataFrame(dados)
+        stats = self._calcular_estatisticas_detalhadas(df, questoes_config)
+        custos = self._resumo_custos_latencia()
+        self._salvar_excel_completo(df, stats, questoes_config, custos)
+        self._exibir_relatorio_console(stats, questoes_config)
+        self._exibir_custos_console(custos)
+
+    def _linhas_relatorio(self, questoes_config: Dict):
         for sub in self.submissoes:
             linha = {'Nome': sub.nome, 'Login': sub.login, 'Status': sub.status, 'Nota_Final_IA': sub.nota_final,
                      'Tentativas_API': sub.tentativas_api, 'Num_Avaliacoes_OK': len(sub.historico_avaliacoes)}
             for q_id in questoes_config:
                 ia_p = sub.notas_questoes.get(q_id, 0.0)
                 moodle_p = sub.notas_moodle_pontos.get(q_id, 0.0)
+                testes = sub.vpl.get('questoes', {}).get(q_id, {})
                 linha.update({f"{q_id}_IA_Pontos": ia_p, f"{q_id}_Moodle_Pontos": moodle_p,
                               f"{q_id}_Moodle_Percent": sub.notas_moodle_percent.get(q_id, 0.0),
-                              f"{q_id}_Diferenca": round(ia_p - moodle_p, 2)})
+                              f"{q_id}_Diferenca": round(ia_p - moodle_p, 2),
+                              f"{q_id}_Testes_Aprovados": testes.get('aprovados') or 0,
+                              f"{q_id}_Testes_Total": testes.get('executados') or 0})
+            linha['Compilacao_VPL'] = (sub.vpl.get('compilacao') or '')[:200]
             #total_moodle = sum(sub.notas_moodle_pontos.values())
             total_moodle = sum(v for k, v in sub.notas_moodle_pontos.items() if k != 'Final')
             linha.update({'Nota_Final_Moodle': total_moodle, 'Diferenca_Total': round(sub.nota_final - total_moodle, 2)})
-            dados.append(linha)
-        if not dados: return self.logger.warning("Nenhum dado para gerar relatório.")
-        df = pd.DataFrame(dados)
-        stats = self._calcular_estatisticas_detalhadas(df, questoes_config)
-        self._salvar_excel_completo(df, stats, questoes_config)
+            yield linha
+
+    def _gerar_relatorio_em_fluxo(self, questoes_config: Dict):
+        """
+        Versão do relatório para o modo de baixo consumo de memória: as linhas são
+        gravadas uma a uma em uma planilha write-only do openpyxl e as estatísticas
+        são acumuladas em uma única passada, sem montar o DataFrame completo.
+        """
+        from openpyxl import Workbook
+        from metrics import EstatisticaPareada
+
+        colunas_finais = ['Nota_Final_IA', 'Nota_Final_Moodle', 'Diferenca_Total']
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Comparação Completa')
+        colunas = None
+        total, processados, soma_diferenca, com_compilacao = EstatisticaPareada(), 0, 0.0, 0
+        questoes = {q_id: {'pares': EstatisticaPareada(), 'pares_corr': EstatisticaPareada(), 'percent': 0.0,
+                           'diferenca': 0.0, 'diferenca_abs': 0.0, 'concordantes': 0,
+                           'testes_aprovados': 0, 'testes_total': 0} for q_id in questoes_config}
+
+        for linha in self._linhas_relatorio(questoes_config):
+            if colunas is None:
+                colunas = [c for c in linha if c not in colunas_finais] + colunas_finais
+                ws.append(colunas)
+            ws.append([linha[c] for c in colunas])
+            total.adicionar(linha['Nota_Final_IA'], linha['Nota_Final_Moodle'])
+            processados += linha['Status'] == 'concluido'
+            soma_diferenca += linha['Diferenca_Total']
+            for q_id, acc in questoes.items():
+                ia_p, moodle_p, dif = linha[f"{q_id}_IA_Pontos"], linha[f"{q_id}_Moodle_Pontos"], linha[f"{q_id}_Diferenca"]
+                acc['pares'].adicionar(ia_p, moodle_p)
+                if ia_p > 0 or moodle_p > 0:
+                    acc['pares_corr'].adicionar(ia_p, moodle_p)
+                acc['percent'] += linha[f"{q_id}_Moodle_Percent"]
+                acc['diferenca'] += dif
+                acc['diferenca_abs'] += abs(dif)
+                acc['concordantes'] += abs(dif) <= 1.0
+                acc['testes_aprovados'] += linha[f"{q_id}_Testes_Aprovados"]
+                acc['testes_total'] += linha[f"{q_id}_Testes_Total"]
+            com_compilacao += bool(linha['Compilacao_VPL'])
+
+        n = total.n
+        if not n: return self.logger.warning("Nenhum dado para gerar relatório.")
+        stats = {'geral': {'total_estudantes': n, 'processados': processados,
+                 'media_ia': total.media_x, 'media_moodle': total.media_y,
+                 'desvio_ia': total.desvio_x, 'desvio_moodle': total.desvio_y,
+                 'correlacao_total': total.correlacao if n > 1 else 0.0,
+                 'diferenca_media': soma_diferenca / n, 'com_mensagem_compilacao': com_compilacao}, 'questoes': {}}
+        for q_id, acc in questoes.items():
+            pares, pares_corr = acc['pares'], acc['pares_corr']
+            stats['questoes'][q_id] = {
+                'peso': questoes_config[q_id]['max_points'], 'media_ia': pares.media_x, 'media_moodle': pares.media_y,
+                'media_percent': acc['percent'] / n, 'desvio_ia': pares.desvio_x, 'desvio_moodle': pares.desvio_y,
+                'correlacao': pares_corr.correlacao if pares_corr.n > 1 else 0.0,
+                'diferenca_media': acc['diferenca'] / n, 'diferenca_abs_media': acc['diferenca_abs'] / n,
+                'concordancia': acc['concordantes'] / n * 100,
+                'taxa_testes_aprovados': (acc['testes_aprovados'] / acc['testes_total'] * 100
+                                          if acc['testes_total'] else 0.0)}
+
+        custos = self._resumo_custos_latencia()
+        ws_stats = wb.create_sheet('Estatísticas')
+        ws_stats.append(['Métrica', 'Valor'])
+        for linha in self._linhas_estatisticas(stats):
+            ws_stats.append(linha)
+        if custos:
+            ws_custos = wb.create_sheet('Custos e Latência')
+            ws_custos.append(list(custos[0]))
+            for c in custos:
+                ws_custos.append(list(c.values()))
+
+        arquivo_excel = Path("output") / f"relatorio_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        temporario = arquivo_excel.with_name(f".{arquivo_excel.stem}.tmp.xlsx")
+        wb.save(temporario)
+        os.replace(temporario, arquivo_excel)
+        self.logger.info(f"Relatório completo salvo em: {arquivo_excel}")
         self._exibir_relatorio_console(stats, questoes_config)
+        self._exibir_custos_console(custos)
+
+    def _resumo_custos_latencia(self) -> List[Dict]:
+        """Agrupa os spans por execução e modelo: chamadas, tokens, custo (USD) e latências."""
+        from metrics import percentil
+
+        precos = self.config['api'].get('pricing', {}) or {}
+        grupos = {}
+        for sub in self.submissoes:
+            for span in sub.spans:
+                grupos.setdefault((span.get('execucao', ''), span.get('modelo', '')), []).append(span)
+
+        linhas = []
+        for (execucao, modelo), spans in sorted(grupos.items()):
+            preco = precos.get(modelo, {})
+            tokens_prompt = sum(sp.get('tokens_prompt', 0) for sp in spans)
+            tokens_cache = sum(sp.get('tokens_cache', 0) for sp in spans)
+            tokens_completion = sum(sp.get('tokens_completion', 0) for sp in spans)
+            custo = ((tokens_prompt - tokens_cache) * preco.get('input', 0.0)
+                     + tokens_cache * preco.get('cached_input', preco.get('input', 0.0))
+                     + tokens_completion * preco.get('output', 0.0)) / 1_000_000
+            latencias = [sp['latencia_s'] for sp in spans if sp.get('latencia_s') is not None]
+            ttfbs = [sp['ttfb_s'] for sp in spans if sp.get('ttfb_s') is not None]
+            linhas.append({
+                'Execucao': execucao, 'Modelo': modelo, 'Chamadas': len(spans),
+                'Sucessos': sum(1 for sp in spans if sp.get('status') == 200 and not sp.get('erro')),
+                'Status_429': sum(1 for sp in spans if sp.get('status') == 429),
+                'Timeouts': sum(1 for sp in spans if sp.get('erro') == 'timeout'),
+                'Tokens_Prompt': tokens_prompt, 'Tokens_Cache': tokens_cache, 'Tokens_Completion': tokens_completion,
+                'Custo_USD': round(custo, 4),
+                'Latencia_p50_s': round(percentil(latencias, 50), 2), 'Latencia_p95_s': round(percentil(latencias, 95), 2),
+                'TTFB_p50_s': round(percentil(ttfbs, 50), 2),
+                'Espera_Fila_Media_s': round(sum(sp.get('espera_fila_s', 0.0) for sp in spans) / len(spans), 2)
+            })
+        return linhas
+
+    def _exibir_custos_console(self, custos: List[Dict]):
+        if not custos:
+            return
+        print("\n💰 CUSTO E LATÊNCIA POR EXECUÇÃO/MODELO:")
+        print("-" * 90)
+        print(f" {'Execução':<16}{'Modelo':<34}{'Cham.':>6}{'OK':>5}{'429':>5}{'Tok.in':>9}{'Tok.out':>9}"
+              f"{'USD':>9}{'p50':>7}{'p95':>7}")
+        for c in custos:
+            print(f" {c['Execucao']:<16}{c['Modelo'][:33]:<34}{c['Chamadas']:>6}{c['Sucessos']:>5}{c['Status_429']:>5}"
+                  f"{c['Tokens_Prompt']:>9}{c['Tokens_Completion']:>9}{c['Custo_USD']:>9.4f}"
+                  f"{c['Latencia_p50_s']:>6.1f}s{c['Latencia_p95_s']:>6.1f}s")
+        for execucao in sorted({c['Execucao'] for c in custos}):
+            total = sum(c['Custo_USD'] for c in custos if c['Execucao'] == execucao)
+            print(f" Total da execução {execucao}: US$ {total:.4f}")
+        print("=" * 90)
+
+    def salvar_traces(self):
+        """Grava os spans desta execução em output/traces_<execucao>.jsonl."""
+        import json
+
+        Path("output").mkdir(exist_ok=True)
+        arquivo = Path("output") / f"traces_{self.execucao_id}.jsonl"
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            for sub in self.submissoes:
+                for span in sub.spans:
+                    if span.get('execucao') == self.execucao_id:
+                        f.write(json.dumps({'login': sub.login, **span}, ensure_ascii=False) + '\n')
+        self.logger.info(f"Spans de rastreamento salvos em: {arquivo}")
 
     def _calcular_estatisticas_detalhadas(self, df: pd.DataFrame, questoes_config: Dict) -> Dict:
         df.fillna(0, inplace=True)
@@ -655,10 +2040,12 @@ necessitar de revisão pelo professor.
                  'media_ia': df['Nota_Final_IA'].mean(), 'media_moodle': df['Nota_Final_Moodle'].mean(),
                  'desvio_ia': df['Nota_Final_IA'].std(), 'desvio_moodle': df['Nota_Final_Moodle'].std(),
                  'correlacao_total': df['Nota_Final_IA'].corr(df['Nota_Final_Moodle']) if len(df) > 1 else 0.0,
-                 'diferenca_media': df['Diferenca_Total'].mean()}, 'questoes': {}}
+                 'diferenca_media': df['Diferenca_Total'].mean(),
+                 'com_mensagem_compilacao': int((df['Compilacao_VPL'] != '').sum())}, 'questoes': {}}
         for q_id, info in questoes_config.items():
             col_ia, col_moodle, col_diff = f"{q_id}_IA_Pontos", f"{q_id}_Moodle_Pontos", f"{q_id}_Diferenca"
             dados_corr = df[(df[col_ia] > 0) | (df[col_moodle] > 0)]
+            testes_aprovados, testes_total = df[f"{q_id}_Testes_Aprovados"].sum(), df[f"{q_id}_Testes_Total"].sum()
             stats['questoes'][q_id] = {
                 # CORRIGIDO: usa 'max_points'
                 'peso': info['max_points'], 'media_ia': df[col_ia].mean(), 'media_moodle': df[col_moodle].mean(),
@@ -666,10 +2053,12 @@ necessitar de revisão pelo professor.
                 'desvio_moodle': df[col_moodle].std(),
                 'correlacao': dados_corr[col_ia].corr(dados_corr[col_moodle]) if len(dados_corr) > 1 else 0.0,
                 'diferenca_media': df[col_diff].mean(), 'diferenca_abs_media': df[col_diff].abs().mean(),
-                'concordancia': len(df[abs(df[col_diff]) <= 1.0]) / len(df) * 100 if len(df) > 0 else 0.0}
+                'concordancia': len(df[abs(df[col_diff]) <= 1.0]) / len(df) * 100 if len(df) > 0 else 0.0,
+                'taxa_testes_aprovados': float(testes_aprovados / testes_total * 100) if testes_total else 0.0}
         return stats
 
-    def _salvar_excel_completo(self, df: pd.DataFrame, stats: Dict, questoes_config: Dict):
+    def _salvar_excel_completo(self, df: pd.DataFrame, stats: Dict, questoes_config: Dict,
+                               custos: Optional[List[Dict]] = None):
         output_dir, timestamp = Path("output"), datetime.now().strftime("%Y%m%d_%H%M%S")
         arquivo_excel = output_dir / f"relatorio_completo_{timestamp}.xlsx"
 
@@ -678,19 +2067,28 @@ necessitar de revisão pelo professor.
         nova_ordem = outras_colunas + colunas_finais
         df_reordenado = df[nova_ordem]
 
-        with pd.ExcelWriter(arquivo_excel, engine='openpyxl') as writer:
+        import pandas as pd
+
+        temporario = arquivo_excel.with_name(f".{arquivo_excel.stem}.tmp.xlsx")
+        with pd.ExcelWriter(temporario, engine='openpyxl') as writer:
             df_reordenado.to_excel(writer, sheet_name='Comparação Completa', index=False)
             
-            stats_rows = [['--- GERAL ---', '']]
-            stats_rows.extend([[k.replace('_', ' ').title(), f"{v:.2f}" if isinstance(v, float) else str(v)] for k, v in stats.get('geral', {}).items()])
-            stats_rows.extend([['', ''], ['--- POR QUESTAO ---', '']])
-            for q_id, q_stats in stats.get('questoes', {}).items():
-                stats_rows.append([f'--- {q_id} (peso: {q_stats.get("peso", "N/A")}) ---', ''])
-                stats_rows.extend([[f'  {k.replace("_", " ").title()}', f"{v:.2f}" if isinstance(v, float) else str(v)] for k,v in q_stats.items() if k != 'peso'])
-            pd.DataFrame(stats_rows, columns=['Métrica', 'Valor']).to_excel(writer, sheet_name='Estatísticas', index=False)
+            pd.DataFrame(self._linhas_estatisticas(stats), columns=['Métrica', 'Valor']).to_excel(writer, sheet_name='Estatísticas', index=False)
+            if custos:
+                pd.DataFrame(custos).to_excel(writer, sheet_name='Custos e Latência', index=False)
+        os.replace(temporario, arquivo_excel)
 
         self.logger.info(f"Relatório completo salvo em: {arquivo_excel}")
 
+    def _linhas_estatisticas(self, stats: Dict) -> List[List[str]]:
+        stats_rows = [['--- GERAL ---', '']]
+        stats_rows.extend([[k.replace('_', ' ').title(), f"{v:.2f}" if isinstance(v, float) else str(v)] for k, v in stats.get('geral', {}).items()])
+        stats_rows.extend([['', ''], ['--- POR QUESTAO ---', '']])
+        for q_id, q_stats in stats.get('questoes', {}).items():
+            stats_rows.append([f'--- {q_id} (peso: {q_stats.get("peso", "N/A")}) ---', ''])
+            stats_rows.extend([[f'  {k.replace("_", " ").title()}', f"{v:.2f}" if isinstance(v, float) else str(v)] for k,v in q_stats.items() if k != 'peso'])
+        return stats_rows
+
     def _exibir_relatorio_console(self, stats: Dict, questoes_config: Dict):
         """
         Exibe relatório comparativo detalhado com estatísticas avançadas
@@ -733,6 +2131,8 @@ necessitar de revisão pelo professor.
                 print(f"   ├─ Média IA: {q_stats['media_ia']:.2f} pts (DP: {q_stats['desvio_ia']:.2f})")
                 print(f"   ├─ Média Moodle: {q_stats['media_moodle']:.2f} pts ({q_stats['media_percent']:.1f}% de acerto)")
                 print(f"   └─ Diferença Média: {q_stats['media_ia'] - q_stats['media_moodle']:.2f} pts")
+                if q_stats.get('taxa_testes_aprovados'):
+                    print(f"      Testes do VPL aprovados: {q_stats['taxa_testes_aprovados']:.1f}%")
                 
                 # Testes estatísticos para questão específica
                 if 'notas_ia_questao' in q_stats and 'notas_moodle_questao' in q_stats:
@@ -750,6 +2150,8 @@ necessitar de revisão pelo professor.
 
     def _exibir_testes_estatisticos_gerais(self, geral: Dict):
         """Exibe testes estatísticos para as notas gerais"""
+        import numpy as np
+        from scipy.stats import ttest_rel, wilcoxon, shapiro
         notas_ia = np.array(geral['notas_ia'])
         notas_moodle = np.array(geral['notas_moodle'])
         diferencas = notas_ia - notas_moodle
@@ -778,6 +2180,8 @@ necessitar de revisão pelo professor.
 
     def _exibir_estatisticas_adicionais_gerais(self, geral: Dict):
         """Exibe estatísticas adicionais para análise geral"""
+        import numpy as np
+        from scipy import stats
         notas_ia = np.array(geral['notas_ia'])
         notas_moodle = np.array(geral['notas_moodle'])
         diferencas = notas_ia - notas_moodle
@@ -809,6 +2213,9 @@ necessitar de revisão pelo professor.
 
     def _exibir_testes_questao(self, q_stats: Dict):
         """Exibe testes estatísticos para uma questão específica"""
+        import numpy as np
+        from scipy import stats
+        from scipy.stats import wilcoxon
         notas_ia = np.array(q_stats['notas_ia_questao'])
         notas_moodle = np.array(q_stats['notas_moodle_questao'])
         
@@ -851,16 +2258,90 @@ necessitar de revisão pelo professor.
         print("Wilcoxon: compara medianas (dados não-normais ou ordinais)")
         print("─" * 90)
         
-async def main():
+SUBCOMANDOS = ('discover', 'grade', 'feedback', 'rescore', 'export', 'report', 'status', 'calibrate', 'serve')
+
+
+def _criar_parser():
     import argparse
     
-    parser = argparse.ArgumentParser(description='Sistema de Avaliação Automatizada com Múltiplas Tentativas')
-    parser.add_argument('pasta_submissoes', help='Pasta contendo as submissões')
-    parser.add_argument('--config', default='config/config.yaml', help='Caminho para o arquivo de configuração YAML.')
-    parser.add_argument('--continuar', action='store_true', help='Continuar processamento anterior a partir de um estado salvo.')
+    parser = argparse.ArgumentParser(
+        description='Sistema de Avaliação Automatizada com Múltiplas Tentativas',
+        epilog="Compatibilidade: 'eval.py <pasta> [opções]' equivale a 'eval.py grade <pasta> [opções]'.")
+    subparsers = parser.add_subparsers(dest='comando', metavar='{' + ','.join(SUBCOMANDOS) + '}')
+    
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument('--config', default='config/config.yaml', help='Caminho para o arquivo de configuração YAML.')
+    
+    p_discover = subparsers.add_parser('discover', parents=[comum], help='Lista as submissões encontradas, sem chamar a API.')
+    p_discover.add_argument('pasta_submissoes', help='Pasta contendo as submissões ou o .zip exportado pelo Moodle')
+    
+    p_grade = subparsers.add_parser('grade', parents=[comum], help='Executa a avaliação pela LLM (padrão).')
+    p_grade.add_argument('pasta_submissoes', nargs='?', help='Pasta com as submissões ou .zip exportado pelo Moodle (dispensável no modo worker e com --retry-failed)')
+    p_grade.add_argument('--continuar', action='store_true', help='Continuar processamento anterior a partir de um estado salvo.')
+    p_grade.add_argument('--modo', choices=['local', 'coordenador', 'worker'], default='local',
+                         help="'local' (padrão) avalia neste processo; 'coordenador' enfileira e consolida; "
+                              "'worker' consome a fila compartilhada (seção 'distributed' do config).")
+    p_grade.add_argument('--worker-id', help='Identificador deste worker (padrão: host-pid).')
+    p_grade.add_argument('--aguardar', action='store_true', help='Worker continua aguardando novos itens quando a fila esvazia.')
+    p_grade.add_argument('--painel', action='store_true', help='Exibe o painel de telemetria ao vivo (seção metrics.dashboard).')
+    p_grade.add_argument('--metricas-porta', type=int, help='Porta local do endpoint Prometheus (seção metrics.http_port).')
+    p_grade.add_argument('--prazo', type=float, metavar='MINUTOS',
+                         help='Prazo para terminar; o número de tentativas é ajustado ao tempo (scheduling.deadline_minutes).')
+    p_grade.add_argument('--prioridades', metavar='ARQUIVO',
+                         help='YAML com prioridades explícitas por login (scheduling.priorities_file).')
+    p_grade.add_argument('--amostragem', choices=['rounds', 'n', 'back_to_back'],
+                         help='Como as llm_attempts são pedidas (assessment.sampling).')
+    p_grade.add_argument('--retry-failed', action='store_true',
+                         help='Reprocessa apenas as tentativas da fila de falhas (output/retry_queue.json) do estado salvo.')
+    p_grade.add_argument('--modelo', help='Modelo usado no lugar de api.models (útil com --retry-failed).')
+    p_grade.add_argument('--timeout', type=float, metavar='SEGUNDOS', help='Timeout das chamadas à API (api.timeout).')
+    p_grade.add_argument('--sem-preflight', action='store_true',
+                         help='Não sonda os modelos antes da execução (seção preflight).')
+    p_grade.add_argument('--profile', action='store_true',
+                         help='Perfila a execução: pilhas amostradas (flamegraph), atraso e bloqueios do laço de '
+                              'eventos em output/perfil_<execucao>.* (seção profiling).')
+    
+    p_feedback = subparsers.add_parser('feedback', parents=[comum],
+                                       help='Gera o feedback detalhado das tentativas selecionadas (assessment.feedback_mode '
+                                            '"on_demand"/"after_grading") e regrava os arquivos de feedback.')
+    p_feedback.add_argument('--login', action='append', help='Apenas este estudante (pode ser repetido).')
+    p_feedback.add_argument('--refazer', action='store_true', help='Gera de novo mesmo onde o feedback detalhado já existe.')
+    p_rescore = subparsers.add_parser('rescore', parents=[comum],
+                                      help='Reextrai as notas das respostas guardadas no estado salvo, sem chamar a API, '
+                                           'e regrava feedbacks e relatório.')
+    p_rescore.add_argument('--criterio', choices=['highest', 'average', 'lowest'],
+                           help='Critério de seleção usado na reconsolidação (assessment.selection_criteria).')
+    p_rescore.add_argument('--workers', type=int, help='Processos da reextração (padrão: número de CPUs, até 8).')
+    p_export = subparsers.add_parser('export', parents=[comum],
+                                     help='Materializa os arquivos de feedback e prompt (anexos do send_email.py) a partir '
+                                          'do estado salvo e do armazém de artefatos.')
+    p_export.add_argument('--sem-prompts', action='store_true', help='Grava apenas os arquivos de feedback.')
+    p_export.add_argument('--forcar', action='store_true',
+                          help='Regrava também os arquivos editados à mão depois da última gravação.')
+    subparsers.add_parser('report', parents=[comum], help='Gera o relatório estatístico a partir do estado salvo.')
+    subparsers.add_parser('status', parents=[comum], help='Mostra o progresso registrado no estado salvo.')
     
-    args = parser.parse_args()
+    p_calibrate = subparsers.add_parser('calibrate', parents=[comum],
+                                        help='Ajusta as notas da LLM às do Moodle a partir do estado salvo (seção calibration).')
+    p_calibrate.add_argument('--metodo', choices=['isotonic', 'linear'], help='Tipo de ajuste (calibration.method).')
+    p_calibrate.add_argument('--alvo', type=float, help='Concordância alvo em %% (calibration.target_agreement).')
+    p_calibrate.add_argument('--tolerancia', type=float, help='Diferença máxima em pontos por questão (calibration.tolerance).')
     
+    p_serve = subparsers.add_parser('serve', parents=[comum],
+                                    help='Servidor HTTP local que avalia submissões sob demanda (seção server).')
+    p_serve.add_argument('--host', help='Endereço de escuta (server.host).')
+    p_serve.add_argument('--porta', type=int, help='Porta de escuta (server.port).')
+    return parser
+
+
+def _normalizar_argv(argv: List[str]) -> List[str]:
+    """Mantém a forma antiga 'eval.py <pasta> [opções]' como atalho para 'grade'."""
+    if argv and argv[0] not in SUBCOMANDOS and argv[0] not in ('-h', '--help'):
+        return ['grade'] + argv
+    return argv
+
+
+def _carregar_env():
     try:
         from dotenv import load_dotenv
         if load_dotenv('config/config.env'):
@@ -870,18 +2351,239 @@ async def main():
     except ImportError:
         print("Pacote python-dotenv não instalado. Certifique-se de que a API_KEY está definida como variável de ambiente.")
 
+
+async def executar_avaliacao(args):
+    _carregar_env()
+
     gerenciador = GerenciadorAvaliacao(args.config)
+    metrics_config = gerenciador.config.setdefault('metrics', {})
+    if args.painel:
+        metrics_config['dashboard'] = True
+    if args.metricas_porta is not None:
+        metrics_config['http_port'] = args.metricas_porta
+    scheduling_config = gerenciador.config.setdefault('scheduling', {})
+    if args.prazo is not None:
+        scheduling_config['deadline_minutes'] = args.prazo
+    if args.prioridades:
+        scheduling_config['priorities_file'] = args.prioridades
+    if args.amostragem:
+        gerenciador.amostragem = args.amostragem
+    if args.timeout is not None:
+        gerenciador.config['api']['timeout'] = args.timeout
+    if args.modelo and not args.retry_failed:
+        gerenciador.config['api']['models'] = [args.modelo]
+    if args.sem_preflight:
+        gerenciador.config.setdefault('preflight', {})['enabled'] = False
+    gerenciador.configurar_logging()
+
+    if not args.profile:
+        return await _executar_grade(gerenciador, args)
+    from profiling import Perfilador
+
+    perfilador = Perfilador.de_config(gerenciador.config.get('profiling', {}))
+    perfilador.iniciar()
+    try:
+        await _executar_grade(gerenciador, args)
+    finally:
+        await perfilador.parar()
+        perfilador.exibir_resumo(perfilador.salvar(Path("output"), gerenciador.execucao_id))
+
+
+async def _executar_grade(gerenciador: GerenciadorAvaliacao, args):
+    if args.retry_failed:
+        if not gerenciador.carregar_estado():
+            print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+            sys.exit(1)
+        await gerenciador.verificar_modelos([args.modelo] if args.modelo else None)
+        await gerenciador.reprocessar_falhas(args.modelo)
+        gerenciador.gerar_relatorio_consolidado()
+        return
+    
+    if args.modo == 'worker':
+        await gerenciador.verificar_modelos()
+        await gerenciador.executar_worker(args.worker_id, args.aguardar)
+        return
     
     if args.continuar and gerenciador.carregar_estado():
         print("Continuando processamento a partir do estado salvo.")
+        if args.pasta_submissoes and args.pasta_submissoes.lower().endswith('.zip'):
+            # Zip mais recente (ex.: envios atrasados): incorpora apenas o que mudou
+            gerenciador.descobrir_submissoes(args.pasta_submissoes)
     else:
         gerenciador.descobrir_submissoes(args.pasta_submissoes)
         
-    await gerenciador.processar_submissoes()
+    if args.modo == 'coordenador':
+        await gerenciador.executar_coordenador()
+    else:
+        await gerenciador.verificar_modelos()
+        await gerenciador.processar_submissoes()
+    gerenciador.gerar_relatorio_consolidado()
+
+
+def comando_discover(args):
+    gerenciador = GerenciadorAvaliacao(args.config, gravar_cache=False)
+    gerenciador.configurar_logging(arquivo=False)
+    submissoes = gerenciador.descobrir_submissoes(args.pasta_submissoes)
+    print("\n" + "="*80)
+    for s in submissoes:
+        questoes = ', '.join(f"{q}={p.name}" for q, p in s.arquivos.items())
+        moodle = sum(v for k, v in s.notas_moodle_pontos.items() if k != 'Final')
+        print(f" {s.nome} ({s.login}) | {questoes} | Moodle: {moodle:.2f}")
+    print("="*80)
+    print(f"Total: {len(submissoes)} submissões")
+
+
+def comando_feedback(args):
+    gerenciador = GerenciadorAvaliacao(args.config)
+    if gerenciador.modo_feedback == 'inline':
+        # Chamado também por 'run.sh email': sem segunda fase, não toca no estado nem nos arquivos
+        print("feedback_mode 'inline': as tentativas já trazem o feedback completo.")
+        return
+    _carregar_env()
+    gerenciador.configurar_logging()
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    alterados = asyncio.run(gerenciador.gerar_feedbacks_detalhados(args.login, args.refazer))
+    if alterados:
+        gerenciador.salvar_estado()
+        gerenciador.salvar_feedbacks_finais(logins=alterados)
+
+
+def comando_rescore(args):
+    gerenciador = GerenciadorAvaliacao(args.config)
+    gerenciador.configurar_logging()
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    if args.criterio:
+        gerenciador.selection_criteria = args.criterio
+    gerenciador.reavaliar(args.workers or min(8, os.cpu_count() or 1))
+    gerenciador.salvar_estado()
+    gerenciador.salvar_feedbacks_finais()
     gerenciador.gerar_relatorio_consolidado()
+
+
+def comando_export(args):
+    gerenciador = GerenciadorAvaliacao(args.config)
+    gerenciador.configurar_logging(arquivo=False)
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    gerenciador.salvar_feedbacks_finais(incluir_prompts=not args.sem_prompts, forcar=args.forcar)
+    if gerenciador.artefatos:
+        arquivos, tamanho = gerenciador.armazem.tamanho_em_disco()
+        print(f"Armazém de artefatos: {arquivos} arquivo(s), {tamanho / 1024:.0f} KiB em {gerenciador.armazem.diretorio} "
+              f"({gerenciador.armazem.compressao})")
+
+
+def comando_report(args):
+    gerenciador = GerenciadorAvaliacao(args.config)
+    gerenciador.configurar_logging(arquivo=False)
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    gerenciador.gerar_relatorio_consolidado()
+
+
+def comando_status(args):
+    gerenciador = GerenciadorAvaliacao(args.config, gravar_cache=False)
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    
+    contagem = {}
+    for s in gerenciador.submissoes:
+        contagem[s.status] = contagem.get(s.status, 0) + 1
+    print("="*80)
+    print(f"Estado: {gerenciador.state_file} ({len(gerenciador.submissoes)} submissões)")
+    for status, total in sorted(contagem.items()):
+        print(f"   {status}: {total}")
+    for tentativa_num in range(1, gerenciador.llm_attempts + 1):
+        ok = sum(1 for s in gerenciador.submissoes
+                 if any(t['tentativa_num'] == tentativa_num for t in s.historico_avaliacoes))
+        print(f"   Tentativa {tentativa_num}: {ok}/{len(gerenciador.submissoes)} avaliações bem-sucedidas")
+    if gerenciador.fila_falhas:
+        print(f"   Fila de falhas: {len(gerenciador.fila_falhas)} tentativa(s) {gerenciador.fila_falhas.resumo()} "
+              f"(grade --retry-failed)")
+    print("="*80)
+
+
+def comando_calibrate(args):
+    from calibration import calibrar
+    
+    gerenciador = GerenciadorAvaliacao(args.config)
+    gerenciador.configurar_logging(arquivo=False)
+    if not gerenciador.carregar_estado():
+        print(f"Estado salvo não encontrado em {gerenciador.state_file}")
+        sys.exit(1)
+    
+    calibration_config = gerenciador.config.get('calibration', {})
+    metodo = args.metodo or calibration_config.get('method', 'isotonic')
+    alvo = args.alvo if args.alvo is not None else calibration_config.get('target_agreement', 80)
+    tolerancia = args.tolerancia if args.tolerancia is not None else calibration_config.get('tolerance', 1.0)
+    calibracao = calibrar(gerenciador.submissoes, {q['id']: q['max_points'] for q in gerenciador.config['questions']},
+                          gerenciador.config['api'].get('pricing', {}) or {}, gerenciador.selection_criteria,
+                          metodo, alvo, tolerancia, calibration_config.get('min_samples', 8),
+                          calibration_config.get('holdout', 0.3), calibration_config.get('max_models', 3))
+    arquivo = Path(calibration_config.get('file', 'output/calibracao.json'))
+    calibracao.salvar(arquivo)
+    
+    print("="*90)
+    print(f"CALIBRAÇÃO ({metodo}) - concordância = % das notas por questão a até {tolerancia} pt do Moodle")
+    print("-"*90)
+    print(f" {'Modelos':<52}{'Tent.':>6}{'Est.':>6}{'Conc.':>8}{'Bruta':>8}{'USD/est.':>10}")
+    for c in sorted(calibracao.candidatos, key=lambda c: -c['concordancia'])[:15]:
+        print(f" {', '.join(c['modelos'])[:51]:<52}{c['llm_attempts']:>6}{c['estudantes']:>6}"
+              f"{c['concordancia']:>7.1f}%{c['concordancia_sem_calibracao']:>7.1f}%{c['custo_usd_por_estudante']:>10.5f}")
+    print("-"*90)
+    rec = calibracao.recomendacao
+    if rec:
+        situacao = "atinge o alvo" if rec['atinge_alvo'] else "alvo NÃO atingido; melhor concordância encontrada"
+        print(f" Recomendação: modelos {rec['modelos']}, llm_attempts={rec['llm_attempts']} - "
+              f"{rec['concordancia']:.1f}% ({situacao}: {alvo}%), US$ {rec['custo_usd_por_estudante']:.5f}/estudante")
+    else:
+        print(" Dados rotulados insuficientes para recomendar uma configuração (veja calibration.min_samples).")
+    print(f" Curvas salvas em {arquivo} (aplicadas com calibration.apply: true)")
+    print("="*90)
+
+
+def comando_serve(args):
+    _carregar_env()
+    from server import executar_servidor
+    executar_servidor(args.config, args.host, args.porta)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = _criar_parser()
+    args = parser.parse_args(_normalizar_argv(sys.argv[1:] if argv is None else argv))
+    
+    if args.comando is None:
+        parser.print_help()
+        return
+    if args.comando == 'grade':
+        if args.modo != 'worker' and not args.retry_failed and not args.pasta_submissoes:
+            parser.error("pasta_submissoes é obrigatória nos modos 'local' e 'coordenador'")
+        asyncio.run(executar_avaliacao(args))
+    elif args.comando == 'discover':
+        comando_discover(args)
+    elif args.comando == 'feedback':
+        comando_feedback(args)
+    elif args.comando == 'rescore':
+        comando_rescore(args)
+    elif args.comando == 'export':
+        comando_export(args)
+    elif args.comando == 'report':
+        comando_report(args)
+    elif args.comando == 'status':
+        comando_status(args)
+    elif args.comando == 'calibrate':
+        comando_calibrate(args)
+    elif args.comando == 'serve':
+        comando_serve(args)
     
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except Exception as e:
-        print(f"Ocorreu um erro fatal na execução: {e}")
\ No newline at end of file
+        print(f"Ocorreu um erro fatal na execução: {e}")
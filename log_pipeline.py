@@ -0,0 +1,118 @@
+"""
+Logging da avaliação fora do laço de eventos (seção 'logging').
+
+O logger raiz recebe apenas um QueueHandler: a corrotina que registra uma
+mensagem decide a amostragem, fixa o texto da mensagem e enfileira o
+registro. Formatação das linhas e escrita (console e arquivo de log) ficam
+com um QueueListener numa thread própria, encerrado ao fim do processo.
+
+* format: "text" (padrão) mantém o logs/avaliacao_<timestamp>.log; "json"
+  grava logs/avaliacao_<timestamp>.jsonl, um objeto por linha com ts, nivel,
+  logger, msg e os campos estruturados passados em 'extra' (estudante,
+  rodada, modelo, latencia_s, ...).
+* sample_rate: fração das mensagens por requisição (extra={'amostrar': True})
+  abaixo de WARNING que é mantida, contada por ponto de chamada; avisos e
+  erros passam sempre. Cada registro mantido leva 'amostragem' = 1/taxa.
+"""
+
+import atexit
+import json
+import logging
+import queue
+from collections import Counter
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+CAMPOS_ESTRUTURADOS = ('estudante', 'rodada', 'modelo', 'latencia_s', 'nota', 'nivel_cascata', 'status',
+                       'retry', 'evento', 'amostragem')
+FORMATO_TEXTO = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'nivel': record.levelname, 'logger': record.name, 'msg': record.getMessage()}
+        for campo in CAMPOS_ESTRUTURADOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                dados[campo] = valor
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Mantém 1 de cada round(1/taxa) mensagens marcadas com 'amostrar' em cada ponto de chamada."""
+
+    def __init__(self, taxa: float = 1.0):
+        super().__init__()
+        self.passo = max(1, round(1 / taxa)) if taxa > 0 else 0
+        self.contadores: Counter = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, 'amostrar', False) or self.passo == 1:
+            return True
+        decisao = getattr(record, '_amostra_mantida', None)
+        if decisao is None:
+            # O mesmo registro pode passar por mais de um handler (sem a fila): decide uma vez só
+            chave = (record.pathname, record.lineno)
+            contagem = self.contadores[chave]
+            self.contadores[chave] = contagem + 1
+            decisao = bool(self.passo) and contagem % self.passo == 0
+            record._amostra_mantida = decisao
+            if decisao:
+                record.amostragem = self.passo
+        return decisao
+
+
+class _HandlerFila(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 'msg % args' roda aqui, antes que os argumentos mudem; a linha final
+        # (data, JSON, traceback) é montada na thread do QueueListener
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+_ouvinte: Optional[QueueListener] = None
+
+
+def configurar(handlers: List[logging.Handler], nivel: int, formato_json: bool = False,
+               usar_fila: bool = True, taxa_amostragem: float = 1.0) -> bool:
+    """
+    Instala os handlers no logger raiz (atrás da fila, se 'usar_fila').
+    Como logging.basicConfig, não faz nada se o raiz já tiver handlers.
+    """
+    global _ouvinte
+    raiz = logging.getLogger()
+    if raiz.handlers:
+        return False
+    raiz.setLevel(nivel)
+    filtro = FiltroAmostragem(taxa_amostragem)
+    formato_texto = logging.Formatter(FORMATO_TEXTO)
+    for handler in handlers:
+        arquivo = isinstance(handler, logging.FileHandler)
+        handler.setFormatter(FormatadorJSON() if formato_json and arquivo else formato_texto)
+    if not usar_fila:
+        for handler in handlers:
+            handler.addFilter(filtro)
+            raiz.addHandler(handler)
+        return True
+    fila: queue.SimpleQueue = queue.SimpleQueue()
+    handler_fila = _HandlerFila(fila)
+    handler_fila.addFilter(filtro)
+    raiz.addHandler(handler_fila)
+    _ouvinte = QueueListener(fila, *handlers, respect_handler_level=True)
+    _ouvinte.start()
+    atexit.register(encerrar)
+    return True
+
+
+def encerrar():
+    """Esvazia a fila e para a thread de escrita (chamado também no atexit)."""
+    global _ouvinte
+    ouvinte, _ouvinte = _ouvinte, None
+    if ouvinte is not None:
+        ouvinte.stop()
+        for handler in ouvinte.handlers:
+            handler.flush()
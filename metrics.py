@@ -0,0 +1,283 @@
+"""
+Telemetria ao vivo das rodadas de avaliação.
+
+O ColetorMetricas acumula contadores e latências das chamadas à API e
+produz snapshots que podem ser expostos em um endpoint HTTP local no
+formato Prometheus, gravados em JSONL e exibidos em um painel compacto
+no terminal. Apenas a biblioteca padrão é utilizada.
+"""
+
+import asyncio
+import json
+import math
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Optional
+
+JANELA_TAXA_S = 60  # Janela deslizante para requisições/s e tokens/s
+
+
+def percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, math.ceil(p / 100.0 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+class EstatisticaPareada:
+    """
+    Médias, desvios-padrão (amostrais) e correlação de Pearson de pares (x, y)
+    em uma única passada (algoritmo de Welford), sem guardar os valores.
+    Usada pelo relatório em fluxo do modo de baixo consumo de memória.
+    """
+    __slots__ = ('n', 'media_x', 'media_y', '_m2x', '_m2y', '_cxy')
+
+    def __init__(self):
+        self.n = 0
+        self.media_x = self.media_y = 0.0
+        self._m2x = self._m2y = self._cxy = 0.0
+
+    def adicionar(self, x: float, y: float):
+        self.n += 1
+        dx = x - self.media_x
+        self.media_x += dx / self.n
+        dy = y - self.media_y
+        self.media_y += dy / self.n
+        self._m2x += dx * (x - self.media_x)
+        self._m2y += dy * (y - self.media_y)
+        self._cxy += dx * (y - self.media_y)
+
+    @property
+    def desvio_x(self) -> float:
+        return math.sqrt(self._m2x / (self.n - 1)) if self.n > 1 else math.nan
+
+    @property
+    def desvio_y(self) -> float:
+        return math.sqrt(self._m2y / (self.n - 1)) if self.n > 1 else math.nan
+
+    @property
+    def correlacao(self) -> float:
+        if self.n < 2 or self._m2x <= 0 or self._m2y <= 0:
+            return math.nan
+        return self._cxy / math.sqrt(self._m2x * self._m2y)
+
+
+class ColetorMetricas:
+    def __init__(self, max_amostras: int = 5000):
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.em_voo = 0
+        self.na_fila = 0
+        self.requisicoes = 0
+        self.sucessos = 0
+        self.erros = 0
+        self.status_429 = 0
+        self.retries = 0
+        self.tokens_prompt = 0
+        self.tokens_completion = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.itens_total = 0
+        self.itens_concluidos = 0
+        self.latencias: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_amostras))
+        self.requisicoes_modelo: Dict[str, int] = defaultdict(int)
+        self._janela = deque()  # (instante, tokens_completion)
+
+    # --- Registro de eventos -------------------------------------------------
+
+    def definir_total(self, total: int):
+        with self._lock:
+            self.itens_total = total
+
+    def entrar_fila(self):
+        with self._lock:
+            self.na_fila += 1
+
+    def sair_fila(self):
+        with self._lock:
+            self.na_fila = max(0, self.na_fila - 1)
+
+    def inicio_requisicao(self):
+        with self._lock:
+            self.em_voo += 1
+
+    def fim_requisicao(self, modelo: str, latencia: float, status: int,
+                       tokens_prompt: int = 0, tokens_completion: int = 0):
+        agora = time.monotonic()
+        with self._lock:
+            self.em_voo = max(0, self.em_voo - 1)
+            self.requisicoes += 1
+            self.requisicoes_modelo[modelo] += 1
+            self.latencias[modelo].append(latencia)
+            if status == 200:
+                self.sucessos += 1
+            else:
+                self.erros += 1
+            if status == 429:
+                self.status_429 += 1
+            self.tokens_prompt += tokens_prompt
+            self.tokens_completion += tokens_completion
+            self._janela.append((agora, tokens_completion))
+
+    def registrar_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def registrar_cache(self, acerto: bool):
+        with self._lock:
+            if acerto:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def concluir_item(self):
+        with self._lock:
+            self.itens_concluidos += 1
+
+    # --- Consulta --------------------------------------------------------------
+
+    def snapshot(self) -> Dict:
+        agora = time.monotonic()
+        with self._lock:
+            while self._janela and agora - self._janela[0][0] > JANELA_TAXA_S:
+                self._janela.popleft()
+            decorrido = agora - self.inicio
+            janela_s = min(JANELA_TAXA_S, max(decorrido, 1e-6))
+            taxa_itens = self.itens_concluidos / decorrido if decorrido > 0 else 0.0
+            restantes = max(0, self.itens_total - self.itens_concluidos)
+            consultas_cache = self.cache_hits + self.cache_misses
+            return {
+                'timestamp': time.time(),
+                'decorrido_s': round(decorrido, 1),
+                'em_voo': self.em_voo,
+                'na_fila': self.na_fila,
+                'requisicoes': self.requisicoes,
+                'sucessos': self.sucessos,
+                'erros': self.erros,
+                'status_429': self.status_429,
+                'retries': self.retries,
+                'requisicoes_por_s': round(len(self._janela) / janela_s, 3),
+                'tokens_por_s': round(sum(t for _, t in self._janela) / janela_s, 1),
+                'tokens_prompt': self.tokens_prompt,
+                'tokens_completion': self.tokens_completion,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_taxa_acerto': round(self.cache_hits / consultas_cache, 3) if consultas_cache else None,
+                'itens_total': self.itens_total,
+                'itens_concluidos': self.itens_concluidos,
+                'eta_s': round(restantes / taxa_itens, 0) if taxa_itens > 0 and restantes else None,
+                'modelos': {
+                    modelo: {
+                        'requisicoes': self.requisicoes_modelo[modelo],
+                        'p50_s': round(percentil(lat, 50), 3),
+                        'p95_s': round(percentil(lat, 95), 3),
+                        'p99_s': round(percentil(lat, 99), 3),
+                    } for modelo, lat in self.latencias.items()
+                },
+            }
+
+    def formato_prometheus(self) -> str:
+        s = self.snapshot()
+        linhas = []
+
+        def metrica(nome, tipo, valor, ajuda):
+            linhas.append(f"# HELP testcode_{nome} {ajuda}\n# TYPE testcode_{nome} {tipo}\n"
+                          f"testcode_{nome} {valor}\n")
+
+        metrica('requests_in_flight', 'gauge', s['em_voo'], 'Requisicoes HTTP em andamento')
+        metrica('queue_depth', 'gauge', s['na_fila'], 'Submissoes aguardando um slot de concorrencia')
+        metrica('requests_total', 'counter', s['requisicoes'], 'Requisicoes HTTP concluidas')
+        metrica('request_errors_total', 'counter', s['erros'], 'Requisicoes com status diferente de 200')
+        metrica('rate_limited_total', 'counter', s['status_429'], 'Respostas 429 recebidas')
+        metrica('retries_total', 'counter', s['retries'], 'Novas tentativas de chamada a API')
+        metrica('requests_per_second', 'gauge', s['requisicoes_por_s'], f'Requisicoes/s (janela de {JANELA_TAXA_S}s)')
+        metrica('tokens_per_second', 'gauge', s['tokens_por_s'], f'Tokens de completion/s (janela de {JANELA_TAXA_S}s)')
+        metrica('prompt_tokens_total', 'counter', s['tokens_prompt'], 'Tokens de prompt consumidos')
+        metrica('completion_tokens_total', 'counter', s['tokens_completion'], 'Tokens de completion gerados')
+        metrica('cache_hits_total', 'counter', s['cache_hits'], 'Requisicoes com tokens de prompt em cache')
+        metrica('cache_misses_total', 'counter', s['cache_misses'], 'Requisicoes sem tokens de prompt em cache')
+        metrica('items_total', 'gauge', s['itens_total'], 'Avaliacoes previstas (estudante x tentativa)')
+        metrica('items_done', 'gauge', s['itens_concluidos'], 'Avaliacoes concluidas')
+        metrica('eta_seconds', 'gauge', s['eta_s'] if s['eta_s'] is not None else 'NaN', 'Tempo restante estimado')
+
+        linhas.append("# HELP testcode_request_latency_seconds Latencia das requisicoes por modelo\n"
+                      "# TYPE testcode_request_latency_seconds summary\n")
+        for modelo, m in s['modelos'].items():
+            for q, chave in (('0.5', 'p50_s'), ('0.95', 'p95_s'), ('0.99', 'p99_s')):
+                linhas.append(f'testcode_request_latency_seconds{{model="{modelo}",quantile="{q}"}} {m[chave]}\n')
+            linhas.append(f'testcode_request_latency_seconds_count{{model="{modelo}"}} {m["requisicoes"]}\n')
+        return ''.join(linhas)
+
+    def linhas_painel(self) -> list:
+        s = self.snapshot()
+        eta = f"{int(s['eta_s']) // 60}m{int(s['eta_s']) % 60:02d}s" if s['eta_s'] is not None else "--"
+        cache = f"{s['cache_taxa_acerto'] * 100:.0f}%" if s['cache_taxa_acerto'] is not None else "--"
+        linhas = [
+            f"⏱  {s['decorrido_s']:.0f}s | itens {s['itens_concluidos']}/{s['itens_total']} | ETA {eta} | "
+            f"em voo {s['em_voo']} | fila {s['na_fila']}",
+            f"📈 {s['requisicoes_por_s']:.2f} req/s | {s['tokens_por_s']:.0f} tok/s | 429: {s['status_429']} | "
+            f"retries: {s['retries']} | erros: {s['erros']} | cache: {cache}",
+        ]
+        for modelo, m in sorted(s['modelos'].items()):
+            linhas.append(f"   {modelo[:40]:<40} n={m['requisicoes']:<5} p50={m['p50_s']:.2f}s "
+                          f"p95={m['p95_s']:.2f}s p99={m['p99_s']:.2f}s")
+        return linhas
+
+
+def iniciar_servidor_http(coletor: ColetorMetricas, porta: int, host: str = '127.0.0.1'):
+    """Sobe o endpoint /metrics (Prometheus) e /metrics.json em uma thread daemon."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics.json'):
+                corpo, tipo = json.dumps(coletor.snapshot()).encode(), 'application/json'
+            elif self.path.startswith('/metrics'):
+                corpo, tipo = coletor.formato_prometheus().encode(), 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name='metricas-http').start()
+    return servidor
+
+
+def _anexar_snapshot(arquivo_jsonl: Path, snapshot: Dict):
+    with open(arquivo_jsonl, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(snapshot, ensure_ascii=False) + '\n')
+
+
+async def publicar_periodicamente(coletor: ColetorMetricas, intervalo: float,
+                                  arquivo_jsonl: Optional[Path] = None, painel: bool = False):
+    """Grava snapshots em JSONL (numa thread, fora do laço de eventos) e redesenha o painel até ser cancelada."""
+    linhas_anteriores = 0
+    try:
+        while True:
+            await asyncio.sleep(intervalo)
+            if arquivo_jsonl:
+                await asyncio.to_thread(_anexar_snapshot, arquivo_jsonl, coletor.snapshot())
+            if painel:
+                linhas = coletor.linhas_painel()
+                if linhas_anteriores and sys.stderr.isatty():
+                    sys.stderr.write(f"\033[{linhas_anteriores}F\033[J")
+                sys.stderr.write('\n'.join(linhas) + '\n')
+                sys.stderr.flush()
+                linhas_anteriores = len(linhas)
+    except asyncio.CancelledError:
+        if arquivo_jsonl:
+            # Último snapshot no cancelamento: gravado direto, a tarefa não pode mais aguardar
+            _anexar_snapshot(arquivo_jsonl, coletor.snapshot())
+        raise
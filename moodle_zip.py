@@ -0,0 +1,74 @@
+"""
+Leitura direta do .zip exportado pelo Moodle/VPL, sem descompactar.
+
+Percorre apenas o diretório central do zip (zipfile.infolist), interpreta o
+nome das pastas "Nome Sobrenome RA usuario" da mesma forma que o
+'./run.sh prepare' e localiza, para cada estudante, a submissão mais recente
+e a pasta .ceg correspondente. O conteúdo dos arquivos só é lido sob demanda,
+de modo que vídeos e binários anexados nunca são extraídos.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+PADRAO_ENVIO = re.compile(r'^\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}(\.ceg)?$')
+
+
+@dataclass
+class EntradaZip:
+    nome: str
+    login: str
+    pasta_original: str
+    envios: Dict[str, List[str]] = field(default_factory=dict)   # envio -> membros do zip
+    cegs: Dict[str, List[str]] = field(default_factory=dict)     # envio.ceg -> membros do zip
+
+    def envio_recente(self) -> Optional[str]:
+        # Os nomes das pastas de envio são timestamps (AAAA-MM-DD-hh-mm-ss), ordenáveis como texto
+        return max(self.envios) if self.envios else None
+
+    def ceg_recente(self) -> Optional[str]:
+        return max(self.cegs) if self.cegs else None
+
+
+def converter_nome_pasta(nome_original: str) -> Optional[Tuple[str, str]]:
+    """
+    Converte o nome da pasta do Moodle em (nome, login), com a mesma regra do
+    './run.sh prepare'. Pastas já no formato "Nome - login" são aceitas.
+    """
+    if " - " in nome_original:
+        nome, login = nome_original.rsplit(" - ", 1)
+        return nome, login
+    partes = nome_original.split()
+    if len(partes) < 4:
+        return None
+    usuario, primeiro_nome = partes[-1], partes[-3]
+    restante_nome = " ".join(partes[:-3])
+    return f"{primeiro_nome} {restante_nome}", usuario
+
+
+def indexar_zip(zip_file) -> Tuple[Dict[str, EntradaZip], List[str]]:
+    """
+    Indexa um zipfile.ZipFile aberto. Retorna as entradas por login e a
+    lista de pastas ignoradas por terem nome em formato inválido.
+    """
+    entradas: Dict[str, EntradaZip] = {}
+    ignoradas = set()
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        partes = PurePosixPath(info.filename).parts
+        indice = next((i for i, p in enumerate(partes) if PADRAO_ENVIO.match(p)), None)
+        if indice is None or indice == 0:
+            continue
+        pasta_estudante, pasta_envio = partes[indice - 1], partes[indice]
+        convertido = converter_nome_pasta(pasta_estudante)
+        if not convertido:
+            ignoradas.add(pasta_estudante)
+            continue
+        nome, login = convertido
+        entrada = entradas.setdefault(login, EntradaZip(nome=nome, login=login, pasta_original=pasta_estudante))
+        destino = entrada.cegs if pasta_envio.endswith('.ceg') else entrada.envios
+        destino.setdefault(pasta_envio, []).append(info.filename)
+    return entradas, sorted(ignoradas)
@@ -0,0 +1,134 @@
+"""
+Verificação dos modelos antes de uma execução (pre-flight, seção 'preflight').
+
+Cada modelo configurado (api.models e os níveis da cascata) recebe, em
+paralelo, uma requisição mínima (max_tokens=1). Da resposta saem a latência,
+o status e a cota restante dos cabeçalhos x-ratelimit-*:
+
+* 200: saudável; o peso na escolha do modelo cai com a latência (em relação
+  ao mais rápido) e com a cota restante abaixo das chamadas previstas;
+* 429: sobrecarregado; fica com peso baixo (preflight.overloaded_weight);
+* 400/403/404 (modelo descontinuado ou inexistente), 5xx e timeout: o modelo
+  é descartado desta execução.
+
+Os resultados 200 e 429 ficam em output/.cache/preflight.json por
+preflight.ttl_seconds (chave: URL, impressão da API_KEY e modelo), de modo que
+execuções seguidas não repetem a sondagem. Recusas (401), falhas e timeouts
+não são guardados: a próxima execução sonda o modelo de novo.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ESTADOS_EM_CACHE = ('ok', 'sobrecarregado')
+CABECALHOS_COTA = {
+    'restante_requisicoes': 'x-ratelimit-remaining-requests',
+    'restante_tokens': 'x-ratelimit-remaining-tokens',
+    'limite_requisicoes': 'x-ratelimit-limit-requests',
+    'limite_tokens': 'x-ratelimit-limit-tokens',
+}
+
+
+def _inteiro(valor: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(valor)) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def _estado(status: int, erro: Optional[str]) -> str:
+    if status == 200:
+        return 'ok'
+    if status == 429:
+        return 'sobrecarregado'
+    if status == 401:
+        return 'sem_autorizacao'
+    return 'descartado'
+
+
+async def _sondar_modelo(session, url: str, api_key: str, modelo: str, timeout: float) -> Dict:
+    import aiohttp
+
+    resultado = {'modelo': modelo, 'status': 0, 'latencia_s': None, 'erro': None}
+    payload = {"model": modelo, "messages": [{"role": "user", "content": "ok"}], "max_tokens": 1,
+               "temperature": 0, "stream": False}
+    inicio = time.monotonic()
+    try:
+        async with session.post(url, json=payload, headers={"Authorization": f"Bearer {api_key}"},
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as resposta:
+            resultado['status'] = resposta.status
+            for chave, cabecalho in CABECALHOS_COTA.items():
+                resultado[chave] = _inteiro(resposta.headers.get(cabecalho))
+            corpo = await resposta.text()
+            if resposta.status != 200:
+                resultado['erro'] = corpo[:200]
+    except asyncio.TimeoutError:
+        resultado['erro'] = 'timeout'
+    except Exception as e:
+        resultado['erro'] = f"{type(e).__name__}: {e}"[:200]
+    resultado['latencia_s'] = round(time.monotonic() - inicio, 3)
+    resultado['estado'] = _estado(resultado['status'], resultado['erro'])
+    return resultado
+
+
+async def sondar_modelos(url: str, api_key: str, modelos: List[str], timeout: float = 15) -> List[Dict]:
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        return list(await asyncio.gather(*(_sondar_modelo(session, url, api_key, m, timeout) for m in modelos)))
+
+
+async def obter_sondagem(url: str, api_key: str, modelos: List[str], config: Dict,
+                         arquivo_cache: Path = Path("output/.cache/preflight.json")) -> Tuple[List[Dict], bool]:
+    """
+    Resultados da sondagem de cada modelo, reaproveitando os do cache ainda
+    válidos; o booleano indica se nenhum foi sondado agora.
+    """
+    ttl, agora = config.get('ttl_seconds', 300), time.time()
+    chave = lambda modelo: f"{url}|{hashlib.sha256(api_key.encode()).hexdigest()[:12]}|{modelo}"
+    cache = {}
+    try:
+        cache = json.loads(Path(arquivo_cache).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        pass
+    cache = {k: v for k, v in cache.items() if agora - v['quando'] < ttl}
+    faltantes = [m for m in modelos if chave(m) not in cache]
+    sondados = {}
+    if faltantes:
+        for resultado in await sondar_modelos(url, api_key, faltantes, config.get('timeout_seconds', 15)):
+            sondados[resultado['modelo']] = resultado
+            if resultado['estado'] in ESTADOS_EM_CACHE:
+                cache[chave(resultado['modelo'])] = {'quando': time.time(), 'resultado': resultado}
+        try:
+            Path(arquivo_cache).parent.mkdir(parents=True, exist_ok=True)
+            temporario = Path(arquivo_cache).with_name(f".{Path(arquivo_cache).name}.{os.getpid()}.tmp")
+            temporario.write_text(json.dumps(cache, ensure_ascii=False), encoding='utf-8')
+            os.replace(temporario, arquivo_cache)
+        except OSError:
+            pass
+    return [sondados[m] if m in sondados else cache[chave(m)]['resultado'] for m in modelos], not faltantes
+
+
+def pesos_modelos(resultados: List[Dict], chamadas_previstas: int, peso_sobrecarregado: float = 0.1) -> Dict[str, float]:
+    """
+    Peso de cada modelo utilizável na escolha aleatória (os descartados ficam de
+    fora). Modelos saudáveis: latência do mais rápido / latência do modelo, vezes
+    a fração das chamadas previstas para ele que a cota restante cobre.
+    """
+    saudaveis = [r for r in resultados if r['estado'] == 'ok']
+    pesos = {r['modelo']: peso_sobrecarregado for r in resultados if r['estado'] == 'sobrecarregado'}
+    if not saudaveis:
+        return pesos
+    mais_rapido = min(r['latencia_s'] for r in saudaveis) or 1e-3
+    por_modelo = chamadas_previstas / len(saudaveis) if chamadas_previstas else 0
+    for r in saudaveis:
+        peso = max(0.2, mais_rapido / max(r['latencia_s'], 1e-3))
+        if por_modelo and r.get('restante_requisicoes') is not None:
+            peso *= min(1.0, max(0.05, r['restante_requisicoes'] / por_modelo))
+        pesos[r['modelo']] = round(peso, 3)
+    return pesos
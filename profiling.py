@@ -0,0 +1,200 @@
+"""
+Perfilamento de uma execução de avaliação (eval.py grade --profile).
+
+Três medições rodam juntas, sem dependências externas:
+
+* amostragem de pilhas: uma thread lê sys._current_frames() a cada
+  profiling.sample_interval_ms e acumula as pilhas de todas as threads no
+  formato "folded" (thread;func (arquivo:linha);... contagem), aceito por
+  flamegraph.pl, speedscope e inferno;
+* atraso do laço de eventos: uma corrotina dorme profiling.lag_interval_ms e
+  mede quanto acordou depois do previsto (p50/p95/p99/máximo);
+* vigia de bloqueios: se o laço fica mais de profiling.block_threshold_ms sem
+  acordar, a thread de amostragem registra o trecho com as pilhas do laço
+  durante o bloqueio e a função de origem (primeiro quadro do projeto).
+
+Os resultados vão para output/perfil_<execucao>.folded e .json.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from metrics import percentil
+
+logger = logging.getLogger(__name__)
+RAIZ_PROJETO = str(Path(__file__).resolve().parent)
+
+
+def _quadro(frame) -> str:
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})".replace(';', ':')
+
+
+def _pilha(frame, profundidade: int) -> Tuple[str, ...]:
+    """Pilha da raiz até o quadro atual (limitada às 'profundidade' chamadas mais internas)."""
+    quadros = []
+    while frame is not None and len(quadros) < profundidade:
+        quadros.append(_quadro(frame))
+        frame = frame.f_back
+    return tuple(reversed(quadros))
+
+
+def _origem(frame) -> str:
+    """Quadro mais interno que pertence ao projeto (fora da biblioteca padrão e de site-packages)."""
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if arquivo.startswith(RAIZ_PROJETO) and 'site-packages' not in arquivo:
+            return f"{_quadro(frame)} linha {frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+class Perfilador:
+    def __init__(self, intervalo_amostragem: float = 0.005, intervalo_lag: float = 0.05,
+                 limiar_bloqueio: float = 0.1, profundidade: int = 64):
+        self.intervalo_amostragem = intervalo_amostragem
+        self.intervalo_lag = intervalo_lag
+        self.limiar_bloqueio = limiar_bloqueio
+        self.profundidade = profundidade
+        self.amostras: Counter = Counter()
+        self.amostras_laco: Counter = Counter()
+        self.lags: List[float] = []
+        self.bloqueios: List[Dict] = []
+        self._ativo = False
+        self._bloqueio: Optional[Dict] = None
+
+    @classmethod
+    def de_config(cls, config: Dict) -> "Perfilador":
+        return cls(config.get('sample_interval_ms', 5) / 1000, config.get('lag_interval_ms', 50) / 1000,
+                   config.get('block_threshold_ms', 100) / 1000, config.get('max_depth', 64))
+
+    def iniciar(self):
+        """Deve ser chamado de dentro do laço de eventos que será observado."""
+        self.loop = asyncio.get_running_loop()
+        self.thread_laco = threading.get_ident()
+        self.inicio = time.monotonic()
+        self._batimento = self.inicio
+        self._ativo = True
+        self._tarefa_lag = self.loop.create_task(self._medir_lag())
+        self._thread = threading.Thread(target=self._amostrar, name='perfilador', daemon=True)
+        self._thread.start()
+
+    async def parar(self):
+        self._ativo = False
+        self.duracao = time.monotonic() - self.inicio
+        self._tarefa_lag.cancel()
+        try:
+            await self._tarefa_lag
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._thread.join)
+        self._fechar_bloqueio()
+
+    async def _medir_lag(self):
+        while self._ativo:
+            previsto = time.monotonic() + self.intervalo_lag
+            await asyncio.sleep(self.intervalo_lag)
+            agora = time.monotonic()
+            self._batimento = agora
+            self.lags.append(max(0.0, agora - previsto))
+
+    def _amostrar(self):
+        propria = threading.get_ident()
+        nomes, contador = {}, 0
+        while self._ativo:
+            if contador % 200 == 0:
+                nomes = {t.ident: t.name for t in threading.enumerate()}
+            contador += 1
+            frame_laco = None
+            for ident, frame in sys._current_frames().items():
+                if ident == propria:
+                    continue
+                pilha = _pilha(frame, self.profundidade)
+                self.amostras[(nomes.get(ident, f"thread-{ident}"),) + pilha] += 1
+                if ident == self.thread_laco:
+                    frame_laco = frame
+                    self.amostras_laco[pilha[-1] if pilha else '?'] += 1
+            self._vigiar(frame_laco)
+            time.sleep(self.intervalo_amostragem)
+
+    def _vigiar(self, frame_laco):
+        batimento = self._batimento
+        parado = time.monotonic() - batimento - self.intervalo_lag
+        if parado > self.limiar_bloqueio and frame_laco is not None:
+            if self._bloqueio is None or self._bloqueio['batimento'] != batimento:
+                self._fechar_bloqueio()
+                self._bloqueio = {'batimento': batimento, 'pilhas': Counter(), 'origens': Counter()}
+            self._bloqueio['pilhas'][_pilha(frame_laco, self.profundidade)] += 1
+            self._bloqueio['origens'][_origem(frame_laco)] += 1
+        elif self._bloqueio is not None and batimento != self._bloqueio['batimento']:
+            self._fechar_bloqueio(batimento)
+
+    def _fechar_bloqueio(self, batimento_seguinte: Optional[float] = None):
+        bloqueio, self._bloqueio = self._bloqueio, None
+        if bloqueio is None:
+            return
+        fim = batimento_seguinte if batimento_seguinte is not None else time.monotonic()
+        duracao = fim - bloqueio['batimento'] - self.intervalo_lag
+        pilha, _ = bloqueio['pilhas'].most_common(1)[0]
+        origem, _ = bloqueio['origens'].most_common(1)[0]
+        self.bloqueios.append({'inicio_s': round(bloqueio['batimento'] - self.inicio, 3),
+                               'duracao_ms': round(duracao * 1000, 1), 'origem': origem, 'pilha': list(pilha)})
+        logger.warning(f"[Perfil] Laço de eventos bloqueado por {duracao * 1000:.0f} ms em {origem}")
+
+    def resumo(self) -> Dict:
+        lags_ms = [l * 1000 for l in self.lags]
+        total_laco = sum(self.amostras_laco.values()) or 1
+        return {
+            'duracao_s': round(getattr(self, 'duracao', time.monotonic() - self.inicio), 2),
+            'amostras': sum(self.amostras.values()),
+            'intervalo_amostragem_ms': self.intervalo_amostragem * 1000,
+            'limiar_bloqueio_ms': self.limiar_bloqueio * 1000,
+            'lag_ms': {'medicoes': len(lags_ms), 'p50': round(percentil(lags_ms, 50), 2),
+                       'p95': round(percentil(lags_ms, 95), 2), 'p99': round(percentil(lags_ms, 99), 2),
+                       'max': round(max(lags_ms, default=0.0), 2)},
+            'bloqueios': {'total': len(self.bloqueios),
+                          'tempo_total_ms': round(sum(b['duracao_ms'] for b in self.bloqueios), 1),
+                          'por_origem': dict(Counter(b['origem'] for b in self.bloqueios).most_common(20)),
+                          'maiores': sorted(self.bloqueios, key=lambda b: -b['duracao_ms'])[:50]},
+            'laco_funcoes_mais_amostradas': [{'funcao': f, 'percentual': round(n / total_laco * 100, 1)}
+                                             for f, n in self.amostras_laco.most_common(20)],
+        }
+
+    def salvar(self, diretorio: Path, execucao_id: str) -> Tuple[Path, Path]:
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        folded = diretorio / f"perfil_{execucao_id}.folded"
+        with open(folded, 'w', encoding='utf-8') as f:
+            for pilha, contagem in self.amostras.most_common():
+                f.write(f"{';'.join(pilha)} {contagem}\n")
+        relatorio = diretorio / f"perfil_{execucao_id}.json"
+        with open(relatorio, 'w', encoding='utf-8') as f:
+            json.dump(self.resumo(), f, ensure_ascii=False, indent=2)
+        return folded, relatorio
+
+    def exibir_resumo(self, arquivos: Tuple[Path, Path]):
+        resumo = self.resumo()
+        lag, bloqueios = resumo['lag_ms'], resumo['bloqueios']
+        print("\n" + "=" * 80)
+        print(f"PERFIL DA EXECUÇÃO ({resumo['duracao_s']:.1f}s, {resumo['amostras']} amostras)")
+        print("=" * 80)
+        print(f" Atraso do laço de eventos: p50 {lag['p50']:.1f} ms | p95 {lag['p95']:.1f} ms | "
+              f"p99 {lag['p99']:.1f} ms | máx {lag['max']:.1f} ms")
+        print(f" Bloqueios > {resumo['limiar_bloqueio_ms']:.0f} ms: {bloqueios['total']} "
+              f"(total {bloqueios['tempo_total_ms'] / 1000:.2f}s)")
+        for origem, total in list(bloqueios['por_origem'].items())[:5]:
+            print(f"   {total:>4}× {origem}")
+        print(" Funções mais vistas no laço:")
+        for item in resumo['laco_funcoes_mais_amostradas'][:5]:
+            print(f"   {item['percentual']:>5.1f}% {item['funcao']}")
+        print(f" Flamegraph (folded): {arquivos[0]}")
+        print(f" Relatório: {arquivos[1]}")
+        print("=" * 80)
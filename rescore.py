@@ -0,0 +1,86 @@
+"""
+Extração das notas das respostas da LLM e reavaliação sem API (eval.py rescore).
+
+As funções de extração são as mesmas usadas durante a avaliação
+(GerenciadorAvaliacao._extrair_notas_questoes/_extrair_nota_final), de modo
+que uma correção aqui vale tanto para execuções novas quanto para a
+reavaliação das respostas brutas guardadas no estado: 'rescore' reextrai as
+notas de todas as tentativas (num pool de processos, por estudante), aplica
+de novo o critério de seleção e a calibração e regrava feedbacks e relatório,
+sem nenhuma chamada de rede.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (login, [(índice da tentativa, texto ou referência no armazém, é referência), ...])
+ItemReavaliacao = Tuple[str, List[Tuple[int, str, bool]]]
+
+
+def extrair_notas_questoes(resposta: str, padrao_notas_questoes) -> Tuple[Dict[str, float], List[str]]:
+    """Notas por questão ("QUESTAO_<id>: nota/máximo") e avisos das linhas descartadas."""
+    notas, avisos = {}, []
+    for questao_id, nota_str, maximo_str in padrao_notas_questoes.findall(resposta):
+        try:
+            nota, maximo = float(nota_str), float(maximo_str)
+            if 0 <= nota <= maximo:
+                notas[questao_id] = nota
+            else:
+                avisos.append(f"Nota inválida para {questao_id}: {nota}/{maximo}")
+        except ValueError as e:
+            avisos.append(f"Erro ao converter nota {questao_id}: {e}")
+    return notas, avisos
+
+
+def extrair_nota_final(resposta: str, padroes_nota_final: Sequence) -> float:
+    for padrao in padroes_nota_final:
+        match = padrao.search(resposta)
+        if match:
+            return float(match.group(1))
+    return 0.0
+
+
+def extrair_notas(resposta: str, padrao_notas_questoes, padroes_nota_final: Sequence) -> Tuple[Dict[str, float], float, List[str]]:
+    """Notas por questão, nota final (soma das questões ou a linha de nota final) e avisos."""
+    notas, avisos = extrair_notas_questoes(resposta, padrao_notas_questoes)
+    return notas, sum(notas.values()) or extrair_nota_final(resposta, padroes_nota_final), avisos
+
+
+def _reextrair_estudante(item: ItemReavaliacao, padrao_notas_questoes, padroes_nota_final: Sequence,
+                         config: Dict) -> Tuple[str, List[Tuple[int, Dict[str, float], float]], List[str]]:
+    login, tentativas = item
+    armazem = None
+    resultados, avisos = [], []
+    for indice, texto, referencia in tentativas:
+        if referencia:
+            if armazem is None:
+                from artifacts import ArmazemBlobs
+                armazem = ArmazemBlobs.de_config(config)
+            texto = armazem.ler(texto)
+        notas, nota_final, avisos_tentativa = extrair_notas(texto, padrao_notas_questoes, padroes_nota_final)
+        resultados.append((indice, notas, nota_final))
+        avisos.extend(avisos_tentativa)
+    return login, resultados, avisos
+
+
+def _reextrair_lote(args) -> List:
+    itens, padrao_notas_questoes, padroes_nota_final, config = args
+    return [_reextrair_estudante(item, padrao_notas_questoes, padroes_nota_final, config) for item in itens]
+
+
+def reextrair_em_lote(itens: List[ItemReavaliacao], padrao_notas_questoes, padroes_nota_final: Sequence,
+                      config: Optional[Dict] = None, workers: int = 4) -> List:
+    """
+    Reextrai as notas de todos os estudantes. Cada resposta é o texto bruto
+    ou a referência no armazém de artefatos (lida no próprio processo do pool,
+    com o armazém descrito por 'config'). Com poucos estudantes (ou
+    workers <= 1) roda no processo atual.
+    """
+    config = {'processing': (config or {}).get('processing', {}), 'artifacts': (config or {}).get('artifacts', {})}
+    if workers <= 1 or len(itens) < 4 * workers:
+        return _reextrair_lote((itens, padrao_notas_questoes, padroes_nota_final, config))
+    tamanho = max(1, len(itens) // (workers * 4))
+    lotes = [(itens[i:i + tamanho], padrao_notas_questoes, padroes_nota_final, config)
+             for i in range(0, len(itens), tamanho)]
+    with ProcessPoolExecutor(workers) as executor:
+        return [resultado for lote in executor.map(_reextrair_lote, lotes) for resultado in lote]
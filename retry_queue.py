@@ -0,0 +1,88 @@
+"""
+Fila de falhas (dead-letter) das avaliações.
+
+Cada tentativa (estudante × número da tentativa) que esgota as retentativas
+sem uma resposta válida é registrada em output/retry_queue.json com a causa
+(timeout, rate_limit, resposta_malformada, resposta_vazia, http_<status>, ...),
+os erros de cada requisição, o modelo usado e a impressão digital do prompt.
+
+A fila acompanha o estado salvo (processamento_state.pkl): uma execução nova
+começa com a fila vazia, --continuar a retoma, e 'eval.py grade --retry-failed'
+reprocessa apenas as tentativas que estão nela, opcionalmente com outro modelo
+ou timeout. Tentativas que dão certo saem da fila.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Erros de requisição que indicam corpo da resposta inválido (JSON truncado, sem 'choices', ...)
+ERROS_MALFORMADA = {'JSONDecodeError', 'ContentTypeError', 'KeyError', 'TypeError', 'IndexError',
+                    'ClientPayloadError'}
+
+
+def impressao_prompt(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+def causa_falha(spans: Optional[List[Dict]]) -> str:
+    """Causa principal a partir dos spans da chamada (o erro da última requisição)."""
+    erros = [sp.get('erro') for sp in spans or [] if sp.get('erro')]
+    if not erros:
+        return 'resposta_invalida' if spans else 'sem_requisicao'
+    return 'resposta_malformada' if erros[-1] in ERROS_MALFORMADA else erros[-1]
+
+
+class FilaFalhas:
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        self.entradas: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _chave(login: str, tentativa: int) -> str:
+        return f"{login}#{tentativa}"
+
+    def carregar(self) -> int:
+        self.entradas = {}
+        if self.caminho.exists():
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                for entrada in json.load(f).get('falhas', []):
+                    self.entradas[self._chave(entrada['login'], entrada['tentativa'])] = entrada
+        return len(self.entradas)
+
+    def salvar(self):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        dados = {'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'resumo': self.resumo(),
+                 'falhas': sorted(self.entradas.values(), key=lambda e: (e['login'], e['tentativa']))}
+        temporario = self.caminho.with_name(f".{self.caminho.name}.{os.getpid()}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, self.caminho)
+
+    def registrar(self, login: str, nome: str, tentativa: int, causa: str, erros: List[str],
+                  modelo: Optional[str], prompt: str, nivel: int = 0) -> Dict:
+        """Acrescenta a falha (ou atualiza a já registrada para a mesma tentativa)."""
+        agora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        entrada = self.entradas.setdefault(self._chave(login, tentativa), {
+            'login': login, 'nome': nome, 'tentativa': tentativa, 'nivel': nivel,
+            'falhas': 0, 'primeira_falha': agora})
+        entrada.update({'causa': causa, 'erros': erros[-10:], 'modelo': modelo,
+                        'prompt_sha256': impressao_prompt(prompt), 'ultima_falha': agora})
+        entrada['falhas'] += 1
+        return entrada
+
+    def resolver(self, login: str, tentativa: int) -> bool:
+        return self.entradas.pop(self._chave(login, tentativa), None) is not None
+
+    def pendentes(self) -> List[Dict]:
+        return sorted(self.entradas.values(), key=lambda e: (e['tentativa'], e['login']))
+
+    def resumo(self) -> Dict[str, int]:
+        return dict(Counter(e['causa'] for e in self.entradas.values()))
+
+    def __len__(self) -> int:
+        return len(self.entradas)
@@ -17,7 +17,11 @@ show_help() {
     echo "Main Commands:"
     echo "  setup                - Sets up the initial environment (run once)"
     echo "  prepare <zip_file>   - Unzips and renames submissions"
-    echo "  eval <folder>        - Runs the AI evaluation on the submissions folder"
+    echo "  eval <folder|zip>    - Runs the AI evaluation on the submissions folder or Moodle .zip"
+    echo "  status               - Shows the progress recorded in the saved state"
+    echo "  report               - Regenerates the statistics report from the saved state"
+    echo "  worker [options]     - Runs a distributed worker that consumes the shared queue"
+    echo "  serve [options]      - Starts the local HTTP grading server (on-demand grades)"
     echo "  email                - Sends the feedback via email"
     echo "  check                - Checks if the required scripts exist"
     echo "  clean                - Removes submissions, output and logs folders"
@@ -32,6 +36,12 @@ show_help() {
     echo "  4. $0 email"
 }
 
+# Succeeds when config/config.yaml keeps prompts in the artifact store (artifacts.enabled or processing.low_memory)
+artifact_store_enabled() {
+    python3 -c "import sys, yaml; c = yaml.safe_load(open('config/config.yaml')) or {}; \
+sys.exit(0 if (c.get('artifacts') or {}).get('enabled') or (c.get('processing') or {}).get('low_memory') else 1)" 2>/dev/null
+}
+
 # Checks for essential scripts
 check_scripts() {
     local missing_scripts=()
@@ -134,11 +144,31 @@ case "$1" in
             echo -e "${RED}❌ Please specify the submissions folder${NC}" && exit 1
         fi
         echo -e "${BLUE}🤖 Running AI evaluation...${NC}"
-        [ -f "./eval.py" ] && python3 eval.py "$2" "${@:3}" || echo -e "${RED}❌ eval.py not found.${NC}"
+        [ -f "./eval.py" ] && python3 eval.py grade "$2" "${@:3}" || echo -e "${RED}❌ eval.py not found.${NC}"
+        ;;
+
+    "status"|"report")
+        [ -f "./eval.py" ] && python3 eval.py "$1" "${@:2}" || echo -e "${RED}❌ eval.py not found.${NC}"
+        ;;
+
+    "worker")
+        echo -e "${BLUE}🛠️  Starting distributed worker...${NC}"
+        [ -f "./eval.py" ] && python3 eval.py grade --modo worker "${@:2}" || echo -e "${RED}❌ eval.py not found.${NC}"
+        ;;
+
+    "serve")
+        echo -e "${BLUE}🌐 Starting grading server...${NC}"
+        [ -f "./eval.py" ] && python3 eval.py serve "${@:2}" || echo -e "${RED}❌ eval.py not found.${NC}"
         ;;
 
     "email")
         echo -e "${BLUE}📧 Sending feedback emails...${NC}"
+        # Two-phase feedback (feedback_mode "on_demand"): generate any missing detailed feedback first
+        [ -f "./eval.py" ] && python3 eval.py feedback
+        # Prompt attachments are kept in the artifact store until they are needed here
+        if [ -f "./eval.py" ] && artifact_store_enabled; then
+            python3 eval.py export
+        fi
         [ -f "./send_email.py" ] && python3 send_email.py "${@:2}" || echo -e "${RED}❌ send_email.py not found.${NC}"
         ;;
 
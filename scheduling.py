@@ -0,0 +1,98 @@
+"""
+Escalonamento das submissões de cada rodada de avaliação.
+
+Cada rodada usa uma fila de prioridade ordenada por
+(classe de prioridade, prazo individual, tamanho estimado do prompt, ordem):
+
+* prioridades explícitas vêm do arquivo scheduling.priorities_file (ou
+  --prioridades): pedidos de revisão de nota, estudantes com prazo especial
+  e casos marcados por monitores passam à frente dos demais;
+* dentro da mesma classe, prazos individuais mais próximos primeiro;
+* com scheduling.order "shortest_prompt", os prompts menores saem antes
+  (menor latência média até cada nota ficar pronta);
+* um prazo geral (scheduling.deadline_minutes ou --prazo) limita o número de
+  tentativas ao que cabe no tempo restante, replanejado a cada rodada com a
+  duração observada das chamadas.
+"""
+
+import heapq
+import itertools
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+CLASSES = {'regrade': 0, 'accommodation': 1, 'flagged': 2}
+CLASSE_PADRAO = len(CLASSES)
+
+
+def _prazo_timestamp(valor) -> float:
+    if not valor:
+        return math.inf
+    if isinstance(valor, datetime):
+        return valor.timestamp()
+    return datetime.fromisoformat(str(valor)).timestamp()
+
+
+def carregar_prioridades(caminho) -> Dict[str, Dict]:
+    """
+    Lê o arquivo YAML de prioridades. Cada login aponta para uma classe
+    ('regrade', 'accommodation', 'flagged' ou um inteiro; menor sai antes) ou
+    para um mapeamento {class: ..., deadline: "AAAA-MM-DD HH:MM", note: ...}.
+    """
+    import yaml
+
+    if not caminho or not Path(caminho).exists():
+        return {}
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = yaml.safe_load(f) or {}
+
+    prioridades = {}
+    for login, entrada in dados.items():
+        if not isinstance(entrada, dict):
+            entrada = {'class': entrada}
+        classe = entrada.get('class', CLASSE_PADRAO)
+        if not isinstance(classe, int):
+            if classe not in CLASSES:
+                raise ValueError(f"Classe de prioridade desconhecida para '{login}': {classe}")
+            classe = CLASSES[classe]
+        prioridades[str(login)] = {'classe': classe, 'prazo': _prazo_timestamp(entrada.get('deadline')),
+                                   'motivo': entrada.get('note', '')}
+    return prioridades
+
+
+class FilaPrioridade:
+    """Heap de (classe, prazo, tamanho, ordem de chegada, item); o contador desempata sem comparar itens."""
+
+    def __init__(self):
+        self._heap = []
+        self._contador = itertools.count()
+
+    def adicionar(self, item, classe: int = CLASSE_PADRAO, prazo: float = math.inf, tamanho: int = 0):
+        heapq.heappush(self._heap, (classe, prazo, tamanho, next(self._contador), item))
+
+    def retirar(self):
+        return heapq.heappop(self._heap)[-1] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+def duracao_rodada(chamadas: int, threads: int, duracao_chamada: float, stagger_delay: float) -> float:
+    """Estimativa: lotes de 'threads' chamadas, cada lote limitado pela chamada ou pelo ritmo de despacho."""
+    if chamadas <= 0:
+        return 0.0
+    return math.ceil(chamadas / max(1, threads)) * max(duracao_chamada, stagger_delay)
+
+
+def planejar_tentativas(restante: float, chamadas_por_rodada: int, maximo: int, threads: int,
+                        duracao_chamada: float, stagger_delay: float, espera_rodada: float) -> int:
+    """
+    Maior número de rodadas (entre 0 e 'maximo') que termina dentro de
+    'restante' segundos, contando a espera entre rodadas consecutivas.
+    """
+    por_rodada = duracao_rodada(chamadas_por_rodada, threads, duracao_chamada, stagger_delay)
+    for n in range(maximo, 0, -1):
+        if n * por_rodada + (n - 1) * espera_rodada <= restante:
+            return n
+    return 0
@@ -0,0 +1,278 @@
+"""
+Servidor HTTP local de avaliação sob demanda (eval.py serve / run.sh serve).
+
+Mantém em memória, entre as requisições, o GerenciadorAvaliacao de cada
+avaliação (config, rubricas e templates já carregados, calibração), uma única
+ClientSession com o pool de conexões para a API da LLM e os resultados recentes.
+O LMS envia uma submissão e recebe um id de trabalho; a nota chega por consulta
+(GET, com espera opcional) ou por webhook.
+
+    POST /avaliacoes          {"avaliacao": "default", "login": "...", "nome": "...",
+                               "arquivos": {"Q1": "<código>", ...}, "webhook": "http://..."}
+                              -> 202 {"id": ..., "status": "pendente", ...}
+    GET  /avaliacoes/{id}     estado e resultado; ?esperar=N aguarda até N s pela conclusão
+    GET  /saude               avaliações carregadas e contagem de trabalhos
+    GET  /metrics             métricas Prometheus das chamadas à LLM
+
+Submissões idênticas (mesma avaliação, login e arquivos) que chegam enquanto
+uma delas está em andamento, ou até server.result_ttl segundos depois de
+concluída, são agrupadas no mesmo trabalho: a LLM é chamada uma única vez.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from eval import GerenciadorAvaliacao, SubmissaoEstudante
+
+logger = logging.getLogger(__name__)
+
+FINALIZADOS = ('concluido', 'falhou')
+
+
+@dataclass
+class Trabalho:
+    id: str
+    chave: str
+    avaliacao: str
+    login: str
+    nome: str
+    status: str = "pendente"
+    criado: float = field(default_factory=time.time)
+    concluido: Optional[float] = None
+    resultado: Optional[Dict] = None
+    erro: Optional[str] = None
+    webhooks: List[str] = field(default_factory=list)
+    evento: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    tarefa: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def como_dict(self) -> Dict:
+        return {'id': self.id, 'avaliacao': self.avaliacao, 'login': self.login, 'nome': self.nome,
+                'status': self.status, 'criado': self.criado, 'concluido': self.concluido,
+                'resultado': self.resultado, 'erro': self.erro}
+
+
+def _chave_submissao(avaliacao: str, login: str, arquivos: Dict[str, str]) -> str:
+    conteudo = json.dumps([avaliacao, login, sorted(arquivos.items())], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+class ServidorAvaliacao:
+    def __init__(self, config_path: str = "config/config.yaml"):
+        principal = GerenciadorAvaliacao(config_path)
+        principal.configurar_logging()
+        server_config = principal.config.get('server', {})
+        self.server_config = server_config
+        self.metricas = principal.metricas
+        self.token = server_config.get('token', '')
+        self.result_ttl = server_config.get('result_ttl', 600)
+        self.max_trabalhos = server_config.get('max_jobs', 1000)
+        self.threads = principal.config.get('processing', {}).get('parallel_threads', 4)
+
+        # Carregadas na subida: um config inválido derruba o servidor agora, não no meio de uma requisição
+        self.avaliacoes: Dict[str, tuple] = {}
+        self._registrar(server_config.get('assessment_id', 'default'), principal)
+        for avaliacao_id, caminho in (server_config.get('assessments') or {}).items():
+            self._registrar(avaliacao_id, GerenciadorAvaliacao(caminho))
+
+        self.trabalhos: "OrderedDict[str, Trabalho]" = OrderedDict()
+        self.por_chave: Dict[str, str] = {}
+        self.session = None
+        self.semaforo: Optional[asyncio.Semaphore] = None
+
+    def _registrar(self, avaliacao_id: str, gerenciador: GerenciadorAvaliacao):
+        gerenciador.metricas = self.metricas
+        # O resultado é devolvido na resposta, não gravado em blobs (que ninguém apagaria)
+        gerenciador.baixo_consumo_memoria = False
+        gerenciador.artefatos = False
+        self.avaliacoes[avaliacao_id] = (gerenciador, gerenciador._carregar_calibracao())
+        logger.info(f"Avaliação '{avaliacao_id}' carregada: {gerenciador.config['assessment'].get('name', '')} "
+                    f"({len(gerenciador.config['questions'])} questões, {gerenciador.llm_attempts} tentativa(s))")
+
+    # --- Ciclo de vida ---------------------------------------------------------
+
+    def criar_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._autenticar], client_max_size=8 * 1024 * 1024)
+        app.router.add_post('/avaliacoes', self.criar_trabalho)
+        app.router.add_get('/avaliacoes/{id}', self.consultar_trabalho)
+        app.router.add_get('/saude', self.saude)
+        app.router.add_get('/metrics', self.metricas_prometheus)
+        app.on_startup.append(self._iniciar)
+        app.on_cleanup.append(self._encerrar)
+        return app
+
+    async def _iniciar(self, app: web.Application):
+        import aiohttp
+        self.semaforo = asyncio.Semaphore(self.threads)
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.threads * 2,
+                                                                            keepalive_timeout=60))
+
+    async def _encerrar(self, app: web.Application):
+        pendentes = [t.tarefa for t in self.trabalhos.values() if t.tarefa and not t.tarefa.done()]
+        for tarefa in pendentes:
+            tarefa.cancel()
+        await asyncio.gather(*pendentes, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+
+    @web.middleware
+    async def _autenticar(self, request: web.Request, handler):
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            return web.json_response({'erro': 'não autorizado'}, status=401)
+        return await handler(request)
+
+    # --- Rotas -----------------------------------------------------------------
+
+    async def criar_trabalho(self, request: web.Request) -> web.Response:
+        try:
+            dados = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.json_response({'erro': 'corpo JSON inválido'}, status=400)
+        if not isinstance(dados, dict):
+            return web.json_response({'erro': 'o corpo deve ser um objeto JSON'}, status=400)
+
+        avaliacao = dados.get('avaliacao') or self.server_config.get('assessment_id', 'default')
+        if avaliacao not in self.avaliacoes:
+            return web.json_response({'erro': f"avaliação desconhecida: {avaliacao}"}, status=404)
+        gerenciador, _ = self.avaliacoes[avaliacao]
+        questoes = {q['id'] for q in gerenciador.config['questions']}
+        arquivos = dados.get('arquivos') or {}
+        if not isinstance(arquivos, dict) or not arquivos or not dados.get('login'):
+            return web.json_response({'erro': "campos obrigatórios: 'login' e 'arquivos' ({questão: código})"},
+                                     status=400)
+        desconhecidas = set(arquivos) - questoes
+        if desconhecidas or not all(isinstance(c, str) for c in arquivos.values()):
+            return web.json_response({'erro': f"questões desconhecidas ou código não textual: {sorted(desconhecidas)}"},
+                                     status=400)
+
+        chave = _chave_submissao(avaliacao, dados['login'], arquivos)
+        existente = self._trabalho_reaproveitavel(chave)
+        if existente is not None:
+            if dados.get('webhook'):
+                if existente.status in FINALIZADOS:
+                    asyncio.create_task(self._notificar(existente, [dados['webhook']]))
+                elif dados['webhook'] not in existente.webhooks:
+                    existente.webhooks.append(dados['webhook'])
+            logger.info(f"[Servidor] {dados['login']}: submissão idêntica agrupada no trabalho {existente.id}")
+            return web.json_response({**existente.como_dict(), 'agrupado': True}, status=200)
+
+        trabalho = Trabalho(uuid.uuid4().hex[:16], chave, avaliacao, dados['login'], dados.get('nome') or dados['login'],
+                            webhooks=[dados['webhook']] if dados.get('webhook') else [])
+        submissao = SubmissaoEstudante(nome=trabalho.nome, login=trabalho.login, pasta=Path('.'),
+                                       arquivos={q: Path(q) for q in arquivos}, codigos=dict(arquivos))
+        self.trabalhos[trabalho.id] = trabalho
+        self.por_chave[chave] = trabalho.id
+        trabalho.tarefa = asyncio.create_task(self._executar(trabalho, submissao))
+        self._descartar_antigos()
+        return web.json_response({**trabalho.como_dict(), 'url': f"/avaliacoes/{trabalho.id}"}, status=202)
+
+    async def consultar_trabalho(self, request: web.Request) -> web.Response:
+        trabalho = self.trabalhos.get(request.match_info['id'])
+        if trabalho is None:
+            return web.json_response({'erro': 'trabalho não encontrado'}, status=404)
+        try:
+            esperar = min(float(request.query.get('esperar', 0)), 120.0)
+        except ValueError:
+            return web.json_response({'erro': "'esperar' deve ser um número de segundos"}, status=400)
+        if esperar > 0 and trabalho.status not in FINALIZADOS:
+            try:
+                await asyncio.wait_for(trabalho.evento.wait(), esperar)
+            except asyncio.TimeoutError:
+                pass
+        return web.json_response(trabalho.como_dict())
+
+    async def saude(self, request: web.Request) -> web.Response:
+        contagem: Dict[str, int] = {}
+        for trabalho in self.trabalhos.values():
+            contagem[trabalho.status] = contagem.get(trabalho.status, 0) + 1
+        return web.json_response({'status': 'ok', 'avaliacoes': sorted(self.avaliacoes), 'trabalhos': contagem})
+
+    async def metricas_prometheus(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metricas.formato_prometheus(), content_type='text/plain')
+
+    # --- Avaliação -------------------------------------------------------------
+
+    def _trabalho_reaproveitavel(self, chave: str) -> Optional[Trabalho]:
+        trabalho = self.trabalhos.get(self.por_chave.get(chave, ''))
+        if trabalho is None or trabalho.status == 'falhou':
+            return None
+        if trabalho.status == 'concluido' and time.time() - trabalho.concluido > self.result_ttl:
+            return None
+        return trabalho
+
+    def _descartar_antigos(self):
+        """Remove os trabalhos finalizados mais antigos além de server.max_jobs."""
+        excesso = len(self.trabalhos) - self.max_trabalhos
+        for trabalho_id in [i for i, t in self.trabalhos.items() if t.status in FINALIZADOS][:max(0, excesso)]:
+            trabalho = self.trabalhos.pop(trabalho_id)
+            if self.por_chave.get(trabalho.chave) == trabalho_id:
+                del self.por_chave[trabalho.chave]
+
+    async def _executar(self, trabalho: Trabalho, submissao: SubmissaoEstudante):
+        gerenciador, calibracao = self.avaliacoes[trabalho.avaliacao]
+        gerenciador._cabecalho = None  # A data do cabeçalho do prompt é a da requisição, não a da subida
+        trabalho.status = 'processando'
+        self.metricas.definir_total(self.metricas.itens_total + gerenciador.llm_attempts)
+
+        async def tentativa(rodada: int, amostras: int = 1):
+            self.metricas.entrar_fila()
+            inicio = time.monotonic()
+            async with self.semaforo:
+                self.metricas.sair_fila()
+                await gerenciador._processar_submissao(self.session, submissao, time.monotonic() - inicio, rodada,
+                                                       amostras=amostras)
+
+        try:
+            if gerenciador.amostragem in ('n', 'back_to_back'):
+                # Todas as tentativas numa só vaga do semáforo (assessment.sampling)
+                await tentativa(1, gerenciador.llm_attempts)
+            else:
+                # As tentativas do mesmo estudante saem juntas: a nota fica pronta no tempo de uma chamada
+                await asyncio.gather(*(tentativa(n) for n in range(1, gerenciador.llm_attempts + 1)))
+            gerenciador._consolidar_submissao(submissao, calibracao)
+            if submissao.status == 'concluido':
+                trabalho.status = 'concluido'
+                trabalho.resultado = {'nota_final': round(submissao.nota_final, 2),
+                                      'notas_questoes': submissao.notas_questoes,
+                                      'feedback': gerenciador._texto(submissao, 'feedback'),
+                                      'tentativas': len(submissao.historico_avaliacoes),
+                                      'chamadas_api': submissao.tentativas_api}
+            else:
+                trabalho.status, trabalho.erro = 'falhou', gerenciador._texto(submissao, 'feedback')
+        except Exception as e:
+            logger.error(f"[Servidor] Trabalho {trabalho.id} ({trabalho.login}) falhou: {e}", exc_info=True)
+            trabalho.status, trabalho.erro = 'falhou', str(e)
+        trabalho.concluido = time.time()
+        trabalho.evento.set()
+        logger.info(f"[Servidor] Trabalho {trabalho.id} ({trabalho.login}): {trabalho.status} "
+                    f"em {trabalho.concluido - trabalho.criado:.1f}s")
+        if trabalho.webhooks:
+            await self._notificar(trabalho, trabalho.webhooks)
+
+    async def _notificar(self, trabalho: Trabalho, webhooks: List[str]):
+        import aiohttp
+        for url in webhooks:
+            try:
+                async with self.session.post(url, json=trabalho.como_dict(),
+                                             timeout=aiohttp.ClientTimeout(total=10)) as resposta:
+                    if resposta.status >= 400:
+                        logger.warning(f"[Servidor] Webhook {url} respondeu {resposta.status}")
+            except Exception as e:
+                logger.warning(f"[Servidor] Falha ao chamar o webhook {url}: {e}")
+
+
+def executar_servidor(config_path: str, host: Optional[str] = None, porta: Optional[int] = None):
+    servidor = ServidorAvaliacao(config_path)
+    host = host or servidor.server_config.get('host', '127.0.0.1')
+    porta = porta or servidor.server_config.get('port', 8766)
+    logger.info(f"Servidor de avaliação em http://{host}:{porta} (POST /avaliacoes)")
+    web.run_app(servidor.criar_app(), host=host, port=porta, print=None)
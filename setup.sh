@@ -73,6 +73,7 @@ six==1.17.0
 typing_extensions==4.15.0
 tzdata==2025.2
 yarl==1.20.1
+zstandard==0.23.0
 EOF
 
 # Install Python dependencies from the requirements file
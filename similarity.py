@@ -0,0 +1,190 @@
+"""
+Agrupamento de respostas estruturalmente parecidas (MinHash + LSH).
+
+Cada arquivo de questão vira uma assinatura MinHash de shingles de tokens
+(comentários e espaços ignorados). As respostas são agrupadas por "líder":
+a primeira resposta de um grupo é o representante, avaliado por completo; as
+demais com similaridade estimada >= similarity.threshold recebem no prompt
+apenas o diff em relação ao representante e a nota que ele obteve.
+
+Os representantes (assinatura, código, nota e comentário) ficam em
+output/indice_similaridade.json. Em execuções seguintes da mesma avaliação
+(mesma rubrica/pontuação por questão), envios atrasados são comparados
+diretamente com os representantes já corrigidos.
+"""
+
+import difflib
+import hashlib
+import json
+import random
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PADRAO_COMENTARIO = re.compile(r'#[^\n]*|//[^\n]*|/\*.*?\*/', re.S)
+PADRAO_TOKEN = re.compile(r'[A-Za-z_]\w*|\d+(?:\.\d+)?|\S')
+PRIMO = (1 << 31) - 1
+SEMENTE = 20240901
+
+
+def _hash_codigo(codigo: str) -> str:
+    return hashlib.sha256(codigo.encode('utf-8')).hexdigest()[:16]
+
+
+def chave_questao(questao: Dict) -> str:
+    """Muda quando a rubrica ou a pontuação da questão muda (o índice daquela questão é descartado)."""
+    base = f"{questao.get('rubric', '')}|{questao.get('max_points', 0)}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()[:16]
+
+
+class GeradorMinHash:
+    def __init__(self, num_permutacoes: int = 64, tamanho_shingle: int = 5):
+        import numpy as np
+
+        self.np = np
+        self.tamanho_shingle = tamanho_shingle
+        rng = random.Random(SEMENTE)  # Semente fixa: assinaturas comparáveis entre execuções
+        self.a = np.array([rng.randrange(1, PRIMO) for _ in range(num_permutacoes)], dtype=np.uint64)
+        self.b = np.array([rng.randrange(0, PRIMO) for _ in range(num_permutacoes)], dtype=np.uint64)
+
+    def assinatura(self, codigo: str) -> List[int]:
+        np = self.np
+        tokens = PADRAO_TOKEN.findall(PADRAO_COMENTARIO.sub(' ', codigo))
+        k = self.tamanho_shingle
+        shingles = {' '.join(tokens[i:i + k]) for i in range(max(1, len(tokens) - k + 1))}
+        valores = np.fromiter((zlib.crc32(s.encode('utf-8')) % PRIMO for s in shingles), dtype=np.uint64,
+                              count=len(shingles))
+        return ((np.outer(self.a, valores) + self.b[:, None]) % PRIMO).min(axis=1).tolist()
+
+
+def similaridade(assinatura_a: List[int], assinatura_b: List[int]) -> float:
+    """Estimativa de Jaccard: fração de posições iguais nas assinaturas."""
+    return sum(x == y for x, y in zip(assinatura_a, assinatura_b)) / len(assinatura_a)
+
+
+class IndiceSimilaridade:
+    def __init__(self, caminho: Path, questoes: List[Dict], limiar: float = 0.9,
+                 num_permutacoes: int = 64, bandas: int = 16):
+        self.caminho = Path(caminho)
+        self.limiar = limiar
+        self.num_permutacoes = num_permutacoes
+        self.bandas = bandas
+        self.chaves = {q['id']: chave_questao(q) for q in questoes}
+        self.minhash = GeradorMinHash(num_permutacoes)
+        # questão -> lista de representantes {login, hash, assinatura, codigo, nota, comentario}
+        self.representantes: Dict[str, List[Dict]] = {q: [] for q in self.chaves}
+        self._buckets: Dict[str, Dict[Tuple, List[int]]] = {q: {} for q in self.chaves}
+        # (login, questão) -> (índice do representante, similaridade, é o próprio representante)
+        self.membros: Dict[Tuple[str, str], Tuple[int, float, bool]] = {}
+
+    def carregar(self) -> int:
+        if not self.caminho.exists():
+            return 0
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        if dados.get('num_permutacoes') != self.num_permutacoes:
+            return 0
+        for q, secao in dados.get('questoes', {}).items():
+            if self.chaves.get(q) != secao.get('chave'):
+                continue  # Rubrica/pontuação alterada: as notas antigas não valem mais
+            for representante in secao.get('representantes', []):
+                self._adicionar(q, representante)
+        return sum(len(r) for r in self.representantes.values())
+
+    def salvar(self):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        dados = {'num_permutacoes': self.num_permutacoes,
+                 'questoes': {q: {'chave': self.chaves[q], 'representantes': reps}
+                              for q, reps in self.representantes.items()}}
+        temporario = self.caminho.with_name(f".{self.caminho.name}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False)
+        temporario.replace(self.caminho)
+
+    def _bandas(self, assinatura: List[int]):
+        linhas = self.num_permutacoes // self.bandas
+        for i in range(self.bandas):
+            yield (i, *assinatura[i * linhas:(i + 1) * linhas])
+
+    def _adicionar(self, q: str, representante: Dict) -> int:
+        indice = len(self.representantes[q])
+        self.representantes[q].append(representante)
+        for banda in self._bandas(representante['assinatura']):
+            self._buckets[q].setdefault(banda, []).append(indice)
+        return indice
+
+    def _mais_parecido(self, q: str, assinatura: List[int]) -> Tuple[Optional[int], float]:
+        candidatos = {i for banda in self._bandas(assinatura) for i in self._buckets[q].get(banda, ())}
+        melhor, melhor_sim = None, 0.0
+        for i in candidatos:
+            sim = similaridade(assinatura, self.representantes[q][i]['assinatura'])
+            if sim > melhor_sim:
+                melhor, melhor_sim = i, sim
+        return melhor, melhor_sim
+
+    def agrupar(self, respostas: Iterable[Tuple[str, str, str]]):
+        """
+        Atribui cada resposta (login, questão, código) a um representante
+        parecido o bastante ou a torna representante de um novo grupo.
+        """
+        self.membros.clear()
+        for login, q, codigo in respostas:
+            if q not in self.representantes:
+                continue
+            hash_codigo = _hash_codigo(codigo)
+            assinatura = self.minhash.assinatura(codigo)
+            indice, sim = self._mais_parecido(q, assinatura)
+            if indice is None or sim < self.limiar:
+                indice = self._adicionar(q, {'login': login, 'hash': hash_codigo, 'assinatura': assinatura,
+                                             'codigo': codigo, 'nota': None, 'comentario': ''})
+                self.membros[(login, q)] = (indice, 1.0, True)
+            else:
+                representante = self.representantes[q][indice]
+                proprio = representante['login'] == login and representante['hash'] == hash_codigo
+                self.membros[(login, q)] = (indice, sim, proprio)
+
+    def depende_de_pendente(self, login: str) -> bool:
+        """O estudante tem alguma questão agrupada com um representante ainda sem nota."""
+        for q in self.representantes:
+            membro = self.membros.get((login, q))
+            if membro and not membro[2] and self.representantes[q][membro[0]]['nota'] is None:
+                return True
+        return False
+
+    def referencia(self, login: str, q: str) -> Optional[Dict]:
+        """Representante já corrigido para comparar com esta resposta (None: avaliar por completo)."""
+        membro = self.membros.get((login, q))
+        if not membro or membro[2]:
+            return None
+        representante = self.representantes[q][membro[0]]
+        if representante['nota'] is None:
+            return None
+        return {**representante, 'similaridade': membro[1]}
+
+    def representantes_sem_nota(self):
+        for q, reps in self.representantes.items():
+            for indice, representante in enumerate(reps):
+                if representante['nota'] is None:
+                    yield q, indice, representante
+
+    def eh_representante(self, login: str, q: str, indice: int) -> bool:
+        """A resposta atual do estudante é a própria resposta guardada como representante."""
+        membro = self.membros.get((login, q))
+        return bool(membro and membro[0] == indice and membro[2])
+
+    def estatisticas(self) -> Dict[str, Dict[str, int]]:
+        resumo = {}
+        for q in self.representantes:
+            grupos = {}
+            for (login, questao), (indice, _, _) in self.membros.items():
+                if questao == q:
+                    grupos[indice] = grupos.get(indice, 0) + 1
+            resumo[q] = {'respostas': sum(grupos.values()), 'grupos': len(grupos),
+                         'agrupadas': sum(n - 1 for n in grupos.values() if n > 1)}
+        return resumo
+
+
+def diff_resumido(referencia: str, codigo: str, contexto: int = 1) -> str:
+    return '\n'.join(difflib.unified_diff(referencia.splitlines(), codigo.splitlines(),
+                                          'referencia', 'aluno', n=contexto, lineterm=''))
@@ -0,0 +1,210 @@
+"""
+Leitura dos resultados do VPL (pasta .ceg de cada envio no Moodle).
+
+Além dos percentuais por questão e da nota final ("Grade :=>>") usados na
+comparação com a LLM, extrai de execution.txt o resultado de cada teste
+("Testing i/N : nome", falhas "-Test i: nome (penalidade)" com entrada, saída
+do programa e saída esperada) e o resumo de testes executados/aprovados, além
+dos erros de compilation.txt, da nota de grade.txt e de gradecomments.txt.
+
+A análise roda em um pool de processos (seção 'vpl') e o resultado de cada
+.ceg fica em cache (output/.cache/vpl_resultados.json), invalidado quando o
+mtime dos arquivos (pasta) ou o CRC dos membros (zip) muda.
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+ARQUIVOS = ('execution.txt', 'compilation.txt', 'grade.txt', 'gradecomments.txt')
+LIMITE_TEXTO = 2000   # Caracteres guardados de compilation/gradecomments
+LIMITE_SAIDA = 400    # Caracteres guardados de entrada/saída de cada teste com falha
+
+PADRAO_QUESTAO = re.compile(r'-\s*Question\s*(\d+):', re.IGNORECASE)
+PADRAO_PERCENTUAL = re.compile(r'\(([0-9]+(?:\.[0-9]+)?)%\)')
+PADRAO_NOTA_FINAL = re.compile(r'^Grade\s*:=>>\s*([0-9]+(?:\.[0-9]+)?)')
+PADRAO_NOTA_PARCIAL = re.compile(r'^PartialGrade\s*:=>>\s*([0-9]+(?:\.[0-9]+)?)')
+PADRAO_TESTANDO = re.compile(r'^Testing\s+(\d+)/(\d+)\s*:\s*(.*)$')
+PADRAO_FALHA = re.compile(r'^-\s*Test\s+(\d+):\s*(.*?)\s*\(([-+]?[0-9]+(?:\.[0-9]+)?)\)\s*$')
+PADRAO_RESUMO = re.compile(r'(\d+)\s*tests?\s*run\s*/\s*(\d+)\s*tests?\s*passed', re.IGNORECASE)
+SECOES = (('--- Input', 'entrada'), ('--- Program output', 'saida'), ('--- Expected output', 'esperado'))
+
+
+def _nova_questao() -> Dict:
+    return {'percentual': None, 'nota_parcial': None, 'executados': None, 'aprovados': None,
+            'testes': [], 'falhas': []}
+
+
+def analisar_execution(texto: str) -> Tuple[Dict[str, Dict], Optional[float]]:
+    """Resultados por questão ("Q1", "Q2", ...) e nota final de um execution.txt."""
+    questoes: Dict[str, Dict] = {}
+    questao, aguardando_percentual, falha, secao = None, False, None, None
+    nota_final = None
+
+    for bruta in texto.splitlines():
+        linha = bruta.strip()
+
+        match = PADRAO_QUESTAO.search(linha)
+        if match:
+            questao = questoes.setdefault(f"Q{match.group(1)}", _nova_questao())
+            aguardando_percentual, falha, secao = True, None, None
+            continue
+        if questao is not None and aguardando_percentual:
+            match = PADRAO_PERCENTUAL.search(linha)
+            if match:
+                questao['percentual'] = float(match.group(1))
+                aguardando_percentual = False
+
+        if linha in ('<|--', '--|>'):
+            falha, secao = None, None
+            continue
+
+        match = PADRAO_NOTA_FINAL.match(linha)
+        if match:
+            nota_final = float(match.group(1))
+            continue
+        if questao is None:
+            continue
+
+        match = PADRAO_TESTANDO.match(linha)
+        if match:
+            questao['testes'].append({'numero': int(match.group(1)), 'nome': match.group(3), 'passou': True})
+            continue
+        match = PADRAO_FALHA.match(linha)
+        if match:
+            falha = {'numero': int(match.group(1)), 'nome': match.group(2), 'penalidade': float(match.group(3)),
+                     'motivo': '', 'entrada': [], 'saida': [], 'esperado': []}
+            questao['falhas'].append(falha)
+            for teste in questao['testes']:
+                if teste['nome'] == falha['nome'] or teste['numero'] == falha['numero']:
+                    teste['passou'] = False
+            secao = None
+            continue
+        match = PADRAO_RESUMO.search(linha)
+        if match:
+            questao['executados'], questao['aprovados'] = int(match.group(1)), int(match.group(2))
+            continue
+        match = PADRAO_NOTA_PARCIAL.match(linha)
+        if match:
+            questao['nota_parcial'] = float(match.group(1))
+            continue
+
+        if falha is not None:
+            marcador = next((chave for prefixo, chave in SECOES if linha.startswith(prefixo)), None)
+            if marcador:
+                secao = marcador
+            elif secao and bruta.startswith('>'):
+                falha[secao].append(bruta[1:])
+            elif not falha['motivo'] and linha:
+                falha['motivo'] = linha
+
+    for questao in questoes.values():
+        if questao['executados'] is None and questao['testes']:
+            questao['executados'] = len(questao['testes'])
+            questao['aprovados'] = sum(t['passou'] for t in questao['testes'])
+        for falha in questao['falhas']:
+            for chave in ('entrada', 'saida', 'esperado'):
+                falha[chave] = '\n'.join(falha[chave])[:LIMITE_SAIDA]
+    return questoes, nota_final
+
+
+def analisar_textos(textos: Dict[str, str]) -> Dict:
+    """Resultado estruturado a partir do conteúdo dos arquivos da pasta .ceg (nome -> texto)."""
+    questoes, nota_final = analisar_execution(textos.get('execution.txt', ''))
+    nota_grade = None
+    try:
+        nota_grade = float(textos.get('grade.txt', '').strip() or 'nan')
+    except ValueError:
+        pass
+    if nota_grade != nota_grade:  # NaN: grade.txt ausente ou vazio
+        nota_grade = None
+    return {'questoes': questoes, 'nota_final': nota_final, 'nota_grade_txt': nota_grade,
+            'compilacao': textos.get('compilation.txt', '').strip()[:LIMITE_TEXTO],
+            'comentarios': textos.get('gradecomments.txt', '').strip()[:LIMITE_TEXTO],
+            'tem_execution': 'execution.txt' in textos}
+
+
+def ler_pasta(pasta: Union[str, Path]) -> Dict[str, str]:
+    textos = {}
+    for nome in ARQUIVOS:
+        caminho = Path(pasta) / nome
+        if caminho.is_file():
+            textos[nome] = caminho.read_text(encoding='utf-8', errors='ignore')
+    return textos
+
+
+def analisar_fonte(fonte: Union[str, Dict[str, str]]) -> Dict:
+    """Executa no pool: 'fonte' é o caminho de uma pasta .ceg ou os textos já lidos (zip)."""
+    return analisar_textos(fonte if isinstance(fonte, dict) else ler_pasta(fonte))
+
+
+def assinatura_pasta(pasta: Path) -> str:
+    """Muda quando algum dos arquivos de resultado é criado, removido ou regravado."""
+    partes = []
+    for nome in ARQUIVOS:
+        try:
+            st = (Path(pasta) / nome).stat()
+            partes.append(f"{nome}:{st.st_size}:{st.st_mtime_ns}")
+        except FileNotFoundError:
+            pass
+    return '|'.join(partes)
+
+
+def assinatura_zip(infos: Iterable) -> str:
+    return '|'.join(f"{Path(i.filename).name}:{i.file_size}:{i.CRC}" for i in sorted(infos, key=lambda i: i.filename))
+
+
+class CacheResultadosVPL:
+    def __init__(self, caminho: Union[str, Path]):
+        self.caminho = Path(caminho)
+        self.entradas: Dict[str, List] = {}
+        self.alterado = False
+        try:
+            self.entradas = json.loads(self.caminho.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def obter(self, chave: str, assinatura: str) -> Optional[Dict]:
+        entrada = self.entradas.get(chave)
+        return entrada[1] if entrada and entrada[0] == assinatura else None
+
+    def guardar(self, chave: str, assinatura: str, resultado: Dict):
+        self.entradas[chave] = [assinatura, resultado]
+        self.alterado = True
+
+    def salvar(self):
+        if not self.alterado:
+            return
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = self.caminho.with_name(f".{self.caminho.name}.{os.getpid()}.tmp")
+        temporario.write_text(json.dumps(self.entradas, ensure_ascii=False), encoding='utf-8')
+        os.replace(temporario, self.caminho)
+        self.alterado = False
+
+
+def analisar_em_lote(fontes: Dict[str, Union[str, Dict[str, str]]], workers: int = 4) -> Dict[str, Dict]:
+    """Analisa várias pastas .ceg; com poucos itens (ou workers <= 1) roda no próprio processo."""
+    chaves = list(fontes)
+    if workers <= 1 or len(chaves) < 2 * workers:
+        return {chave: analisar_fonte(fontes[chave]) for chave in chaves}
+    with ProcessPoolExecutor(workers) as executor:
+        resultados = executor.map(analisar_fonte, (fontes[c] for c in chaves),
+                                  chunksize=max(1, len(chaves) // (workers * 4)))
+        return dict(zip(chaves, resultados))
+
+
+def resumo_testes(resultado_questao: Dict, limite_falhas: int = 3) -> str:
+    """Texto curto das falhas de uma questão, usado no bloco do prompt (question_vpl_block)."""
+    linhas = []
+    for falha in resultado_questao.get('falhas', [])[:limite_falhas]:
+        linhas.append(f"- {falha['nome']} ({falha['penalidade']:+g}): {falha['motivo'] or 'falhou'}")
+        for rotulo, chave in (('Entrada', 'entrada'), ('Saída do programa', 'saida'), ('Saída esperada', 'esperado')):
+            if falha.get(chave):
+                linhas.append(f"  {rotulo}:\n" + '\n'.join(f"    {l}" for l in falha[chave].splitlines()))
+    restantes = len(resultado_questao.get('falhas', [])) - limite_falhas
+    if restantes > 0:
+        linhas.append(f"- ... e mais {restantes} teste(s) com falha")
+    return '\n'.join(linhas) or "Nenhuma falha."
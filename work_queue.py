@@ -0,0 +1,325 @@
+"""
+Fila de trabalho durável para o modo distribuído (coordenador/worker).
+
+O coordenador renderiza cada avaliação (estudante × tentativa) como um item
+da fila. Workers, em qualquer máquina e cada um com sua própria API_KEY ou
+modelo local, arrendam itens (lease), chamam a LLM e gravam a resposta de
+volta. Enquanto processa um item, o worker renova o lease; leases expirados
+retornam à fila, de modo que itens de workers que travaram ou caíram são
+reprocessados por outro worker. Enfileirar de novo um id que falhou o devolve
+à fila; ids concluídos são mantidos (o coordenador inclui no id a impressão do
+prompt, de modo que uma nova entrega ou outra avaliação gera outro item).
+
+Dois backends estão disponíveis:
+  - "sqlite":    um único host (SQLite não é seguro sobre NFS);
+  - "directory": diretório em armazenamento compartilhado, usando apenas
+                 renomeações atômicas de arquivos.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class FilaTrabalho(ABC):
+    """Interface comum dos backends de fila."""
+
+    @abstractmethod
+    def enfileirar(self, itens: List[Dict]) -> int:
+        ...
+
+    @abstractmethod
+    def arrendar(self, worker_id: str, lease_timeout: float) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def renovar(self, item: Dict, worker_id: str, lease_timeout: float) -> bool:
+        ...
+
+    @abstractmethod
+    def concluir(self, item: Dict, worker_id: str, resultado: Dict) -> bool:
+        ...
+
+    @abstractmethod
+    def falhar(self, item: Dict, worker_id: str, causa: str) -> bool:
+        ...
+
+    @abstractmethod
+    def recuperar_expirados(self) -> int:
+        ...
+
+    @abstractmethod
+    def resumo(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def resultados(self) -> List[Dict]:
+        ...
+
+
+class FilaSQLite(FilaTrabalho):
+    def __init__(self, caminho: str):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._conectar()) as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS itens (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pendente',
+                    worker TEXT,
+                    lease_ate REAL,
+                    arrendamentos INTEGER NOT NULL DEFAULT 0,
+                    resultado TEXT,
+                    causa TEXT,
+                    atualizado_em REAL
+                )""")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_itens_status ON itens(status, lease_ate)")
+
+    def _conectar(self) -> sqlite3.Connection:
+        # isolation_level=None: as transações são controladas explicitamente (BEGIN IMMEDIATE)
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def enfileirar(self, itens: List[Dict]) -> int:
+        con = self._conectar()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            novos = 0
+            for item in itens:
+                cur = con.execute("INSERT INTO itens (id, payload, atualizado_em) VALUES (?, ?, ?) "
+                                  "ON CONFLICT(id) DO UPDATE SET payload = excluded.payload, status = 'pendente', "
+                                  "worker = NULL, lease_ate = NULL, causa = NULL, atualizado_em = excluded.atualizado_em "
+                                  "WHERE status = 'falhou'",
+                                  (item['id'], json.dumps(item, ensure_ascii=False), time.time()))
+                novos += cur.rowcount
+            con.execute("COMMIT")
+            return novos
+        finally:
+            con.close()
+
+    def arrendar(self, worker_id: str, lease_timeout: float) -> Optional[Dict]:
+        con = self._conectar()
+        try:
+            agora = time.time()
+            con.execute("BEGIN IMMEDIATE")
+            linha = con.execute(
+                "SELECT id, payload FROM itens WHERE status = 'pendente' "
+                "OR (status = 'em_andamento' AND lease_ate < ?) ORDER BY rowid LIMIT 1", (agora,)).fetchone()
+            if not linha:
+                con.execute("COMMIT")
+                return None
+            con.execute("UPDATE itens SET status = 'em_andamento', worker = ?, lease_ate = ?, "
+                        "arrendamentos = arrendamentos + 1, atualizado_em = ? WHERE id = ?",
+                        (worker_id, agora + lease_timeout, agora, linha[0]))
+            con.execute("COMMIT")
+            return json.loads(linha[1])
+        finally:
+            con.close()
+
+    def renovar(self, item: Dict, worker_id: str, lease_timeout: float) -> bool:
+        with closing(self._conectar()) as con:
+            cur = con.execute("UPDATE itens SET lease_ate = ? WHERE id = ? AND status = 'em_andamento' AND worker = ?",
+                              (time.time() + lease_timeout, item['id'], worker_id))
+            return cur.rowcount > 0
+
+    def concluir(self, item: Dict, worker_id: str, resultado: Dict) -> bool:
+        # Um resultado tardio (lease já expirado) ainda é válido, desde que ninguém tenha concluído antes
+        with closing(self._conectar()) as con:
+            cur = con.execute("UPDATE itens SET status = 'concluido', worker = ?, resultado = ?, atualizado_em = ? "
+                              "WHERE id = ? AND status != 'concluido'",
+                              (worker_id, json.dumps(resultado, ensure_ascii=False), time.time(), item['id']))
+            return cur.rowcount > 0
+
+    def falhar(self, item: Dict, worker_id: str, causa: str) -> bool:
+        with closing(self._conectar()) as con:
+            cur = con.execute("UPDATE itens SET status = 'falhou', worker = ?, causa = ?, atualizado_em = ? "
+                              "WHERE id = ? AND status = 'em_andamento' AND worker = ?",
+                              (worker_id, causa, time.time(), item['id'], worker_id))
+            return cur.rowcount > 0
+
+    def recuperar_expirados(self) -> int:
+        with closing(self._conectar()) as con:
+            cur = con.execute("UPDATE itens SET status = 'pendente', worker = NULL, lease_ate = NULL "
+                              "WHERE status = 'em_andamento' AND lease_ate < ?", (time.time(),))
+            return cur.rowcount
+
+    def resumo(self) -> Dict[str, int]:
+        contagem = {'pendente': 0, 'em_andamento': 0, 'concluido': 0, 'falhou': 0}
+        with closing(self._conectar()) as con:
+            for status, total in con.execute("SELECT status, COUNT(*) FROM itens GROUP BY status"):
+                contagem[status] = total
+        return contagem
+
+    def resultados(self) -> List[Dict]:
+        saida = []
+        with closing(self._conectar()) as con:
+            for payload, status, resultado, causa in con.execute(
+                    "SELECT payload, status, resultado, causa FROM itens "
+                    "WHERE status IN ('concluido', 'falhou') ORDER BY rowid"):
+                item = json.loads(payload)
+                item['status'] = status
+                item['resultado'] = json.loads(resultado) if resultado else None
+                item['causa'] = causa
+                saida.append(item)
+        return saida
+
+
+class FilaDiretorio(FilaTrabalho):
+    """
+    Fila baseada em diretórios, adequada para armazenamento compartilhado.
+
+    O arrendamento é um os.rename() de pendentes/ para em_andamento/, com a
+    expiração e o worker codificados no nome do arquivo; somente um worker
+    vence a renomeação, então não há necessidade de locks.
+    """
+
+    SUBPASTAS = ('pendentes', 'em_andamento', 'concluidos', 'falhas')
+
+    def __init__(self, caminho: str):
+        self.raiz = Path(caminho)
+        for sub in self.SUBPASTAS:
+            (self.raiz / sub).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _nome_seguro(texto: str) -> str:
+        return re.sub(r'[^\w.-]', '_', texto)
+
+    def _escrever_atomico(self, destino: Path, dados: Dict):
+        temporario = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, destino)
+
+    def _arquivos_em_andamento(self, item_id: Optional[str] = None):
+        for arquivo in (self.raiz / 'em_andamento').glob('*.json'):
+            partes = arquivo.stem.split('@')
+            if len(partes) != 3:
+                continue
+            nome, expira, worker = partes
+            if item_id is None or nome == item_id:
+                yield arquivo, nome, float(expira), worker
+
+    def enfileirar(self, itens: List[Dict]) -> int:
+        existentes = {p.stem.split('@')[0] for sub in ('pendentes', 'em_andamento', 'concluidos')
+                      for p in (self.raiz / sub).glob('*.json')}
+        novos = 0
+        for item in itens:
+            nome = self._nome_seguro(item['id'])
+            if nome in existentes:
+                continue
+            try:
+                (self.raiz / 'falhas' / f"{nome}.json").unlink()
+            except FileNotFoundError:
+                pass
+            self._escrever_atomico(self.raiz / 'pendentes' / f"{nome}.json", item)
+            novos += 1
+        return novos
+
+    def arrendar(self, worker_id: str, lease_timeout: float) -> Optional[Dict]:
+        worker = self._nome_seguro(worker_id).replace('@', '_')
+        for arquivo in sorted((self.raiz / 'pendentes').glob('*.json')):
+            destino = self.raiz / 'em_andamento' / f"{arquivo.stem}@{time.time() + lease_timeout:.0f}@{worker}.json"
+            try:
+                os.rename(arquivo, destino)
+            except OSError:
+                continue  # outro worker venceu a corrida por este item
+            with open(destino, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def _liberar(self, item_id: str, worker_id: str):
+        worker = self._nome_seguro(worker_id).replace('@', '_')
+        for arquivo, _, _, dono in self._arquivos_em_andamento(self._nome_seguro(item_id)):
+            if dono == worker:
+                try:
+                    arquivo.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def renovar(self, item: Dict, worker_id: str, lease_timeout: float) -> bool:
+        worker = self._nome_seguro(worker_id).replace('@', '_')
+        for arquivo, nome, _, dono in list(self._arquivos_em_andamento(self._nome_seguro(item['id']))):
+            if dono != worker:
+                continue
+            try:
+                os.rename(arquivo, arquivo.with_name(f"{nome}@{time.time() + lease_timeout:.0f}@{worker}.json"))
+                return True
+            except OSError:
+                return False  # o coordenador devolveu o item à fila
+        return False
+
+    def concluir(self, item: Dict, worker_id: str, resultado: Dict) -> bool:
+        nome = self._nome_seguro(item['id'])
+        destino = self.raiz / 'concluidos' / f"{nome}.json"
+        if destino.exists():
+            self._liberar(item['id'], worker_id)
+            return False
+        self._escrever_atomico(destino, {'item': item, 'worker': worker_id, 'resultado': resultado})
+        # Um resultado tardio vale mais que a falha registrada por outro worker
+        try:
+            (self.raiz / 'falhas' / f"{nome}.json").unlink()
+        except FileNotFoundError:
+            pass
+        self._liberar(item['id'], worker_id)
+        return True
+
+    def falhar(self, item: Dict, worker_id: str, causa: str) -> bool:
+        nome = self._nome_seguro(item['id'])
+        if (self.raiz / 'concluidos' / f"{nome}.json").exists():
+            # Outro worker já concluiu o item (lease expirado e arrendado de novo)
+            self._liberar(item['id'], worker_id)
+            return False
+        self._escrever_atomico(self.raiz / 'falhas' / f"{nome}.json",
+                               {'item': item, 'worker': worker_id, 'causa': causa})
+        self._liberar(item['id'], worker_id)
+        return True
+
+    def recuperar_expirados(self) -> int:
+        agora, recuperados = time.time(), 0
+        for arquivo, nome, expira, _ in list(self._arquivos_em_andamento()):
+            if expira >= agora:
+                continue
+            try:
+                if (self.raiz / 'concluidos' / f"{nome}.json").exists():
+                    arquivo.unlink()
+                else:
+                    os.rename(arquivo, self.raiz / 'pendentes' / f"{nome}.json")
+                    recuperados += 1
+            except OSError:
+                continue
+        return recuperados
+
+    def resumo(self) -> Dict[str, int]:
+        contar = lambda sub: sum(1 for _ in (self.raiz / sub).glob('*.json'))
+        return {'pendente': contar('pendentes'), 'em_andamento': contar('em_andamento'),
+                'concluido': contar('concluidos'), 'falhou': contar('falhas')}
+
+    def resultados(self) -> List[Dict]:
+        saida = []
+        for status, sub in (('concluido', 'concluidos'), ('falhou', 'falhas')):
+            for arquivo in sorted((self.raiz / sub).glob('*.json')):
+                with open(arquivo, 'r', encoding='utf-8') as f:
+                    registro = json.load(f)
+                item = registro['item']
+                item.update(status=status, resultado=registro.get('resultado'), causa=registro.get('causa'))
+                saida.append(item)
+        return saida
+
+
+def criar_fila(config: dict) -> FilaTrabalho:
+    """Cria a fila a partir da seção 'distributed' do config.yaml."""
+    dist_config = config.get('distributed', {})
+    backend = dist_config.get('backend', 'sqlite').lower()
+    if backend == 'sqlite':
+        return FilaSQLite(dist_config.get('path', 'output/fila.sqlite3'))
+    if backend == 'directory':
+        return FilaDiretorio(dist_config.get('path', 'output/fila'))
+    raise ValueError(f"Backend de fila desconhecido: '{backend}' (use 'sqlite' ou 'directory')")
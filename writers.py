@@ -0,0 +1,237 @@
+"""
+Gravação dos arquivos finais por estudante (feedback, prompt e pacote .zip).
+
+Cada estudante é renderizado (textwrap) e gravado em um pool de processos ou
+threads. Os arquivos são escritos em um temporário oculto (".<nome>.<pid>.tmp",
+que não casa com o padrão do send_email.py) e publicados com os.replace, de
+modo que uma interrupção nunca deixa um feedback pela metade na pasta. Um
+manifesto com o sha256 (e o tamanho/mtime gravados) de cada arquivo permite
+pular, nas reexecuções incrementais, os arquivos cujo conteúdo não mudou. Um
+arquivo cujo tamanho/mtime não bate mais com o manifesto foi editado depois da
+gravação (por exemplo, um feedback revisado pelo professor) e é preservado,
+salvo com 'forcar'.
+"""
+
+import hashlib
+import io
+import json
+import os
+import textwrap
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MANIFESTO = ".manifesto.json"
+DATA_ZIP = (2000, 1, 1, 0, 0, 0)  # Data fixa nos membros do pacote: mesmo conteúdo, mesmos bytes
+
+
+def gravar_atomico(caminho: Path, dados: bytes):
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+    with open(temporario, 'wb') as f:
+        f.write(dados)
+    os.replace(temporario, caminho)
+
+
+def _hash(dados: bytes) -> str:
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _inalterado(caminho: Path, hash_conteudo: str, anterior: Optional[List]) -> bool:
+    """
+    O manifesto registra o mesmo hash e o arquivo no disco ainda tem o
+    tamanho/mtime daquela gravação (ou seja, não foi alterado depois dela).
+    """
+    if not anterior or anterior[0] != hash_conteudo:
+        return False
+    try:
+        st = caminho.stat()
+    except FileNotFoundError:
+        return False
+    return anterior[1:] == [st.st_size, st.st_mtime_ns]
+
+
+def _editado(caminho: Path, anterior: Optional[List]) -> bool:
+    """O arquivo existe, mas o tamanho/mtime não são mais os da gravação registrada no manifesto."""
+    if not anterior:
+        return False
+    try:
+        st = caminho.stat()
+    except FileNotFoundError:
+        return False
+    return anterior[1:] != [st.st_size, st.st_mtime_ns]
+
+
+def _gravar(caminho: Path, conteudo: bytes, hash_conteudo: str) -> List:
+    gravar_atomico(caminho, conteudo)
+    st = caminho.stat()
+    return [hash_conteudo, st.st_size, st.st_mtime_ns]
+
+
+def _chaves(dados: Dict) -> Tuple[str, str, str]:
+    base = f"{dados['nome']}_{dados['login']}"
+    return f"{base}_feedback.txt", f"{base}_prompt.txt", f"pacotes/{base}.zip"
+
+
+def renderizar_feedback(dados: Dict) -> str:
+    """Monta o texto do arquivo de feedback a partir dos campos preparados pelo GerenciadorAvaliacao."""
+    num_tentativas_reais = dados['num_tentativas']
+    criterio = dados['criterio']
+    mensagem_explicativa = ""
+
+    if num_tentativas_reais > 1:
+        criterio_str = criterio.upper()
+        titulo_nota = f"Nota Final ({criterio_str} de {num_tentativas_reais} tentativas): {dados['nota_final']:.2f} pontos"
+
+        detalhe_feedback = ""
+        if criterio == "highest":
+            detalhe_feedback = "à tentativa com a MAIOR nota"
+        elif criterio == "lowest":
+            detalhe_feedback = "à tentativa com a MENOR nota"
+        elif criterio == "average":
+            detalhe_feedback = "à tentativa com a nota MAIS PRÓXIMA DA MÉDIA"
+
+        texto_observacao = (
+            f"Observação: A 'Nota Final' é o resultado do critério '{criterio_str}' aplicado a {num_tentativas_reais} tentativas. "
+            f"O feedback detalhado e as notas por questão abaixo referem-se especificamente {detalhe_feedback}."
+        )
+        mensagem_explicativa = textwrap.fill(texto_observacao, width=100) + "\n\n"
+    else:
+        titulo_nota = f"Nota Final (de {num_tentativas_reais} tentativa): {dados['nota_final']:.2f} pontos"
+
+    feedback_formatado = "\n".join(textwrap.fill(p, width=100) for p in dados['feedback'].split('\n'))
+
+    return f"""
+FEEDBACK DA AVALIAÇÃO - {dados['avaliacao']}
+═══════════════════════════════════════════════════════════
+Estudante: {dados['nome']} ({dados['login']})
+Data: {dados['data']}
+{titulo_nota}
+Total de Chamadas à API: {dados['tentativas_api']}
+
+{mensagem_explicativa}{feedback_formatado}
+
+═══════════════════════════════════════════════════════════
+Este feedback foi gerado automaticamente por IA e pode
+necessitar de revisão pelo professor.
+"""
+
+
+def processar_estudante(dados: Dict, pasta: Path, pasta_pacotes: Optional[Path],
+                        anteriores: Dict[str, List], forcar: bool = False) -> Tuple[Dict[str, List], int, List[str]]:
+    """
+    Renderiza e grava os arquivos de um estudante. Executa dentro do pool;
+    retorna as entradas atualizadas do manifesto, quantos arquivos foram
+    regravados e os arquivos editados à mão que foram preservados.
+    """
+    nome_feedback, nome_prompt, chave_pacote = _chaves(dados)
+    arquivos = {nome_feedback: renderizar_feedback(dados).encode('utf-8')}
+    if dados.get('prompt'):
+        arquivos[nome_prompt] = dados['prompt'].encode('utf-8')
+
+    entradas, gravados, editados = {}, 0, []
+    for nome, conteudo in arquivos.items():
+        hash_conteudo = _hash(conteudo)
+        if _inalterado(pasta / nome, hash_conteudo, anteriores.get(nome)):
+            entradas[nome] = anteriores[nome]
+        elif not forcar and _editado(pasta / nome, anteriores.get(nome)):
+            entradas[nome] = anteriores[nome]
+            editados.append(nome)
+        else:
+            entradas[nome] = _gravar(pasta / nome, conteudo, hash_conteudo)
+            gravados += 1
+
+    if pasta_pacotes is not None:
+        # Hash do pacote = hash dos membros; o zip só é montado quando algum deles mudou
+        hash_pacote = _hash("".join(entradas[n][0] for n in sorted(arquivos)).encode())
+        destino = pasta_pacotes / Path(chave_pacote).name
+        if _inalterado(destino, hash_pacote, anteriores.get(chave_pacote)):
+            entradas[chave_pacote] = anteriores[chave_pacote]
+        elif not forcar and _editado(destino, anteriores.get(chave_pacote)):
+            entradas[chave_pacote] = anteriores[chave_pacote]
+            editados.append(chave_pacote)
+        else:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for nome in sorted(arquivos):
+                    zf.writestr(zipfile.ZipInfo(nome, DATA_ZIP), arquivos[nome], compress_type=zipfile.ZIP_DEFLATED)
+            entradas[chave_pacote] = _gravar(destino, buffer.getvalue(), hash_pacote)
+            gravados += 1
+    return entradas, gravados, editados
+
+
+class EscritorFeedbacks:
+    def __init__(self, pasta: Path, workers: int = 4, executor: str = "process",
+                 pasta_pacotes: Optional[Path] = None, lote: int = 256, forcar: bool = False):
+        self.pasta = Path(pasta)
+        self.pasta_pacotes = Path(pasta_pacotes) if pasta_pacotes else None
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.lote = lote
+        self.forcar = forcar
+        self.editados: List[str] = []
+
+    def _carregar_manifesto(self) -> Dict[str, List]:
+        try:
+            return json.loads((self.pasta / MANIFESTO).read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _salvar_manifesto(self, manifesto: Dict[str, List]):
+        gravar_atomico(self.pasta / MANIFESTO, json.dumps(manifesto, ensure_ascii=False).encode('utf-8'))
+
+    def _limpar_temporarios(self):
+        # Restos de uma execução interrompida antes do os.replace
+        for pasta in filter(None, (self.pasta, self.pasta_pacotes)):
+            for temporario in pasta.glob(".*.tmp"):
+                temporario.unlink(missing_ok=True)
+
+    def _criar_executor(self) -> Optional[Executor]:
+        if self.workers <= 1:
+            return None
+        if self.executor == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix='escritor')
+        return ProcessPoolExecutor(self.workers)
+
+    def gravar(self, itens: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Grava os arquivos dos estudantes em lotes (o iterável pode carregar os
+        textos sob demanda). Retorna contagens de estudantes, arquivos gravados,
+        inalterados e editados à mão (preservados; os nomes ficam em self.editados).
+        """
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        if self.pasta_pacotes:
+            self.pasta_pacotes.mkdir(parents=True, exist_ok=True)
+        self._limpar_temporarios()
+        manifesto = self._carregar_manifesto()
+        resumo = {'estudantes': 0, 'gravados': 0, 'inalterados': 0, 'editados': 0}
+        self.editados = []
+
+        iterador = iter(itens)
+        executor = self._criar_executor()
+        try:
+            while True:
+                lote = list(islice(iterador, self.lote))
+                if not lote:
+                    break
+                argumentos = [(dados, self.pasta, self.pasta_pacotes,
+                               {k: manifesto[k] for k in _chaves(dados) if k in manifesto}, self.forcar)
+                              for dados in lote]
+                if executor is None:
+                    resultados = [processar_estudante(*a) for a in argumentos]
+                else:
+                    resultados = list(executor.map(processar_estudante, *zip(*argumentos)))
+                for entradas, gravados, editados in resultados:
+                    manifesto.update(entradas)
+                    self.editados.extend(editados)
+                    resumo['estudantes'] += 1
+                    resumo['gravados'] += gravados
+                    resumo['editados'] += len(editados)
+                    resumo['inalterados'] += len(entradas) - gravados - len(editados)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            # Um manifesto desatualizado só faz regravar arquivos, nunca pular um que mudou
+            self._salvar_manifesto(manifesto)
+        return resumo